@@ -0,0 +1,74 @@
+"""Point counts and render times of the speed traces with and without downsampling.
+
+Usage:
+    python -m benchmarks.downsample 2024 Monza Q --width 1000 --repeat 3
+
+The fastest lap of every driver is drawn as a speed over distance trace, as
+on the Speed Overlay page, from the raw car data and from its min-max and
+LTTB downsampled versions. Also checks that each driver's minimum and
+maximum speed survive the downsampling.
+"""
+import argparse
+import io
+import sys
+import time
+
+import matplotlib
+matplotlib.use("Agg")
+from matplotlib import pyplot as plt
+
+from utils.downsample import MODES, downsample
+from utils.session_cache import load_session
+
+
+def _render(traces, width):
+    start = time.perf_counter()
+    fig, ax = plt.subplots(figsize=(width / 100, 6), dpi=100)
+    for distance, speed in traces:
+        ax.plot(distance, speed)
+    fig.savefig(io.BytesIO(), format="png")
+    plt.close(fig)
+    return time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.downsample",
+                                     description=__doc__.splitlines()[0])
+    parser.add_argument("year", type=int)
+    parser.add_argument("grand_prix")
+    parser.add_argument("session", nargs="?", default="Q")
+    parser.add_argument("--width", type=int, default=1000, help="target width in pixels")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    session = load_session(args.year, args.grand_prix, args.session, ("laps", "car_data"))
+    raw = []
+    for drv in session.drivers:
+        lap = session.laps.pick_drivers(drv).pick_fastest()
+        if lap is None or lap.empty or lap.isna()["LapTime"]:
+            continue
+        tel = lap.get_car_data().add_distance()
+        raw.append((tel["Distance"].to_numpy(), tel["Speed"].to_numpy()))
+
+    print(f"{session}: fastest laps of {len(raw)} drivers at {args.width} px, "
+          f"best render of {args.repeat}")
+    variants = [("raw", raw, 0.0)]
+    for mode in MODES:
+        start = time.perf_counter()
+        picked = [downsample(d, s, args.width, mode) for d, s in raw]
+        elapsed = time.perf_counter() - start
+        traces = [(d[idx], s[idx]) for (d, s), idx in zip(raw, picked)]
+        variants.append((mode, traces, elapsed))
+
+    for name, traces, downsample_seconds in variants:
+        points = sum(len(d) for d, _ in traces)
+        extremes = all(s.min() == ref.min() and s.max() == ref.max()
+                       for (_, s), (_, ref) in zip(traces, raw))
+        render = min(_render(traces, args.width) for _ in range(args.repeat))
+        print(f"  {name:<7} {points:8d} points  downsample {downsample_seconds * 1000:6.1f} ms  "
+              f"render {render * 1000:7.1f} ms  min/max kept: {extremes}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,288 @@
+"""Deterministic session fixtures for the benchmarks, no network needed.
+
+Two sources:
+
+* recorded: fastf1's cache of recorded API responses (fill it once with
+  ``python -m utils.prewarm YEAR --cache-dir DIR``), replayed in offline
+  mode through the regular loading code. See ``use_recorded``.
+* synthetic: generated sessions of any number of drivers, laps and
+  telemetry sample rate. See ``use_synthetic``; the data is derived from
+  a seed only, so two runs with the same parameters see identical data.
+
+Both work by configuring fastf1 for the current process, so everything that
+loads sessions (the session cache, the pages) picks them up.
+"""
+import weakref
+
+import fastf1
+import numpy as np
+import pandas as pd
+from fastf1 import _api
+from fastf1.core import Laps, Session, SessionResults
+from fastf1.events import Event
+from fastf1.mvapi import data as mvapi_data
+
+# Synthetic sessions take the teams (and with them the team colours) of this
+# season, which fastf1's plotting module knows
+SYNTHETIC_YEAR = 2021
+SYNTHETIC_ROUND = 1
+SYNTHETIC_EVENT = "Synthetic Grand Prix"
+
+TEAMS = ("Red Bull Racing", "Mercedes", "Ferrari", "McLaren", "Alpine",
+         "AlphaTauri", "Aston Martin", "Williams", "Alfa Romeo Racing", "Haas F1 Team")
+COMPOUNDS = ("SOFT", "MEDIUM", "HARD")
+
+# Shape of the synthetic circuit: an ellipse with these half axes (in the
+# 1/10 m units of fastf1's position data) and this many corners
+TRACK_AXES = (5000.0, 3000.0)
+CORNERS = 12
+BASE_LAP_SECONDS = 80.0
+
+# Points for the top ten of a synthetic race
+POINTS = (25, 18, 15, 12, 10, 8, 6, 4, 2, 1)
+
+# generated telemetry per session, see SyntheticSession.raw_telemetry
+_telemetry = {}
+
+
+def use_recorded(cache_dir):
+    """Serve every request from the fastf1 cache in ``cache_dir``."""
+    fastf1.Cache.enable_cache(cache_dir)
+    fastf1.Cache.offline_mode(True)
+
+
+def synthetic_event(year=SYNTHETIC_YEAR, rnd=SYNTHETIC_ROUND, name=SYNTHETIC_EVENT):
+    date = pd.Timestamp(f"{year}-05-09 13:00")
+    data = {"RoundNumber": rnd, "Country": "Nowhere", "Location": "Synthetic Ring",
+            "OfficialEventName": name, "EventName": name, "EventDate": date,
+            "EventFormat": "conventional", "F1ApiSupport": True}
+    for i, name in enumerate(("Practice 1", "Practice 2", "Practice 3", "Qualifying", "Race"), 1):
+        start = date - pd.Timedelta(days=5 - i)
+        data[f"Session{i}"] = name
+        data[f"Session{i}Date"] = start.tz_localize("UTC")
+        data[f"Session{i}DateUtc"] = start
+    return Event(data, year=year)
+
+
+class SyntheticSession(Session):
+    """A session whose data is generated instead of downloaded.
+
+    ``load()`` fills laps, results, weather and race control messages like
+    fastf1's loaders would; telemetry is generated by the ``fastf1._api``
+    replacements installed by ``use_synthetic``, so it goes through the
+    app's own telemetry loading.
+    """
+
+    drivers_count = 20
+    laps_count = 50
+    hz = 4.0
+    seed = 0
+
+    def _rng(self, salt):
+        return np.random.default_rng([self.seed, salt, len(self.name)])
+
+    def _numbers(self):
+        return [str(n) for n in range(1, self.drivers_count + 1)]
+
+    def _lap_table(self):
+        # (drivers, laps) arrays of lap times and session times
+        n, laps = self.drivers_count, self.laps_count
+        rng = self._rng(1)
+        stint = np.minimum(np.arange(laps) * 3 // laps, 2)
+        tyre_life = np.arange(laps) - np.searchsorted(stint, stint)
+        lap_times = (BASE_LAP_SECONDS + 0.05 * np.arange(n)[:, None] + 0.03 * tyre_life
+                     + rng.gamma(2.0, 0.25, (n, laps)))
+        ends = 600.0 + np.cumsum(lap_times, axis=1)
+        return lap_times, ends, stint, tyre_life
+
+    def _laps_frame(self):
+        n, laps = self.drivers_count, self.laps_count
+        lap_times, ends, stint, tyre_life = self._lap_table()
+        numbers = self._numbers()
+        abbreviations = [f"D{num:0>2}" for num in numbers]
+        # position after each lap: order of the session time at the lap end
+        positions = ends.argsort(axis=0).argsort(axis=0) + 1
+        best = np.minimum.accumulate(lap_times, axis=1)
+
+        frame = pd.DataFrame({
+            "Time": pd.to_timedelta(ends.ravel(), unit="s"),
+            "Driver": np.repeat(abbreviations, laps),
+            "DriverNumber": np.repeat(numbers, laps),
+            "LapTime": pd.to_timedelta(lap_times.ravel(), unit="s"),
+            "LapNumber": np.tile(np.arange(1, laps + 1), n).astype(float),
+            "Stint": np.tile(stint + 1, n).astype(float),
+            "Sector1Time": pd.to_timedelta(lap_times.ravel() * 0.3, unit="s"),
+            "Sector2Time": pd.to_timedelta(lap_times.ravel() * 0.4, unit="s"),
+            "Sector3Time": pd.to_timedelta(lap_times.ravel() * 0.3, unit="s"),
+            "IsPersonalBest": (lap_times == best).ravel(),
+            "Compound": np.tile(np.array(COMPOUNDS)[stint], n),
+            "TyreLife": np.tile(tyre_life + 1, n).astype(float),
+            "FreshTyre": True,
+            "Team": np.repeat([TEAMS[i // 2 % len(TEAMS)] for i in range(n)], laps),
+            "LapStartTime": pd.to_timedelta((ends - lap_times).ravel(), unit="s"),
+            "TrackStatus": "1",
+            "Position": positions.ravel().astype(float),
+            "IsAccurate": True,
+        })
+        return frame
+
+    def _results_frame(self, laps):
+        numbers = self._numbers()
+        final = laps[laps["LapNumber"] == self.laps_count].set_index("DriverNumber")
+        results = pd.DataFrame({
+            "DriverNumber": numbers,
+            "BroadcastName": [f"D {num}" for num in numbers],
+            "Abbreviation": [f"D{num:0>2}" for num in numbers],
+            "FirstName": "Driver",
+            "LastName": numbers,
+            "FullName": [f"Driver {num}" for num in numbers],
+            "TeamName": [TEAMS[i // 2 % len(TEAMS)] for i in range(len(numbers))],
+            "Position": final.loc[numbers, "Position"].to_numpy(),
+        }, index=numbers)
+        return SessionResults(results.sort_values("Position"), force_default_cols=True)
+
+    def load(self, *, laps=True, telemetry=True, weather=True, messages=True, livedata=None):
+        self._session_info = {
+            "Meeting": {"Name": self.event["EventName"], "Circuit": {"Key": 0, "ShortName": "Synthetic"}},
+            "StartDate": self.date, "EndDate": self.date + pd.Timedelta(hours=2),
+            "GmtOffset": pd.Timedelta(0),
+        }
+        self._t0_date = self.date - pd.Timedelta(minutes=10)
+        self._session_start_time = pd.Timedelta(minutes=10)
+        self._total_laps = self.laps_count if self.name == "Race" else None
+        self._session_status = pd.DataFrame({
+            "Time": pd.to_timedelta([600.0, 600.0 + self.laps_count * 2 * BASE_LAP_SECONDS], unit="s"),
+            "Status": ["Started", "Finished"]})
+        self._track_status = pd.DataFrame({"Time": [pd.Timedelta(minutes=10)], "Status": ["1"],
+                                           "Message": ["AllClear"]})
+        frame = self._laps_frame()
+        self._results = self._results_frame(frame)
+        if laps:
+            self._laps = Laps(frame, session=self, force_default_cols=True)
+            self._laps["LapStartDate"] = self._laps["LapStartTime"] + self._t0_date
+        if weather:
+            minutes = np.arange(int(self.laps_count * 2 * BASE_LAP_SECONDS / 60) + 1)
+            self._weather_data = pd.DataFrame({
+                "Time": pd.to_timedelta(minutes, unit="min"), "AirTemp": 25.0, "Humidity": 50.0,
+                "Pressure": 1010.0, "Rainfall": False, "TrackTemp": 40.0, "WindDirection": 0,
+                "WindSpeed": 1.0})
+        if messages:
+            self._race_control_messages = pd.DataFrame({
+                "Time": [self._t0_date + pd.Timedelta(minutes=10)], "Category": ["Flag"],
+                "Message": ["GREEN LIGHT - PIT EXIT OPEN"], "Status": [None], "Flag": ["GREEN"],
+                "Scope": ["Track"], "Sector": [np.nan], "RacingNumber": [None], "Lap": [1]})
+
+    def raw_telemetry(self):
+        """Car and position data per driver, in the format of fastf1._api.
+
+        Generated once per session name; the loaders pop drivers from the
+        dicts, so each call returns new ones holding the same frames.
+        """
+        key = (self.drivers_count, self.laps_count, self.hz, self.seed, self.name)
+        if key not in _telemetry:
+            _telemetry[key] = self._generate_telemetry()
+        car, pos = _telemetry[key]
+        return dict(car), dict(pos)
+
+    def _generate_telemetry(self):
+        lap_times, ends, _, _ = self._lap_table()
+        starts = ends - lap_times
+        t = np.arange(0.0, ends.max() + 5.0, 1.0 / self.hz)
+        time = pd.to_timedelta(t, unit="s")
+        date = self._t0_date + time
+        car, pos = {}, {}
+        for i, drv in enumerate(self._numbers()):
+            # fraction of the lap driven at each sample, 0 before the start
+            lap = np.clip(np.searchsorted(ends[i], t), 0, self.laps_count - 1)
+            fraction = np.clip((t - starts[i][lap]) / lap_times[i][lap], 0.0, 1.0)
+            angle = 2 * np.pi * fraction
+            noise = self._rng(100 + i).normal(0.0, 2.0, len(t))
+            speed = np.where(t < starts[i][0], 0.0, 210 + 90 * np.cos(CORNERS * angle) + noise)
+            # same dtypes as fastf1's parsed streams: int64 car channels,
+            # positions as whole 1/10 m in float64
+            car[drv] = pd.DataFrame({
+                "Date": date, "Time": time, "RPM": (speed * 50).astype(np.int64),
+                "Speed": speed.astype(np.int64),
+                "nGear": np.clip(speed // 40 + 1, 1, 8).astype(np.int64),
+                "Throttle": np.clip(speed / 3, 0, 100).astype(np.int64), "Brake": np.gradient(speed) < -1,
+                "DRS": np.zeros(len(t), dtype=np.int64), "Source": "car"})
+            pos[drv] = pd.DataFrame({
+                "Date": date, "Time": time, "Status": "OnTrack",
+                "X": np.round(TRACK_AXES[0] * np.cos(angle)), "Y": np.round(TRACK_AXES[1] * np.sin(angle)),
+                "Z": 0.0, "Source": "pos"})
+        return car, pos
+
+    def driver_info(self):
+        """Driver list in the format of fastf1._api.driver_info."""
+        return {row["DriverNumber"]: {
+            "RacingNumber": row["DriverNumber"], "Tla": row["Abbreviation"],
+            "FirstName": row["FirstName"], "LastName": row["LastName"],
+            "TeamName": row["TeamName"],
+        } for _, row in self._results_frame(self._laps_frame()).iterrows()}
+
+
+def synthetic_circuit():
+    """Circuit info in the format of the MultiViewer API."""
+    angles = np.linspace(0, 2 * np.pi, CORNERS, endpoint=False) + np.pi / CORNERS
+    corners = [{"trackPosition": {"x": TRACK_AXES[0] * np.cos(a), "y": TRACK_AXES[1] * np.sin(a)},
+                "number": i + 1, "letter": "", "angle": float(np.degrees(a))}
+               for i, a in enumerate(angles)]
+    return {"corners": corners, "marshalLights": [], "marshalSectors": [], "rotation": 30.0}
+
+
+def synthetic_season_points(year, rounds=22, drivers=20, seed=0):
+    """Points table like utils.standings.season_points."""
+    rng = np.random.default_rng([seed, year])
+    codes = [f"D{n:0>2}" for n in range(1, drivers + 1)]
+    points = np.zeros((drivers, rounds))
+    scoring = min(drivers, len(POINTS))  # grids smaller than the points positions
+    for rnd in range(rounds):
+        order = rng.permutation(drivers)
+        points[order[:scoring], rnd] = POINTS[:scoring]
+    races = [f"Race {rnd}" for rnd in range(1, rounds + 1)]
+    table = pd.DataFrame(points, index=pd.Index(codes, name="driverCode"), columns=races)
+    return table.loc[table.sum(axis=1).sort_values(ascending=False).index]
+
+
+def use_synthetic(laps=50, hz=4.0, drivers=20, seed=0):
+    """Make fastf1 (and the app's season standings) serve synthetic data.
+
+    Every session of every event is the same synthetic session with the
+    given size; telemetry, driver list and circuit info requests are
+    answered from it.
+    """
+    from utils import standings
+
+    session_class = type("SyntheticSession", (SyntheticSession,),
+                         {"laps_count": laps, "hz": hz, "drivers_count": drivers, "seed": seed})
+    # api path -> session, for the _api replacements; weak, so the fixture
+    # doesn't keep sessions alive that the app has dropped. The first session
+    # object of a path is kept while it lives: later ones (e.g. of a request
+    # waiting for the session cache) aren't the ones being loaded.
+    sessions = weakref.WeakValueDictionary()
+
+    def get_event(year, gp, **kwargs):
+        return synthetic_event(year)
+
+    def get_session(year, gp, identifier=None, **kwargs):
+        event = synthetic_event(year)
+        session = session_class(event, event.get_session_name(identifier), f1_api_support=True)
+        sessions.setdefault(session.api_path, session)
+        return session
+
+    def car_data(path, **kwargs):
+        return sessions[path].raw_telemetry()[0]
+
+    def position_data(path, **kwargs):
+        return sessions[path].raw_telemetry()[1]
+
+    def driver_info(path, **kwargs):
+        return sessions[path].driver_info()
+
+    fastf1.get_event = get_event
+    fastf1.get_session = get_session
+    _api.car_data = car_data
+    _api.position_data = position_data
+    _api.driver_info = driver_info
+    mvapi_data.get_circuit = lambda year, circuit_key: synthetic_circuit()
+    standings.season_points = lambda year: synthetic_season_points(year, drivers=drivers, seed=seed)
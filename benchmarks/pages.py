@@ -0,0 +1,248 @@
+"""Load, transform, render and PNG encode time of every page, offline.
+
+Usage:
+    python -m benchmarks.pages --laps 50 --hz 4 --json before.json
+    python -m benchmarks.pages --laps 70 --hz 10 --baseline before.json --json after.json
+    python -m benchmarks.pages --recorded ~/.cache/fastf1 --year 2023 --event "Italian Grand Prix"
+    python -m benchmarks.pages --compact --repeat 1
+
+The pages are run headlessly with the inputs of utils.export, against
+synthetic sessions (the default, see benchmarks.fixtures) or against a
+fastf1 cache of recorded sessions in offline mode; nothing is downloaded.
+Every run starts from empty in-memory caches, and the figure cache and
+session store are disabled unless ``--store`` is given, so each run does
+the full work. Stages:
+
+* load: loading sessions (and building a driver's telemetry on first use)
+  and season standings
+* transform: from the start of a figure's render function until it creates
+  its first matplotlib figure, minus loading
+* render: the rest of the render function, minus loading
+* encode: saving the figure as PNG
+
+Time a page spends in neither (Streamlit itself, widgets) only shows in its
+total. The command exits with 1 if a page shows an error, so
+``--compact --repeat 1`` checks that every page works on sessions with
+compacted dtypes (see utils.compact).
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+STAGES = ("load", "transform", "render", "encode")
+
+
+class StageTimer:
+    """Accumulates the time spent in each stage while pages run.
+
+    ``install()`` wraps the functions marking the stages; the wrappers are
+    process-wide, so pages need no changes to be measured.
+    """
+
+    def __init__(self):
+        self.stages = dict.fromkeys(STAGES, 0.0)
+        self._loading = 0  # depth of nested load calls
+        self._first_figure = None  # (time, load seconds) of the render's first figure
+
+    @contextlib.contextmanager
+    def measure(self):
+        self.stages = dict.fromkeys(STAGES, 0.0)
+        yield self.stages
+
+    def _timed_load(self, func):
+        def wrapper(*args, **kwargs):
+            self._loading += 1
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self._loading -= 1
+                if not self._loading:
+                    self.stages["load"] += time.perf_counter() - start
+        return wrapper
+
+    def _timed_render(self, render):
+        def wrapper():
+            start, loaded = time.perf_counter(), self.stages["load"]
+            self._first_figure = None
+            try:
+                return render()
+            finally:
+                end = time.perf_counter()
+                # a render that draws no matplotlib figure (e.g. plotly) is all render
+                split, split_loaded = self._first_figure or (start, loaded)
+                self._first_figure = None
+                self.stages["transform"] += (split - start) - (split_loaded - loaded)
+                self.stages["render"] += (end - split) - (self.stages["load"] - split_loaded)
+        return wrapper
+
+    def _timed_figure(self, func):
+        def wrapper(*args, **kwargs):
+            if self._first_figure is None:
+                self._first_figure = (time.perf_counter(), self.stages["load"])
+            return func(*args, **kwargs)
+        return wrapper
+
+    def _timed_encode(self, func):
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.stages["encode"] += time.perf_counter() - start
+        return wrapper
+
+    def install(self):
+        import matplotlib.pyplot as plt
+
+        from utils import figure_cache, lazy_telemetry, session_cache, standings
+
+        session_cache.SessionCache.get = self._timed_load(session_cache.SessionCache.get)
+        lazy_telemetry.LazyTelemetry.__missing__ = self._timed_load(lazy_telemetry.LazyTelemetry.__missing__)
+        standings.season_points = self._timed_load(standings.season_points)
+        plt.figure = self._timed_figure(plt.figure)
+        figure_cache._encode_png = self._timed_encode(figure_cache._encode_png)
+
+        get_or_render = figure_cache.FigureCache._get_or_render
+        timer = self
+
+        def timed_get_or_render(cache, page, fmt, key, render, encode):
+            return get_or_render(cache, page, fmt, key, timer._timed_render(render), encode)
+        figure_cache.FigureCache._get_or_render = timed_get_or_render
+
+
+def _reset_caches():
+    from utils import session_cache, track_geometry
+
+    session_cache.cache.clear()
+    with track_geometry._lock:
+        track_geometry._geometries.clear()
+
+
+def run(pages, contexts, repeat, timer, baseline=None, out=sys.stdout):
+    """Per page: the stages and total of every run, and the errors shown."""
+    from utils import export
+
+    results = {}
+    for page in pages:
+        runs, errors = [], []
+        for _ in range(repeat):
+            _reset_caches()
+            with timer.measure() as stages:
+                start = time.perf_counter()
+                try:
+                    _, errors = export.run_page(page, contexts[export.CHARTS[page][0]])
+                except Exception as e:
+                    errors = [f"{type(e).__name__}: {e}"]
+                total = time.perf_counter() - start
+            runs.append(dict(stages, total=total))
+        results[page] = {
+            "median": {name: statistics.median(run[name] for run in runs) for name in runs[0]},
+            "min": {name: min(run[name] for run in runs) for name in runs[0]},
+            "runs": runs,
+            "errors": errors,
+        }
+        _print_row(page, results[page], out, (baseline or {}).get(page))
+    return results
+
+
+def _print_row(page, result, out, baseline=None):
+    median = result["median"]
+    row = f"{page:<22}" + "".join(f"{median[name]:9.3f}s" for name in STAGES + ("total",))
+    if baseline is not None:
+        row += f"{baseline['median']['total'] / median['total']:8.2f}x"
+    if result["errors"]:
+        row += f"  {result['errors'][0]}"
+    print(row, file=out)
+
+
+def environment():
+    """What the numbers depend on besides the code."""
+    import fastf1
+    import matplotlib
+    import pandas
+
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {"commit": commit, "python": platform.python_version(), "platform": platform.platform(),
+            "cpus": os.cpu_count(), "fastf1": fastf1.__version__, "matplotlib": matplotlib.__version__,
+            "pandas": pandas.__version__}
+
+
+def main(argv=None):
+    import fastf1
+
+    from benchmarks import fixtures
+    from utils import config, export, figure_cache
+
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.pages", description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", nargs="+", default=list(export.CHARTS), choices=list(export.CHARTS),
+                        metavar="PAGE")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per page, medians are reported")
+    parser.add_argument("--laps", type=int, default=50, help="laps of the synthetic sessions")
+    parser.add_argument("--hz", type=float, default=4.0, help="telemetry samples per second of the synthetic sessions")
+    parser.add_argument("--drivers", type=int, default=20, help="drivers of the synthetic sessions")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the synthetic sessions")
+    parser.add_argument("--recorded", metavar="CACHE_DIR",
+                        help="use the sessions recorded in this fastf1 cache instead of synthetic ones")
+    parser.add_argument("--year", type=int, help="season of the recorded sessions")
+    parser.add_argument("--event", help="event of the recorded sessions, e.g. 'Italian Grand Prix'")
+    parser.add_argument("--store", metavar="DIR", help="use a session store in DIR (default: none)")
+    parser.add_argument("--compact", action="store_true",
+                        help="compact the dtypes of loaded sessions, as F1VIZ_COMPACT_DTYPES=1 does")
+    parser.add_argument("--baseline", help="results JSON of an earlier run to compare totals with")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args(argv)
+    if args.recorded and not (args.year and args.event):
+        parser.error("--recorded needs --year and --event")
+
+    config.STORE_DIR = args.store or ""
+    config.COMPACT_DTYPES = args.compact or config.COMPACT_DTYPES
+    figure_cache.cache.directory = ""
+    if args.recorded:
+        fixtures.use_recorded(args.recorded)
+        year = args.year
+        event = fastf1.get_event(year, args.event)
+        rnd, event_name = int(event["RoundNumber"]), event["EventName"]
+        source = {"recorded": os.path.abspath(args.recorded), "year": year, "event": event_name}
+    else:
+        fixtures.use_synthetic(args.laps, args.hz, args.drivers, args.seed)
+        year, rnd, event_name = fixtures.SYNTHETIC_YEAR, fixtures.SYNTHETIC_ROUND, fixtures.SYNTHETIC_EVENT
+        source = {"synthetic": {"laps": args.laps, "hz": args.hz, "drivers": args.drivers, "seed": args.seed}}
+
+    timer = StageTimer()
+    timer.install()
+    session_types = {export.CHARTS[page][0] for page in args.pages}
+    contexts = {session_type: export._context(year, rnd, event_name, session_type)
+                for session_type in session_types}
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["pages"]
+
+    print(f"{'page':<22}" + "".join(f"{name:>10}" for name in STAGES + ("total",))
+          + ("    vs base" if baseline else ""))
+    results = run(args.pages, contexts, args.repeat, timer, baseline)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"environment": environment(), "source": source, "repeat": args.repeat,
+                       "compact": args.compact,
+                       "pages": results}, f, indent=2)
+    return 1 if any(result["errors"] for result in results.values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,110 @@
+"""Import time and time to first paint of every page, in fresh processes.
+
+Usage:
+    python -m benchmarks.startup --repeat 3
+    python -m benchmarks.startup --pages Welcome Track_Map --budget 0.5 --json startup.json
+
+Each page is run once headlessly in a new Python process, the way a page is
+first shown after a switch: no button is clicked, so this is the time until
+the page's title and inputs are on screen. Import time is the part of it
+spent importing modules that weren't loaded before the page ran (measured
+with ``python -X importtime``); the rerun time is a second run of the same
+script in the same process, i.e. the cost of any widget interaction.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_MARKER = "-- page start --"
+
+# Runs in the child process. Streamlit's own lazily imported modules are
+# loaded by a throwaway script first, so only the page's imports are counted.
+_CHILD = f"""
+import json, sys, time
+from streamlit.testing.v1 import AppTest
+AppTest.from_string("import streamlit as st\\nst.write('')").run()
+sys.stderr.write({_MARKER!r} + "\\n")
+sys.stderr.flush()
+start = time.perf_counter()
+app = AppTest.from_file(sys.argv[1], default_timeout=120)
+app.run()
+first_paint = time.perf_counter() - start
+start = time.perf_counter()
+app.run()
+rerun = time.perf_counter() - start
+errors = [e.value for e in app.error] + [e.message for e in app.exception]
+print(json.dumps({{"first_paint": first_paint, "rerun": rerun, "errors": errors}}))
+"""
+
+
+def page_scripts():
+    """Page name -> script path, the welcome page first."""
+    pages = {"Welcome": os.path.join(ROOT, "Welcome.py")}
+    pages_dir = os.path.join(ROOT, "pages")
+    for name in sorted(os.listdir(pages_dir)):
+        if name.endswith(".py"):
+            pages[name[:-3]] = os.path.join(pages_dir, name)
+    return pages
+
+
+def _import_seconds(stderr):
+    # sum of the cumulative times of the top level imports after the marker;
+    # lines look like "import time:   self | cumulative | <indent>name"
+    _, _, after = stderr.partition(_MARKER)
+    total = 0
+    for line in after.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = line.split("|")
+        if cumulative.strip().isdigit() and not name[1:].startswith(" "):
+            total += int(cumulative)
+    return total / 1e6
+
+
+def measure(script):
+    """Timings of one run of ``script`` in a fresh interpreter."""
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get("PYTHONPATH")])))
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", _CHILD, script],
+                          cwd=ROOT, env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    result["imports"] = _import_seconds(proc.stderr)
+    return result
+
+
+def main(argv=None):
+    scripts = page_scripts()
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.startup", description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", nargs="+", default=list(scripts), choices=list(scripts), metavar="PAGE")
+    parser.add_argument("--repeat", type=int, default=3, help="fresh processes per page, the best is kept")
+    parser.add_argument("--budget", type=float, help="fail if a page's first paint takes longer (seconds)")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args(argv)
+
+    print(f"{'page':<24}{'imports':>9}{'1st paint':>11}{'rerun':>9}")
+    results = {}
+    for page in args.pages:
+        runs = [measure(scripts[page]) for _ in range(args.repeat)]
+        best = min(runs, key=lambda run: run["first_paint"])
+        results[page] = best
+        note = f"  {best['errors'][0]}" if best["errors"] else ""
+        print(f"{page:<24}{best['imports']:8.3f}s{best['first_paint']:10.3f}s{best['rerun']:8.3f}s{note}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.budget is not None:
+        over = [page for page, result in results.items() if result["first_paint"] > args.budget]
+        if over:
+            print(f"Over the {args.budget:.2f}s budget: {', '.join(over)}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
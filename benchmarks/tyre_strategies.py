@@ -0,0 +1,80 @@
+"""Compare the per-stint and the batched rendering of the Tyre Strategies chart.
+
+Usage:
+    python -m benchmarks.tyre_strategies 2024 Hungary R --repeat 5
+
+The session is loaded once through the session cache (so a pre-warmed store
+is used if there is one), then both paths are timed from the laps to an
+encoded PNG.
+"""
+import argparse
+import io
+import sys
+import time
+
+import fastf1.plotting
+import matplotlib
+matplotlib.use("Agg")
+from matplotlib import pyplot as plt
+
+from utils.session_cache import load_session
+from utils.strategy import draw_stints, stint_table
+
+
+def render_per_stint(session, drivers):
+    # the page's original implementation: one barh artist per stint
+    stints = session.laps[["Driver", "Stint", "Compound", "LapNumber"]]
+    stints = stints.groupby(["Driver", "Stint", "Compound"]).count().reset_index()
+    stints = stints.rename(columns={"LapNumber": "StintLength"})
+
+    fig, ax = plt.subplots(figsize=(5, 10))
+    for driver in drivers:
+        driver_stints = stints.loc[stints["Driver"] == driver]
+        previous_stint_end = 0
+        for idx, row in driver_stints.iterrows():
+            compound_color = fastf1.plotting.get_compound_color(row["Compound"], session=session)
+            plt.barh(y=driver, width=row["StintLength"], left=previous_stint_end,
+                     color=compound_color, edgecolor="black", fill=True)
+            previous_stint_end += row["StintLength"]
+    ax.invert_yaxis()
+    return fig
+
+
+def render_batched(session, drivers):
+    fig, ax = plt.subplots(figsize=(5, 10))
+    draw_stints(ax, stint_table(session), drivers)
+    ax.invert_yaxis()
+    return fig
+
+
+def _time(render, session, drivers, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fig = render(session, drivers)
+        fig.savefig(io.BytesIO(), format="png", bbox_inches="tight")
+        plt.close(fig)
+        timings.append(time.perf_counter() - start)
+    return min(timings), sum(timings) / len(timings)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.tyre_strategies",
+                                     description=__doc__.splitlines()[0])
+    parser.add_argument("year", type=int)
+    parser.add_argument("grand_prix")
+    parser.add_argument("session", nargs="?", default="R")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    session = load_session(args.year, args.grand_prix, args.session, ("laps",))
+    drivers = [session.get_driver(drv)["Abbreviation"] for drv in session.drivers]
+    print(f"{session}: {len(stint_table(session))} stints, best / mean of {args.repeat}")
+    for name, render in (("per stint", render_per_stint), ("batched", render_batched)):
+        best, mean = _time(render, session, drivers, args.repeat)
+        print(f"  {name:<10} {best * 1000:8.1f} ms {mean * 1000:8.1f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
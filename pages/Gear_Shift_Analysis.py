@@ -1,10 +1,13 @@
 import streamlit as st
-import matplotlib.pyplot as plt
-import numpy as np
-from matplotlib import colormaps
-from matplotlib.collections import LineCollection
-import fastf1
-import io
+import json
+
+from utils import page_state, session_loader, timing
+
+# Stage timings of this run, reported at the end of the script
+timing.start_page(__file__)
+
+# Session data this page reads, only these parts are loaded
+REQUIRED_DATA = ("laps", "car_data", "pos_data", "messages")
 
 # Page configuration
 st.set_page_config(layout="wide", page_title="F1 Fastest Lap Visualization", page_icon="🏎️")
@@ -14,68 +17,99 @@ st.title("🏎️ Fastest Lap Gear Shift Visualization")
 # Create two columns: Graph (Left) | User Input (Right)
 col_graph, col_input = st.columns([4, 1])
 
-# Initialize session state variables
-
-if "flgs_img_buf" not in st.session_state:
-    st.session_state.flgs_img_buf = None
+# This page's values in st.session_state, see utils.page_state
+state = page_state.scope(__file__)
 
 with col_input:
     st.write("### Select F1 Session")
     year = st.selectbox("Year", list(range(2018, 2025)), index=3)
     grand_prix = st.text_input("Grand Prix (e.g., Austrian Grand Prix)", "Austrian Grand Prix")
     session_type = st.selectbox("Session Type", ['FP1', 'FP2', 'FP3', 'Q', 'S', 'SS', 'SQ', 'R'], index=0)
+    # Interactive mode sends decimated samples to a WebGL plot, so pan and
+    # zoom happen in the browser instead of re-rendering an image
+    render_mode = st.radio("Rendering", ["Image", "Interactive"], horizontal=True)
 
     if st.button("Generate Plot"):
-        with st.spinner("Fetching session data..."):
-            progress_bar = st.progress(10)
+        session_loader.start(state, year, grand_prix, session_type, REQUIRED_DATA)
+
+    # The plot is generated once the session has loaded in the background
+    if session_loader.finished(state):
+        with st.spinner("Generating plot..."):
+            progress_bar = st.progress(0)
+            timing.progress(progress_bar)
             
             try:
+                from utils.figure_cache import figure_json, figure_png, session_version
+                from utils.lazy_telemetry import lap_telemetry
+
                 # Fetch session data
-                session = fastf1.get_session(year, grand_prix, session_type)
-                session.load()
-                progress_bar.progress(30)
+                session = session_loader.result(state)
+
+                def render():
+                    import matplotlib.pyplot as plt
+                    import numpy as np
+                    from matplotlib import colormaps
+                    from matplotlib.collections import LineCollection
+                    from utils.downsample import downsample_frame, track_width
+                    from utils.plotting import setup_mpl
+
+                    setup_mpl(mpl_timedelta_support=False, misc_mpl_mods=False, color_scheme=None)
 
-                # Extract fastest lap data
-                lap = session.laps.pick_fastest()
-                tel = lap.get_telemetry()
-                progress_bar.progress(50)
+                    # Extract fastest lap data
+                    lap = session.laps.pick_fastest()
+                    tel = lap_telemetry(lap)
 
-                # Process telemetry data
-                x = np.array(tel['X'].values)
-                y = np.array(tel['Y'].values)
-                progress_bar.progress(70)
+                    timing.mark("draw")
+                    # Create matplotlib figure
+                    fig, ax = plt.subplots(figsize=(16, 8))
 
-                points = np.array([x, y]).T.reshape(-1, 1, 2)
-                segments = np.concatenate([points[:-1], points[1:]], axis=1)
-                gear = tel['nGear'].to_numpy().astype(float)
+                    # Only keep the samples that are visible at the figure's resolution
+                    tel = downsample_frame(tel, 'Distance', 'nGear', track_width(ax))
 
-                # Create matplotlib figure
-                fig, ax = plt.subplots(figsize=(16, 8))
-                cmap = colormaps['Paired']
-                lc_comp = LineCollection(segments, norm=plt.Normalize(1, cmap.N + 1), cmap=cmap)
-                lc_comp.set_array(gear)
-                lc_comp.set_linewidth(4)
+                    # Process telemetry data
+                    x = np.array(tel['X'].values)
+                    y = np.array(tel['Y'].values)
 
-                ax.add_collection(lc_comp)
-                ax.axis('equal')
-                ax.tick_params(labelleft=False, left=False, labelbottom=False, bottom=False)
+                    points = np.array([x, y]).T.reshape(-1, 1, 2)
+                    segments = np.concatenate([points[:-1], points[1:]], axis=1)
+                    gear = tel['nGear'].to_numpy().astype(float)
 
-                plt.suptitle(f"Fastest Lap Gear Shift Visualization\n{lap['Driver']} - {grand_prix} {session.event.year}")
+                    cmap = colormaps['Paired']
+                    lc_comp = LineCollection(segments, norm=plt.Normalize(1, cmap.N + 1), cmap=cmap)
+                    lc_comp.set_array(gear)
+                    lc_comp.set_linewidth(4)
 
-                cbar = plt.colorbar(mappable=lc_comp, ax=ax, label="Gear", boundaries=np.arange(1, 10))
-                cbar.set_ticks(np.arange(1.5, 9.5))
-                cbar.set_ticklabels(np.arange(1, 9))
+                    ax.add_collection(lc_comp)
+                    ax.axis('equal')
+                    ax.tick_params(labelleft=False, left=False, labelbottom=False, bottom=False)
 
-                progress_bar.progress(90)
+                    plt.suptitle(f"Fastest Lap Gear Shift Visualization\n{lap['Driver']} - {session.event['EventName']} {session.event.year}")
 
-                # Save figure for persistent display and download
-                img_buf = io.BytesIO()
-                fig.savefig(img_buf, format="png", bbox_inches="tight")
-                img_buf.seek(0)
+                    cbar = plt.colorbar(mappable=lc_comp, ax=ax, label="Gear", boundaries=np.arange(1, 10))
+                    cbar.set_ticks(np.arange(1.5, 9.5))
+                    cbar.set_ticklabels(np.arange(1, 9))
 
-                # # Store in session state
-                # st.session_state.fig = fig
-                st.session_state.flgs_img_buf = img_buf
+                    return fig
+
+                def render_interactive():
+                    from utils import interactive
+
+                    lap = session.laps.pick_fastest()
+                    title = f"Fastest Lap Gear Shift Visualization<br>{lap['Driver']} - {session.event['EventName']} {session.event.year}"
+                    return interactive.gear_shifts(lap_telemetry(lap), title)
+
+                params = {}
+                if render_mode == "Interactive":
+                    state.figure = figure_json(
+                        __file__, params, session_version(session), render_interactive)
+                    state.image = None
+                else:
+                    img_buf = figure_png(__file__, params, session_version(session), render)
+
+                    # # Store in session state
+                    # st.session_state.fig = fig
+                    state.image = img_buf
+                    state.figure = None
 
                 progress_bar.progress(100)
                 st.success("Graph generated successfully! 🎉")
@@ -84,20 +118,22 @@ with col_input:
                 st.error(f"{e}")
                 progress_bar.progress(0)
 
-if st.session_state.flgs_img_buf:
+if state.figure:
+    with col_graph:
+        st.plotly_chart(json.loads(state.figure), use_container_width=True)
+
+if state.image:
         with col_graph:
-            st.image(st.session_state.flgs_img_buf)
+            st.image(state.image)
 
     # Download button (Remains visible)
 
         st.download_button(
             label="📥 Download Graph",
-            data=st.session_state.flgs_img_buf,
+            data=state.image,
             file_name=f"Fastest_Lap_Gearshift_{year}.png",
             mime="image/png",
         )
 
-   
-
-
-  
+state.close()
+timing.report()
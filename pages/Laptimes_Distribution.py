@@ -1,24 +1,23 @@
-import seaborn as sns
-from matplotlib import pyplot as plt
 import streamlit as st
-import fastf1
-import fastf1.plotting
-import io
 
+from utils import page_state, session_loader, timing
+
+# Stage timings of this run, reported at the end of the script
+timing.start_page(__file__)
+
+# Session data this page reads, only these parts are loaded
+REQUIRED_DATA = ("laps",)
 
 # Page Configuration
 st.set_page_config(layout="wide", page_title="F1 Driver Laptimes Distibution", page_icon="🏎️")
 
-# FastF1's dark color scheme
-fastf1.plotting.setup_mpl(mpl_timedelta_support=True, misc_mpl_mods=False, color_scheme='fastf1')
-
 st.title("🏎️ F1 Driver Laptimes Distibution")
 
 # Create two columns: Graph (Left) | User Input (Right)
 col_graph, col_input = st.columns([4, 1])
 
-if "dldv_img_buf" not in st.session_state:
-    st.session_state.dldv_img_buf = None
+# This page's values in st.session_state, see utils.page_state
+state = page_state.scope(__file__)
 
 with col_input:
     st.write("### Select F1 Session")
@@ -27,78 +26,96 @@ with col_input:
     session_type = st.selectbox("Session Type", ['FP1', 'FP2', 'FP3', 'Q', 'S', 'SS', 'SQ', 'R'], index=0)
 
     if st.button("Generate Plot"):
-        with st.spinner("Fetching session data..."):
-            progress_bar = st.progress(10)
+        session_loader.start(state, year, grand_prix, session_type, REQUIRED_DATA)
+
+    # The plot is generated once the session has loaded in the background
+    if session_loader.finished(state):
+        with st.spinner("Generating plot..."):
+            progress_bar = st.progress(0)
+            timing.progress(progress_bar)
 
             try:
+                from utils.figure_cache import figure_png, session_version
+
                 # Fetch session data
-                session = fastf1.get_session(year, grand_prix, session_type)
-                session.load()
-                progress_bar.progress(30)
-
-                point_finishers = session.drivers[:10]
-                driver_laps = session.laps.pick_drivers(point_finishers).pick_quicklaps()
-                driver_laps = driver_laps.reset_index()
-                progress_bar.progress(50)
-
-                finishing_order = [session.get_driver(i)["Abbreviation"] for i in point_finishers]
-
-                # create the figure
-                fig, ax = plt.subplots(figsize=(10, 5))
-
-                # Seaborn doesn't have proper timedelta support,
-                # so we have to convert timedelta to float (in seconds)
-                driver_laps["LapTime(s)"] = driver_laps["LapTime"].dt.total_seconds()
-
-                sns.violinplot(data=driver_laps,
-                            x="Driver",
-                            y="LapTime(s)",
-                            hue="Driver",
-                            inner=None,
-                            density_norm="area",
-                            order=finishing_order,
-                            palette=fastf1.plotting.get_driver_color_mapping(session=session)
-                            )
-
-                sns.stripplot(data=driver_laps,
-                            x="Driver",
-                            y="LapTime(s)",
-                            order=finishing_order,
-                            hue="Compound",
-                            palette=fastf1.plotting.get_compound_mapping(session=session),
-                            hue_order=["SOFT", "MEDIUM", "HARD"],
-                            linewidth=0,
-                            size=4,
-                            )
-
-                ax.set_xlabel("Driver")
-                ax.set_ylabel("Lap Time(s)")
-                ax.invert_yaxis()
-                plt.suptitle(f"{year} {grand_prix} Grand Prix Lap Time Distributions")
-                plt.grid(color='w', which='major', axis='both')
-                sns.despine(left=True, bottom=True)
-                plt.tight_layout()
-
-                buf = io.BytesIO()
-                fig.savefig(buf, format='png', bbox_inches="tight")
-                buf.seek(0)
-
-                st.session_state.dldv_img_buf = buf
+                session = session_loader.result(state)
+
+                def render():
+                    import fastf1.plotting
+                    import seaborn as sns
+                    from matplotlib import pyplot as plt
+                    from utils.compact import plain_strings
+                    from utils.plotting import setup_mpl
+
+                    # FastF1's dark color scheme
+                    setup_mpl(mpl_timedelta_support=True, misc_mpl_mods=False, color_scheme='fastf1')
+
+                    point_finishers = session.drivers[:10]
+                    driver_laps = session.laps.pick_drivers(point_finishers).pick_quicklaps()
+                    driver_laps = plain_strings(driver_laps.reset_index())
+
+                    finishing_order = [session.get_driver(i)["Abbreviation"] for i in point_finishers]
+
+                    timing.mark("draw")
+                    # create the figure
+                    fig, ax = plt.subplots(figsize=(10, 5))
+
+                    # Seaborn doesn't have proper timedelta support,
+                    # so we have to convert timedelta to float (in seconds)
+                    driver_laps["LapTime(s)"] = driver_laps["LapTime"].dt.total_seconds()
+
+                    sns.violinplot(data=driver_laps,
+                                x="Driver",
+                                y="LapTime(s)",
+                                hue="Driver",
+                                inner=None,
+                                density_norm="area",
+                                order=finishing_order,
+                                palette=fastf1.plotting.get_driver_color_mapping(session=session)
+                                )
+
+                    sns.stripplot(data=driver_laps,
+                                x="Driver",
+                                y="LapTime(s)",
+                                order=finishing_order,
+                                hue="Compound",
+                                palette=fastf1.plotting.get_compound_mapping(session=session),
+                                hue_order=["SOFT", "MEDIUM", "HARD"],
+                                linewidth=0,
+                                size=4,
+                                )
+
+                    ax.set_xlabel("Driver")
+                    ax.set_ylabel("Lap Time(s)")
+                    ax.invert_yaxis()
+                    plt.suptitle(f"{session.event.year} {session.event['EventName']} Lap Time Distributions")
+                    plt.grid(color='w', which='major', axis='both')
+                    sns.despine(left=True, bottom=True)
+                    plt.tight_layout()
+                    return fig
+
+                params = {}
+                buf = figure_png(__file__, params, session_version(session), render)
+
+                state.image = buf
 
                 progress_bar.progress(100)
                 st.success("Graph generated successfully!")
 
             except Exception as e:
                 st.error(f"Failed to generate plot: {e}")
-                st.session_state.dldv_img_buf = None
+                state.image = None
 
-if st.session_state.dldv_img_buf:
+if state.image:
     with col_graph:
-        st.image(st.session_state.dldv_img_buf, use_container_width=True)
+        st.image(state.image, use_container_width=True)
 
     st.download_button(
         label="📥 Download Graph",
-        data=st.session_state.dldv_img_buf,
+        data=state.image,
         file_name=f"{grand_prix}_{year}_{session_type}_laptimes_distribution.png",
         mime="image/png"
-    )
\ No newline at end of file
+    )
+
+state.close()
+timing.report()
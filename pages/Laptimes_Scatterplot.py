@@ -1,26 +1,23 @@
 import streamlit as st
-import seaborn as sns
-from matplotlib import pyplot as plt
-import pandas as pd
-import io
-import fastf1
-import fastf1.plotting
+
+from utils import page_state, session_loader, timing
+
+# Stage timings of this run, reported at the end of the script
+timing.start_page(__file__)
+
+# Session data this page reads, only these parts are loaded
+REQUIRED_DATA = ("laps",)
 
 # Set page configuration
 st.set_page_config(layout="wide", page_title="F1 Laptimes Visualization", page_icon="🏎️")
 
-# Enable Matplotlib patches for plotting timedelta values and load FastF1's dark color scheme
-fastf1.plotting.setup_mpl(mpl_timedelta_support=True, misc_mpl_mods=False, color_scheme='fastf1')
-
 st.title("🏎️ F1 Laptimes Visualization")
 
 # Create two columns: Graph (Left) | User Input (Right)
 col_graph, col_input = st.columns([4, 1])
 
-if "laptime_plot_img_buf" not in st.session_state:
-    st.session_state.laptime_plot_img_buf = None
-if "dlc_drivers" not in st.session_state:
-    st.session_state.dlc_drivers = []
+# This page's values in st.session_state, see utils.page_state
+state = page_state.scope(__file__, requires=REQUIRED_DATA, drivers=[])
 
 with col_input:
     st.write("### Select F1 Session")
@@ -29,73 +26,91 @@ with col_input:
     session_type = st.selectbox("Session Type", ['FP1', 'FP2', 'FP3', 'Q', 'S', 'SS', 'SQ', 'R'], index=7)
 
     if st.button("Load Session"):
-        with st.spinner("Loading session data..."):
-            progress_bar = st.progress(10)
-            try:
-                race = fastf1.get_session(year, grand_prix, session_type)
-                race.load()
-                progress_bar.progress(50)
+        session_loader.start(state, year, grand_prix, session_type, REQUIRED_DATA)
 
-                st.session_state.session = race
-                st.session_state.dlc_drivers = pd.unique(race.laps['Driver'])
+    if session_loader.finished(state):
+        try:
+            import pandas as pd
 
-                progress_bar.progress(100)
-                st.success("Session loaded successfully!")
-            except Exception as e:
-                st.error(f"Failed to load session data: {e}")
-                st.session_state.session = None
+            race = session_loader.result(state)
 
-    if st.session_state.get("session"):
-        driver = st.selectbox("Driver", st.session_state.dlc_drivers)
+            state.session = race
+            state.drivers = pd.unique(race.laps['Driver'])
+
+            st.success("Session loaded successfully!")
+        except Exception as e:
+            st.error(f"Failed to load session data: {e}")
+            state.session = None
+
+    if state.session:
+        driver = st.selectbox("Driver", state.drivers)
 
         if st.button("Generate Plot"):
             with st.spinner("Generating plot..."):
-                progress_bar = st.progress(10)
+                progress_bar = st.progress(0)
+                timing.progress(progress_bar)
                 try:
-                    race = st.session_state.session
-                    driver_laps = race.laps.pick_driver(driver).pick_quicklaps().reset_index()
-
-                    fig, ax = plt.subplots(figsize=(8, 8))
-                    sns.scatterplot(
-                        data=driver_laps,
-                        x="LapNumber",
-                        y="LapTime",
-                        ax=ax,
-                        hue="Compound",
-                        palette=fastf1.plotting.get_compound_mapping(session=race),
-                        s=80,
-                        linewidth=0,
-                        legend='auto'
-                    )
-
-                    ax.set_xlabel("Lap Number")
-                    ax.set_ylabel("Lap Time")
-                    ax.invert_yaxis()
-                    plt.suptitle(f"{driver} Laptimes in the {year} {grand_prix} Grand Prix")
-                    plt.grid(color='w', which='major', axis='both')
-                    sns.despine(left=True, bottom=True)
-                    plt.tight_layout()
-
-                    buf = io.BytesIO()
-                    fig.savefig(buf, format='png', bbox_inches="tight")
-                    buf.seek(0)
-
-                    st.session_state.laptime_plot_img_buf = buf
+                    from utils.figure_cache import figure_png, session_version
+
+                    race = state.session
+
+                    def render():
+                        import fastf1.plotting
+                        import seaborn as sns
+                        from matplotlib import pyplot as plt
+                        from utils.compact import plain_strings
+                        from utils.plotting import setup_mpl
+
+                        # Enable Matplotlib patches for plotting timedelta values and load FastF1's dark color scheme
+                        setup_mpl(mpl_timedelta_support=True, misc_mpl_mods=False, color_scheme='fastf1')
+
+                        driver_laps = plain_strings(race.laps.pick_driver(driver).pick_quicklaps().reset_index())
+
+                        timing.mark("draw")
+                        fig, ax = plt.subplots(figsize=(8, 8))
+                        sns.scatterplot(
+                            data=driver_laps,
+                            x="LapNumber",
+                            y="LapTime",
+                            ax=ax,
+                            hue="Compound",
+                            palette=fastf1.plotting.get_compound_mapping(session=race),
+                            s=80,
+                            linewidth=0,
+                            legend='auto'
+                        )
+
+                        ax.set_xlabel("Lap Number")
+                        ax.set_ylabel("Lap Time")
+                        ax.invert_yaxis()
+                        plt.suptitle(f"{driver} Laptimes in the {race.event.year} {race.event['EventName']}")
+                        plt.grid(color='w', which='major', axis='both')
+                        sns.despine(left=True, bottom=True)
+                        plt.tight_layout()
+                        return fig
+
+                    params = {'driver': driver}
+                    buf = figure_png(__file__, params, session_version(race), render)
+
+                    state.image = buf
 
                     progress_bar.progress(100)
                     st.success("Graph generated successfully!")
 
                 except Exception as e:
                     st.error(f"Failed to generate plot: {e}")
-                    st.session_state.laptime_plot_img_buf = None
+                    state.image = None
 
-if st.session_state.laptime_plot_img_buf:
+if state.image:
     with col_graph:
-        st.image(st.session_state.laptime_plot_img_buf, use_container_width=True)
+        st.image(state.image, use_container_width=True)
 
     st.download_button(
         label="📥 Download Graph",
-        data=st.session_state.laptime_plot_img_buf,
+        data=state.image,
         file_name=f"{driver}_{grand_prix}_{year}_{session_type}_laptimes.png",
         mime="image/png"
     )
+
+state.close()
+timing.report()
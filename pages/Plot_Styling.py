@@ -1,24 +1,21 @@
 import streamlit as st
-import matplotlib.pyplot as plt
-import pandas as pd
-import io
-import fastf1
-import fastf1.plotting
 
-st.set_page_config(layout="wide", page_title="F1 Lap Time Visualization", page_icon="🏎️")
+from utils import page_state, session_loader, timing
+
+# Stage timings of this run, reported at the end of the script
+timing.start_page(__file__)
 
-fastf1.plotting.setup_mpl(mpl_timedelta_support=True, misc_mpl_mods=False, color_scheme='fastf1')
+# Session data this page reads, only these parts are loaded
+REQUIRED_DATA = ("laps",)
+
+st.set_page_config(layout="wide", page_title="F1 Lap Time Visualization", page_icon="🏎️")
 
 st.title("🏎️ F1 Lap Time Visualization")
 
 col_graph, col_input = st.columns([4, 1])
 
-if "dscps_plot_image" not in st.session_state:
-    st.session_state.dscps_plot_image = None
-if "dscps_drivers" not in st.session_state:
-    st.session_state.dscps_drivers = []
-if 'session' not in st.session_state:
-    st.session_state.session = None
+# This page's values in st.session_state, see utils.page_state
+state = page_state.scope(__file__, requires=REQUIRED_DATA, drivers=[])
 
 with col_input:
     st.write("### Select F1 Session")
@@ -27,65 +24,80 @@ with col_input:
     session_type = st.selectbox("Session Type", ['FP1', 'FP2', 'FP3', 'Q', 'S', 'SS', 'SQ', 'R'], index=7)
 
     if st.button("Load Session"):
-        with st.spinner("Loading session data..."):
-            try:
-                session = fastf1.get_session(year, grand_prix, session_type)
-                session.load()
-                st.session_state.session = session
-                st.session_state.dscps_drivers = pd.unique(session.laps['Driver'])
-                st.success("Session loaded successfully!")
-            except Exception as e:
-                st.error(f"Failed to load session data: {e}")
+        session_loader.start(state, year, grand_prix, session_type, REQUIRED_DATA)
+
+    if session_loader.finished(state):
+        try:
+            import pandas as pd
 
-    if st.session_state.session:
-        drivers_selected = st.multiselect("Select Drivers", st.session_state.dscps_drivers, default=[])
+            session = session_loader.result(state)
+            state.session = session
+            state.drivers = pd.unique(session.laps['Driver'])
+            st.success("Session loaded successfully!")
+        except Exception as e:
+            st.error(f"Failed to load session data: {e}")
+
+    if state.session:
+        drivers_selected = st.multiselect("Select Drivers", state.drivers, default=[])
         plot_option = st.radio("Plot Style", ["Basic Plot", "Sorted Legend", "Enhanced Style"])
 
         if st.button("Generate Plot"):
-            session = st.session_state.session
+            session = state.session
             try:
-                fig, ax = plt.subplots(figsize=(10, 6))
-
-                my_styles = [
-                    {'color': 'auto', 'linestyle': 'solid', 'linewidth': 5, 'alpha': 0.3},
-                    {'color': 'auto', 'linestyle': 'solid', 'linewidth': 1, 'alpha': 0.7}
-                ]
-
-                for driver in drivers_selected:
-                    laps = session.laps.pick_driver(driver).pick_quicklaps().reset_index()
-                    if plot_option == "Enhanced Style":
-                        style = fastf1.plotting.get_driver_style(driver, style=my_styles, session=session)
+                from utils.figure_cache import figure_png, session_version
+
+                def render():
+                    import fastf1.plotting
+                    import matplotlib.pyplot as plt
+                    from utils.plotting import setup_mpl
+
+                    setup_mpl(mpl_timedelta_support=True, misc_mpl_mods=False, color_scheme='fastf1')
+                    timing.mark("draw")
+                    fig, ax = plt.subplots(figsize=(10, 6))
+
+                    my_styles = [
+                        {'color': 'auto', 'linestyle': 'solid', 'linewidth': 5, 'alpha': 0.3},
+                        {'color': 'auto', 'linestyle': 'solid', 'linewidth': 1, 'alpha': 0.7}
+                    ]
+
+                    for driver in drivers_selected:
+                        laps = session.laps.pick_driver(driver).pick_quicklaps().reset_index()
+                        if plot_option == "Enhanced Style":
+                            style = fastf1.plotting.get_driver_style(driver, style=my_styles, session=session)
+                        else:
+                            style = fastf1.plotting.get_driver_style(driver, style=['color', 'linestyle'], session=session)
+                        ax.plot(laps['LapNumber'], laps['LapTime'], **style, label=driver)
+
+                    ax.set_xlabel("Lap Number")
+                    ax.set_ylabel("Lap Time")
+
+                    if plot_option == "Sorted Legend":
+                        fastf1.plotting.add_sorted_driver_legend(ax, session)
                     else:
-                        style = fastf1.plotting.get_driver_style(driver, style=['color', 'linestyle'], session=session)
-                    ax.plot(laps['LapNumber'], laps['LapTime'], **style, label=driver)
+                        ax.legend()
 
-                ax.set_xlabel("Lap Number")
-                ax.set_ylabel("Lap Time")
+                    plt.suptitle(f"Lap Time Comparison\n{session.event['EventName']} {session.event.year} {session.name}")
+                    return fig
 
-                if plot_option == "Sorted Legend":
-                    fastf1.plotting.add_sorted_driver_legend(ax, session)
-                else:
-                    ax.legend()
-
-                plt.suptitle(f"Lap Time Comparison\n{grand_prix} {year} {session_type}")
-
-                buf = io.BytesIO()
-                fig.savefig(buf, format='png', bbox_inches="tight")
-                buf.seek(0)
-                st.session_state.dscps_plot_image = buf
+                params = {'drivers': drivers_selected, 'plot_option': plot_option}
+                buf = figure_png(__file__, params, session_version(session), render)
+                state.image = buf
 
                 st.success("Plot generated successfully!")
             except Exception as e:
                 st.error(f"Failed to generate plot: {e}")
-                st.session_state.dscps_plot_image = None
+                state.image = None
 
-if st.session_state.dscps_plot_image:
+if state.image:
     with col_graph:
-        st.image(st.session_state.dscps_plot_image, use_container_width=True)
+        st.image(state.image, use_container_width=True)
 
     st.download_button(
         label="📥 Download Plot",
-        data=st.session_state.dscps_plot_image,
+        data=state.image,
         file_name=f"{grand_prix}_{year}_{session_type}_plot_styling.png",
         mime="image/png"
     )
+
+state.close()
+timing.report()
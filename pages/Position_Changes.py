@@ -1,23 +1,23 @@
 import streamlit as st
-import matplotlib.pyplot as plt
-import fastf1
-import fastf1.plotting
-import io
+
+from utils import page_state, session_loader, timing
+
+# Stage timings of this run, reported at the end of the script
+timing.start_page(__file__)
+
+# Session data this page reads, only these parts are loaded
+REQUIRED_DATA = ("laps",)
 
 # Set page configuration
 st.set_page_config(layout="wide", page_title="F1 Driver Position Plot", page_icon="🏎️")
 
-# Set up FastF1's dark color scheme
-fastf1.plotting.setup_mpl(mpl_timedelta_support=False, misc_mpl_mods=False, color_scheme='fastf1')
-
 st.title("F1 Driver Position Plot")
 
 # Create two columns: Graph (Left) | User Input (Right)
 col_graph, col_input = st.columns([4, 1])
 
-# Initialize session state variables
-if "pcdr_img_buf" not in st.session_state:
-    st.session_state.pcdr_img_buf = None
+# This page's values in st.session_state, see utils.page_state
+state = page_state.scope(__file__)
 
 with col_input:
     st.write("### Select F1 Session")
@@ -26,38 +26,45 @@ with col_input:
     identifier = st.selectbox("Session Type", ["R", "Q", "FP1", "FP2", "FP3"], index=0)
 
     if st.button("Generate Plot"):
-        with st.spinner("Loading session data..."):
-            progress_bar = st.progress(10)
+        session_loader.start(state, year, gp, identifier, REQUIRED_DATA)
+
+    # The plot is generated once the session has loaded in the background
+    if session_loader.finished(state):
+        with st.spinner("Generating plot..."):
+            progress_bar = st.progress(0)
+            timing.progress(progress_bar)
             try:
-                session = fastf1.get_session(year, gp, identifier)
-                session.load(telemetry=False, weather=False)
-                progress_bar.progress(40)
+                from utils.figure_cache import figure_png, session_version
 
-                fig, ax = plt.subplots(figsize=(10, 6))
+                session = session_loader.result(state)
 
-                for drv in session.drivers:
-                    drv_laps = session.laps.pick_driver(drv)
-                    abb = drv_laps['Driver'].iloc[0]
-                    style = fastf1.plotting.get_driver_style(identifier=abb, style=['color', 'linestyle'], session=session)
+                def render():
+                    import matplotlib.pyplot as plt
+                    from utils.plotting import setup_mpl
+                    from utils.positions import draw_positions, position_matrix
 
-                    ax.plot(drv_laps['LapNumber'], drv_laps['Position'], label=abb, **style)
+                    # Set up FastF1's dark color scheme
+                    setup_mpl(mpl_timedelta_support=False, misc_mpl_mods=False, color_scheme='fastf1')
 
-                ax.set_ylim([20.5, 0.5])
-                ax.set_yticks([1, 5, 10, 15, 20])
-                ax.set_xlabel('Lap')
-                ax.set_ylabel('Position')
-                ax.legend(bbox_to_anchor=(1.0, 1.02))
-                plt.tight_layout()
+                    positions = position_matrix(session)
+                    timing.mark("draw")
+                    fig, ax = plt.subplots(figsize=(10, 6))
+                    handles = draw_positions(ax, positions, session)
 
-                progress_bar.progress(80)
-                
-                # Save figure for persistent display and download
-                img_buf = io.BytesIO()
-                fig.savefig(img_buf, format="png", bbox_inches="tight")
-                img_buf.seek(0)
+                    ax.set_ylim([20.5, 0.5])
+                    ax.set_yticks([1, 5, 10, 15, 20])
+                    ax.set_xlabel('Lap')
+                    ax.set_ylabel('Position')
+                    ax.legend(handles=handles, bbox_to_anchor=(1.0, 1.02))
+                    plt.tight_layout()
+
+                    return fig
+
+                params = {}
+                img_buf = figure_png(__file__, params, session_version(session), render)
 
                 # Store in session state
-                st.session_state.pcdr_img_buf = img_buf
+                state.image = img_buf
 
                 progress_bar.progress(100)
                 st.success("Graph generated successfully! 🎉")
@@ -66,14 +73,16 @@ with col_input:
                 st.error(f"Failed to load session data: {e}")
                 progress_bar.progress(0)
 
-
-if st.session_state.pcdr_img_buf:
+if state.image:
     with col_graph:
-            st.image(st.session_state.pcdr_img_buf)
+            st.image(state.image)
     # Download button (Remains visible)
     st.download_button(
         label="📥 Download Graph",
-        data=st.session_state.pcdr_img_buf,
+        data=state.image,
         file_name=f"F1_Driver_Position_{year}.png",
         mime="image/png",
     )
+
+state.close()
+timing.report()
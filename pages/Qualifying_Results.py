@@ -1,73 +1,126 @@
 import streamlit as st
-import matplotlib.pyplot as plt
-import pandas as pd
-import numpy as np
-import fastf1
-import fastf1.plotting
-import io
+
+from utils import page_state, session_loader, timing
+
+# Stage timings of this run, reported at the end of the script
+timing.start_page(__file__)
+
+# Session data this page reads, only these parts are loaded
+REQUIRED_DATA = ("laps", "messages")
 
 # Page configuration
 st.set_page_config(layout="wide", page_title="F1 Qualifying Analysis", page_icon="🏁")
 
-# fastf1.plotting.setup_mpl(mpl_timedelta_support=True, misc_mpl_mods=False,color_scheme=None)
-
 st.title("🏁 Qualifying results overview")
 
 # Create two columns: Graph (Left) | User Input (Right)
 col_graph, col_input = st.columns([4, 1])
 
-if "qual_img_buf" not in st.session_state:
-    st.session_state.qual_img_buf = None
+# This page's values in st.session_state, see utils.page_state
+state = page_state.scope(__file__)
 
 with col_input:
     st.write("### Select F1 Session")
-    year = st.selectbox("Year", list(range(2018, 2025)), index=3)
+    # comparing loads the Grand Prix of every season in the range in parallel
+    compare = st.radio("Mode", ["Single season", "Compare seasons"], horizontal=True) == "Compare seasons"
+    if compare:
+        years = st.select_slider("Years", list(range(2018, 2025)), value=(2018, 2024))
+        years = list(range(years[0], years[1] + 1))
+        year = f"{years[0]}-{years[-1]}"
+    else:
+        year = st.selectbox("Year", list(range(2018, 2025)), index=3)
     grand_prix = st.text_input("Grand Prix (e.g., Spanish Grand Prix)", "Spanish Grand Prix")
     session_type = st.selectbox("Session Type", ['FP1', 'FP2', 'FP3', 'Q', 'S', 'SS', 'SQ', 'R'], index=0)
     
-    if st.button("Generate Plot"):
-        with st.spinner("Fetching session data..."):
-            progress_bar = st.progress(10)
+    generate = st.button("Generate Plot")
+    if generate and compare:
+        with st.spinner(f"Fetching {len(years)} seasons..."):
+            try:
+                from utils.figure_cache import figure_png, frame_version
+                from utils.seasons import compare_seasons
+
+                comparison = compare_seasons(years, grand_prix, session_type)
+                if comparison.errors:
+                    st.warning("Not loaded: " + ", ".join(f"{y} ({e})" for y, e in sorted(comparison.errors.items())))
+
+                def render_seasons():
+                    import matplotlib.pyplot as plt
+                    from utils.plotting import setup_mpl
+
+                    setup_mpl(mpl_timedelta_support=True, misc_mpl_mods=False, color_scheme=None)
+
+                    laps = comparison.laps
+                    poles = laps.groupby("Year").first()
+                    pole_seconds = poles["LapTime"].dt.total_seconds()
+
+                    timing.mark("draw")
+                    fig, (ax_pole, ax_gap) = plt.subplots(2, 1, figsize=(12, 8), sharex=True,
+                                                          gridspec_kw={'height_ratios': [1, 2]})
+                    ax_pole.plot(poles.index, pole_seconds, marker='o', color='black')
+                    for season, seconds, driver in zip(poles.index, pole_seconds, poles['Driver']):
+                        ax_pole.annotate(driver, (season, seconds), textcoords='offset points', xytext=(0, 6), ha='center')
+                    ax_pole.set_ylabel('Fastest lap in s')
+
+                    ax_gap.scatter(laps['Year'], laps['LapTimeDelta'].dt.total_seconds(),
+                                   color=laps['TeamColor'], edgecolor='grey', zorder=3)
+                    ax_gap.invert_yaxis()
+                    ax_gap.set_ylabel('Gap to the fastest lap in s')
+                    ax_gap.set_xticks(list(poles.index))
+                    ax_gap.yaxis.grid(True, which='major', linestyle='--', color='black', zorder=-1000)
+
+                    plt.suptitle(f"{grand_prix} {session_type} {year}\nFastest lap of every driver per season")
+                    return fig
+
+                params = {'years': years, 'grand_prix': grand_prix, 'session_type': session_type}
+                state.image = figure_png(__file__, params, frame_version(comparison.laps),
+                                         render_seasons)
+                st.success("Graph generated successfully! 🎉")
+
+            except Exception as e:
+                st.error(f"{e}")
+
+    if generate and not compare:
+        session_loader.start(state, year, grand_prix, session_type, REQUIRED_DATA)
+
+    # The plot is generated once the session has loaded in the background
+    if not compare and session_loader.finished(state):
+        with st.spinner("Generating plot..."):
+            progress_bar = st.progress(0)
+            timing.progress(progress_bar)
             
             try:
+                from utils.figure_cache import figure_png, session_version
 
-                session = fastf1.get_session(year, grand_prix, session_type)
-                session.load()
-                progress_bar.progress(30)
+                session = session_loader.result(state)
 
-                drivers = pd.unique(session.laps['Driver'])
-                list_fastest_laps = []
-                
-                for drv in drivers:
-                    drvs_fastest_lap = session.laps.pick_driver(drv).pick_fastest()
-                    list_fastest_laps.append(drvs_fastest_lap)
-                
-                progress_bar.progress(50)
-                fastest_laps = fastf1.core.Laps(list_fastest_laps).sort_values(by='LapTime').reset_index(drop=True)
-                pole_lap = fastest_laps.pick_fastest()
-                fastest_laps['LapTimeDelta'] = fastest_laps['LapTime'] - pole_lap['LapTime']
-                
-                team_colors = [fastf1.plotting.get_team_color(lap['Team'], session=session) for _, lap in fastest_laps.iterlaps()]
-                
-                progress_bar.progress(70)
-                # Create Matplotlib figure
-                fig, ax = plt.subplots(figsize=(12, 6))
-                ax.barh(fastest_laps.index, fastest_laps['LapTimeDelta'], color=team_colors, edgecolor='grey')
-                ax.set_yticks(fastest_laps.index)
-                ax.set_yticklabels(fastest_laps['Driver'])
-                ax.invert_yaxis()
-                ax.set_axisbelow(True)
-                ax.xaxis.grid(True, which='major', linestyle='--', color='black', zorder=-1000)
+                def render():
+                    import matplotlib.pyplot as plt
+                    from utils.plotting import setup_mpl
+                    from utils.rankings import rank_fastest_laps
+
+                    setup_mpl(mpl_timedelta_support=True, misc_mpl_mods=False, color_scheme=None)
+
+                    fastest_laps = rank_fastest_laps(session, segments=False)
+                    pole_lap = fastest_laps.iloc[0]
                 
-                lap_time_string = f"{pole_lap['LapTime'].seconds}.{pole_lap['LapTime'].microseconds//1000}"
-                plt.suptitle(f"{session.event['EventName']} {session.event.year} Qualifying\nFastest Lap: {lap_time_string} ({pole_lap['Driver']})")
+                    timing.mark("draw")
+                    # Create Matplotlib figure
+                    fig, ax = plt.subplots(figsize=(12, 6))
+                    ax.barh(fastest_laps.index, fastest_laps['LapTimeDelta'], color=fastest_laps['TeamColor'], edgecolor='grey')
+                    ax.set_yticks(fastest_laps.index)
+                    ax.set_yticklabels(fastest_laps['Driver'])
+                    ax.invert_yaxis()
+                    ax.set_axisbelow(True)
+                    ax.xaxis.grid(True, which='major', linestyle='--', color='black', zorder=-1000)
                 
-                progress_bar.progress(90)
+                    lap_time_string = f"{pole_lap['LapTime'].seconds}.{pole_lap['LapTime'].microseconds//1000}"
+                    plt.suptitle(f"{session.event['EventName']} {session.event.year} Qualifying\nFastest Lap: {lap_time_string} ({pole_lap['Driver']})")
                 
-                img_buf = io.BytesIO()
-                fig.savefig(img_buf, format="png", bbox_inches="tight")
-                img_buf.seek(0)
-                st.session_state.qual_img_buf = img_buf
+                    return fig
+
+                params = {}
+                img_buf = figure_png(__file__, params, session_version(session), render)
+                state.image = img_buf
                 
                 progress_bar.progress(100)
                 st.success("Graph generated successfully! 🎉")
@@ -76,12 +129,15 @@ with col_input:
                 st.error(f"{e}")
                 progress_bar.progress(0)
 
-if st.session_state.qual_img_buf:
+if state.image:
     with col_graph:
-        st.image(st.session_state.qual_img_buf)
+        st.image(state.image)
     st.download_button(
         label="📥 Download Graph",
-        data=st.session_state.qual_img_buf,
+        data=state.image,
         file_name=f"Fastest_Laps_Qualifying_{year}.png",
         mime="image/png",
     )
+
+state.close()
+timing.report()
@@ -1,111 +1,183 @@
 import streamlit as st
-import matplotlib.pyplot as plt
-import pandas as pd
-import io
-import fastf1
-import fastf1.plotting
+
+from utils import page_state, session_loader, timing
+
+# Stage timings of this run, reported at the end of the script
+timing.start_page(__file__)
+
+# Session data this page reads, only these parts are loaded
+REQUIRED_DATA = ("laps", "car_data", "messages")
 
 # Set page configuration
 st.set_page_config(layout="wide", page_title="F1 Speed Overlay Visualization", page_icon="🏎️")
 
-# Enable Matplotlib patches for plotting timedelta values and load FastF1's dark color scheme
-fastf1.plotting.setup_mpl(mpl_timedelta_support=True, misc_mpl_mods=False, color_scheme='fastf1')
-
 st.title("🏎️ F1  Speed Overlay Visualization")
 
 # Create two columns: Graph (Left) | User Input (Right)
 col_graph, col_input = st.columns([4, 1])
 
-if "osttl_img_buf" not in st.session_state:
-    st.session_state.osttl_img_buf = None
-
-if "osttl_drivers" not in st.session_state:
-    st.session_state.osttl_drivers = []
+# This page's values in st.session_state, see utils.page_state
+state = page_state.scope(__file__, requires=REQUIRED_DATA, drivers=[])
 
 with col_input:
     st.write("### Select F1 Session")
-    year = st.selectbox("Year", list(range(2018, 2026)), index=3)
+    # comparing overlays the fastest lap of every season in the range,
+    # loaded in parallel
+    compare = st.radio("Mode", ["Single season", "Compare seasons"], horizontal=True) == "Compare seasons"
+    if compare:
+        years = st.select_slider("Years", list(range(2018, 2026)), value=(2018, 2024))
+        years = list(range(years[0], years[1] + 1))
+        year = f"{years[0]}-{years[-1]}"
+    else:
+        year = st.selectbox("Year", list(range(2018, 2026)), index=3)
     grand_prix = st.text_input("Grand Prix (e.g., Spanish Grand Prix)", "Spanish Grand Prix")
     session_type = st.selectbox("Session Type", ['FP1', 'FP2', 'FP3', 'Q', 'S', 'SS', 'SQ', 'R'], index=0)
 
-    # Initialize session state
-    if 'session' not in st.session_state:
-        st.session_state.session = None
-    if 'osttl_drivers' not in st.session_state:
-        st.session_state.osttl_drivers = []
-    if 'osttl_plot_image' not in st.session_state:
-        st.session_state.osttl_plot_image = None
+    if compare and st.button("Generate Plot"):
+        with st.spinner(f"Loading {len(years)} seasons..."):
+            try:
+                from utils.figure_cache import figure_png, frame_version
+                from utils.seasons import compare_seasons
+
+                comparison = compare_seasons(years, grand_prix, session_type, traces=True)
+                if comparison.errors:
+                    st.warning("Not loaded: " + ", ".join(f"{y} ({e})" for y, e in sorted(comparison.errors.items())))
+
+                def render_seasons():
+                    import matplotlib.pyplot as plt
+                    import numpy as np
+                    from utils.alignment import delta_time
+                    from utils.downsample import downsample, pixel_width
+                    from utils.plotting import setup_mpl
+
+                    setup_mpl(mpl_timedelta_support=True, misc_mpl_mods=False, color_scheme='fastf1')
+
+                    seasons = list(comparison.traces)
+                    poles = comparison.laps.groupby("Year").first()
+                    distance = comparison.distance
+                    speed = np.stack([comparison.traces[season][1] for season in seasons])
+                    delta = delta_time(np.stack([comparison.traces[season][0] for season in seasons]))
+                    colors = plt.colormaps['viridis'](np.linspace(0, 1, len(seasons)))
+
+                    timing.mark("draw")
+                    fig, (ax, ax_delta) = plt.subplots(2, 1, figsize=(10, 8), sharex=True,
+                                                       gridspec_kw={'height_ratios': [3, 1]})
+                    for season, color, season_speed, season_delta in zip(seasons, colors, speed, delta):
+                        label = f"{season} {poles.loc[season, 'Driver']}"
+                        idx = downsample(distance, season_speed, pixel_width(ax))
+                        ax.plot(distance[idx], season_speed[idx], label=label, color=color)
+                        idx = downsample(distance, season_delta, pixel_width(ax_delta))
+                        ax_delta.plot(distance[idx], season_delta[idx], color=color)
 
-    if st.button("Load Session"):
-        with st.spinner("Loading session data..."):
-            progress_bar = st.progress(10)
+                    ax.set_ylabel('Speed in km/h')
+                    ax.legend()
+                    ax_delta.set_xlabel('Distance in m')
+                    ax_delta.set_ylabel(f'Delta to {seasons[0]} in s')
+
+                    plt.suptitle(f"Fastest Lap per Season\n{grand_prix} {year} {session_type}")
+                    return fig
+
+                params = {'years': years, 'grand_prix': grand_prix, 'session_type': session_type}
+                state.image = figure_png(__file__, params, frame_version(comparison.laps),
+                                         render_seasons)
+                st.success("Graph generated successfully! 🎉")
 
-            try:
-                session = fastf1.get_session(year, grand_prix, session_type)
-                session.load()
-                progress_bar.progress(30)
-
-                st.session_state.session = session
-                st.session_state.osttl_drivers = pd.unique(session.laps['Driver'])
-                progress_bar.progress(100)
-                st.success("Session loaded successfully!")
             except Exception as e:
-                st.error(f"Failed to load session data: {e}")
+                st.error(f"Failed to generate plot: {e}")
+                state.image = None
 
-    if st.session_state.session:
-        driver1 = st.selectbox("Driver 1", st.session_state.osttl_drivers, key="driver1")
-        driver2 = st.selectbox("Driver 2", st.session_state.osttl_drivers, key="driver2")
+    if not compare and st.button("Load Session"):
+        session_loader.start(state, year, grand_prix, session_type, REQUIRED_DATA)
 
-        if st.button("Generate Plot"):
-            session = st.session_state.session
+    if not compare and session_loader.finished(state):
+        try:
+            import pandas as pd
 
+            session = session_loader.result(state)
+
+            state.session = session
+            state.drivers = pd.unique(session.laps['Driver'])
+            st.success("Session loaded successfully!")
+        except Exception as e:
+            st.error(f"Failed to load session data: {e}")
+
+    if state.session and not compare:
+        drivers = st.multiselect("Drivers", state.drivers,
+                                 default=list(state.drivers[:2]), max_selections=20)
+        reference = st.selectbox("Delta reference", drivers)
+
+        if st.button("Generate Plot") and drivers:
             with st.spinner("Generating plot..."):
-                progress_bar = st.progress(10)
+                progress_bar = st.progress(0)
+                timing.progress(progress_bar)
                 try:
-                    lap1 = session.laps.pick_driver(driver1).pick_fastest()
-                    lap2 = session.laps.pick_driver(driver2).pick_fastest()
-                    progress_bar.progress(30)
+                    from utils.figure_cache import figure_png, session_version
+                    from utils.session_cache import ensure_data
 
-                    tel1 = lap1.get_car_data().add_distance()
-                    tel2 = lap2.get_car_data().add_distance()
-                    progress_bar.progress(60)
+                    session = ensure_data(state.session, REQUIRED_DATA)
 
-                    color1 = fastf1.plotting.get_team_color(lap1['Team'], session=session)
-                    color2 = fastf1.plotting.get_team_color(lap2['Team'], session=session)
-                    progress_bar.progress(90)
+                    def render():
+                        import fastf1.plotting
+                        import matplotlib.pyplot as plt
+                        from utils.alignment import aligned_laps, delta_time
+                        from utils.downsample import downsample, pixel_width
+                        from utils.plotting import setup_mpl
+                        from utils.rankings import rank_fastest_laps
 
-                    fig, ax = plt.subplots(figsize=(10, 6))
-                    ax.plot(tel1['Distance'], tel1['Speed'], color=color1, label=driver1)
-                    ax.plot(tel2['Distance'], tel2['Speed'], color=color2, label=driver2)
+                        # Enable Matplotlib patches for plotting timedelta values and load FastF1's dark color scheme
+                        setup_mpl(mpl_timedelta_support=True, misc_mpl_mods=False, color_scheme='fastf1')
 
-                    ax.set_xlabel('Distance in m')
-                    ax.set_ylabel('Speed in km/h')
-                    ax.legend()
+                        fastest_laps = rank_fastest_laps(session, segments=False).set_index('Driver', drop=False)
+                        laps = [fastest_laps.loc[drv] for drv in drivers]
 
-                    plt.suptitle(f"Fastest Lap Comparison\n{session.event['EventName']} {session.event.year} {session_type}")
+                        # Fastest laps resampled onto a shared distance grid
+                        distance, time, speed = aligned_laps(session, laps)
+                        delta = delta_time(time, reference=drivers.index(reference))
 
-                    # Convert plot to image for download
-                    buf = io.BytesIO()
-                    fig.savefig(buf, format='png', bbox_inches="tight")
-                    buf.seek(0)
+                        styles = [fastf1.plotting.get_driver_style(identifier=drv, style=['color', 'linestyle'], session=session)
+                                  for drv in drivers]
 
-                    st.session_state.osttl_plot_image = buf
+                        timing.mark("draw")
+                        fig, (ax, ax_delta) = plt.subplots(2, 1, figsize=(10, 8), sharex=True,
+                                                           gridspec_kw={'height_ratios': [3, 1]})
+                        for drv, style, drv_speed, drv_delta in zip(drivers, styles, speed, delta):
+                            # Only keep the samples that are visible at the figure's resolution
+                            idx = downsample(distance, drv_speed, pixel_width(ax))
+                            ax.plot(distance[idx], drv_speed[idx], label=drv, **style)
+                            idx = downsample(distance, drv_delta, pixel_width(ax_delta))
+                            ax_delta.plot(distance[idx], drv_delta[idx], **style)
+
+                        ax.set_ylabel('Speed in km/h')
+                        ax.legend()
+                        ax_delta.set_xlabel('Distance in m')
+                        ax_delta.set_ylabel(f'Delta to {reference} in s')
+
+                        plt.suptitle(f"Fastest Lap Comparison\n{session.event['EventName']} {session.event.year} {session.name}")
+                        return fig
+
+                    params = {'drivers': drivers, 'reference': reference}
+                    buf = figure_png(__file__, params, session_version(session), render)
+
+                    state.image = buf
 
                     progress_bar.progress(100)
                     st.success("Graph generated successfully! 🎉")
 
                 except Exception as e:
                     st.error(f"Failed to generate plot: {e}")
-                    st.session_state.osttl_plot_image = None
+                    state.image = None
                     progress_bar.progress(0)
 
-if st.session_state.osttl_plot_image:
+if state.image:
     with col_graph:
-        st.image(st.session_state.osttl_plot_image, use_container_width=True)
+        st.image(state.image, use_container_width=True)
 
     st.download_button(
         label="📥 Download Graph",
-        data=st.session_state.osttl_plot_image,
+        data=state.image,
         file_name=f"{grand_prix}_{year}_{session_type}_comparison.png",
         mime="image/png"
     )
+
+state.close()
+timing.report()
@@ -1,12 +1,13 @@
 import streamlit as st
-import matplotlib.pyplot as plt
-import numpy as np
-import fastf1
-import fastf1.plotting
-import pandas as pd
-from matplotlib.collections import LineCollection
-import matplotlib as mpl
-import io
+import json
+
+from utils import page_state, session_loader, timing
+
+# Stage timings of this run, reported at the end of the script
+timing.start_page(__file__)
+
+# Session data this page reads, only these parts are loaded
+REQUIRED_DATA = ("laps", "car_data", "pos_data", "messages")
 
 # Set page configuration
 st.set_page_config(layout="wide", page_title="F1 Speed On Track Visualization", page_icon="🏁")
@@ -16,16 +17,8 @@ st.title("🏁 F1 Speed On Track Visualization")
 # Create two columns: Graph (Left) | User Input (Right)
 col_graph, col_input = st.columns([4, 1])
 
-colormap = mpl.cm.plasma
-
-if "session" not in st.session_state:
-    st.session_state.session = None
-
-if "drivers" not in st.session_state:
-    st.session_state.drivers = []
-
-if "svot_image" not in st.session_state:
-    st.session_state.svot_image = None
+# This page's values in st.session_state, see utils.page_state
+state = page_state.scope(__file__, requires=REQUIRED_DATA, drivers=[])
 
 with col_input:
     st.write("### Select F1 Session")
@@ -34,80 +27,130 @@ with col_input:
     ses = st.selectbox("Session Type", ['FP1', 'FP2', 'FP3', 'Q', 'S', 'SS', 'SQ', 'R'], index=0)
 
     if st.button("Load Session"):
-        with st.spinner("Loading session data..."):
-            try:
-                session = fastf1.get_session(year, wknd, ses)
-                session.load()
-                st.session_state.session = session
-                st.session_state.drivers = pd.unique(session.laps['Driver'])
-                st.success("Session loaded successfully!")
-            except Exception as e:
-                st.error(f"Failed to load session data: {e}")
-
-    if st.session_state.session:
-        driver = st.selectbox("Select Driver", st.session_state.drivers, key="driver")
+        session_loader.start(state, year, wknd, ses, REQUIRED_DATA)
 
-        if st.button("Generate Plot"):
-            session = st.session_state.session
-            with st.spinner("Generating plot..."):
-                try:
-                    weekend = session.event
-                    lap = session.laps.pick_driver(driver).pick_fastest()
-                    x = lap.telemetry['X']
-                    y = lap.telemetry['Y']
-                    color = lap.telemetry['Speed']
-                    points = np.array([x, y]).T.reshape(-1, 1, 2)
-                    segments = np.concatenate([points[:-1], points[1:]], axis=1)
-                    
-                    # We create a plot with title and adjust some setting to make it look good.
-                    fig, ax = plt.subplots(sharex=True, sharey=True, figsize=(12, 6.75))
-                    fig.suptitle(f'{weekend.name} {year} - {driver} - Speed', size=24, y=0.97)
+    if session_loader.finished(state):
+        try:
+            import pandas as pd
 
-                    # Adjust margins and turn of axis
-                    plt.subplots_adjust(left=0.1, right=0.9, top=0.9, bottom=0.12)
-                    ax.axis('off')
+            session = session_loader.result(state)
+            state.session = session
+            state.drivers = pd.unique(session.laps['Driver'])
+            st.success("Session loaded successfully!")
+        except Exception as e:
+            st.error(f"Failed to load session data: {e}")
 
+    if state.session:
+        driver = st.selectbox("Select Driver", state.drivers, key=state.key("driver"))
+        # Interactive mode sends decimated samples to a WebGL plot, so pan and
+        # zoom happen in the browser instead of re-rendering an image
+        render_mode = st.radio("Rendering", ["Image", "Interactive"], horizontal=True)
 
-                    # After this, we plot the data itself.
-                    # Create background track line
-                    ax.plot(lap.telemetry['X'], lap.telemetry['Y'],
-                            color='black', linestyle='-', linewidth=16, zorder=0)
+        if st.button("Generate Plot"):
+            with st.spinner("Generating plot..."):
+                try:
+                    from utils.figure_cache import figure_json, figure_png, session_version
+                    from utils.lazy_telemetry import lap_telemetry
+                    from utils.session_cache import ensure_data
+                    from utils.track_geometry import session_geometry
+
+                    session = ensure_data(state.session, REQUIRED_DATA)
+                    geometry = session_geometry(session)
+
+                    def render():
+                        import matplotlib as mpl
+                        import matplotlib.pyplot as plt
+                        import numpy as np
+                        from matplotlib.collections import LineCollection
+                        from utils.downsample import downsample_frame, track_width
+                        from utils.plotting import setup_mpl
+
+                        setup_mpl(mpl_timedelta_support=False, misc_mpl_mods=False, color_scheme=None)
+
+                        colormap = mpl.cm.plasma
+                        weekend = session.event
+                        lap = session.laps.pick_driver(driver).pick_fastest()
+                        # same orientation as the circuit map
+                        tel = geometry.rotate_frame(lap_telemetry(lap))
+
+                        timing.mark("draw")
+                        # We create a plot with title and adjust some setting to make it look good.
+                        fig, ax = plt.subplots(sharex=True, sharey=True, figsize=(12, 6.75))
+                        fig.suptitle(f'{weekend.name} {weekend.year} - {driver} - Speed', size=24, y=0.97)
+
+                        # Only keep the samples that are visible at the figure's resolution
+                        tel = downsample_frame(tel, 'Distance', 'Speed', track_width(ax))
+                        x = tel['X']
+                        y = tel['Y']
+                        color = tel['Speed']
+                        points = np.array([x, y]).T.reshape(-1, 1, 2)
+                        segments = np.concatenate([points[:-1], points[1:]], axis=1)
+
+                        # Adjust margins and turn of axis
+                        plt.subplots_adjust(left=0.1, right=0.9, top=0.9, bottom=0.12)
+                        ax.axis('off')
+
+                        # After this, we plot the data itself.
+                        # Create background track line
+                        ax.plot(tel['X'], tel['Y'],
+                                color='black', linestyle='-', linewidth=16, zorder=0)
 
                     
 
-                    # Create a continuous norm to map from data points to colors
-                    norm = plt.Normalize(color.min(), color.max())
-                    lc = LineCollection(segments, cmap=colormap, norm=norm,
-                                        linestyle='-', linewidth=5)
-
-                    # Set the values used for colormapping
-                    lc.set_array(color)
-
-                    # Merge all line segments together
-                    line = ax.add_collection(lc)
-
-
-                    # Finally, we create a color bar as a legend.
-                    cbaxes = fig.add_axes([0.25, 0.05, 0.5, 0.05])
-                    normlegend = mpl.colors.Normalize(vmin=color.min(), vmax=color.max())
-                    legend = mpl.colorbar.ColorbarBase(cbaxes, norm=normlegend, cmap=colormap,
-                                                    orientation="horizontal")
-                    
-                    buf = io.BytesIO()
-                    fig.savefig(buf, format='png', bbox_inches="tight")
-                    buf.seek(0)
-                    st.session_state.svot_image = buf
+                        # Create a continuous norm to map from data points to colors
+                        norm = plt.Normalize(color.min(), color.max())
+                        lc = LineCollection(segments, cmap=colormap, norm=norm,
+                                            linestyle='-', linewidth=5)
+
+                        # Set the values used for colormapping
+                        lc.set_array(color)
+
+                        # Merge all line segments together
+                        ax.add_collection(lc)
+
+                        # Finally, we create a color bar as a legend.
+                        cbaxes = fig.add_axes([0.25, 0.05, 0.5, 0.05])
+                        normlegend = mpl.colors.Normalize(vmin=color.min(), vmax=color.max())
+                        mpl.colorbar.ColorbarBase(cbaxes, norm=normlegend, cmap=colormap,
+                                                  orientation="horizontal")
+                        return fig
+
+                    def render_interactive():
+                        from utils import interactive
+
+                        lap = session.laps.pick_driver(driver).pick_fastest()
+                        title = f'{session.event.name} {session.event.year} - {driver} - Speed'
+                        tel = geometry.rotate_frame(lap_telemetry(lap))
+                        return interactive.speed_on_track(tel, title)
+
+                    params = {'driver': driver}
+                    if render_mode == "Interactive":
+                        state.figure = figure_json(
+                            __file__, params, session_version(session), render_interactive)
+                        state.image = None
+                    else:
+                        buf = figure_png(__file__, params, session_version(session), render)
+                        state.image = buf
+                        state.figure = None
                     st.success("Graph generated successfully! 🎉")
                 except Exception as e:
                     st.error(f"Failed to generate plot: {e}")
-                    st.session_state.svot_image = None
+                    state.image = None
+                    state.figure = None
 
-if st.session_state.svot_image:
+if state.figure:
     with col_graph:
-        st.image(st.session_state.svot_image, use_container_width=True)
+        st.plotly_chart(json.loads(state.figure), use_container_width=True)
+
+if state.image:
+    with col_graph:
+        st.image(state.image, use_container_width=True)
     st.download_button(
         label="📥 Download Graph",
-        data=st.session_state.svot_image,
+        data=state.image,
         file_name=f"F1_{year}_{ses}_{driver}_speed_on_track.png",
         mime="image/png"
     )
+
+state.close()
+timing.report()
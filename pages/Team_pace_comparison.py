@@ -1,109 +1,171 @@
 import streamlit as st
-import matplotlib.pyplot as plt
-import pandas as pd
-import io
-import fastf1
-import fastf1.plotting
-import seaborn as sns
+
+from utils import page_state, session_loader, timing
+
+# Stage timings of this run, reported at the end of the script
+timing.start_page(__file__)
+
+# Session data this page reads, only these parts are loaded
+REQUIRED_DATA = ("laps",)
 
 # Set page configuration
 st.set_page_config(layout="wide", page_title="F1 Team Pace Comparison", page_icon="🏎️")
 
-# Enable Matplotlib patches for plotting timedelta values and load FastF1's dark color scheme
-fastf1.plotting.setup_mpl(mpl_timedelta_support=False, misc_mpl_mods=False, color_scheme='fastf1')
-
 st.title("🏎️ F1 Team Pace Comparison")
 
 # Create two columns: Graph (Left) | User Input (Right)
 col_graph, col_input = st.columns([4, 1])
 
-if "team_pace_img_buf" not in st.session_state:
-    st.session_state.team_pace_img_buf = None
+# This page's values in st.session_state, see utils.page_state
+state = page_state.scope(__file__, requires=REQUIRED_DATA)
 
 with col_input:
     st.write("### Select F1 Session")
+    # the season view only reads the laps of the rounds loaded so far, see
+    # utils.season_laps; no session is loaded for it
+    season_view = st.radio("View", ["Session", "Season"], horizontal=True) == "Season"
     year = st.selectbox("Year", list(range(2018, 2025)), index=3)
-    grand_prix = st.text_input("Grand Prix (e.g., Spanish Grand Prix)", "Spanish Grand Prix")
+    if season_view:
+        grand_prix = "Season"
+    else:
+        grand_prix = st.text_input("Grand Prix (e.g., Spanish Grand Prix)", "Spanish Grand Prix")
     session_type = st.selectbox("Session Type", ['FP1', 'FP2', 'FP3', 'Q', 'S', 'SS', 'SQ', 'R'], index=0)
 
-    if 'session' not in st.session_state:
-        st.session_state.session = None
-
-    if st.button("Generate Plot"):
-        with st.spinner("Loading session data..."):
-            progress_bar = st.progress(10)
-
-            try:
-                progress_bar.progress(25)
-                session = fastf1.get_session(year, grand_prix, session_type)
-                session.load()
-                progress_bar.progress(50)
-                st.session_state.session = session
-                progress_bar.progress(100)
-                st.success("Session loaded successfully!")
-            except Exception as e:
-                st.error(f"Failed to load session data: {e}")
-
-    if st.session_state.session:
+    generate = st.button("Generate Plot")
+    if generate and season_view:
+        try:
+            from utils.figure_cache import figure_png, frame_version
+            from utils.season_laps import season_laps, team_pace
+
+            laps = season_laps(year, session_type)
+            if laps is None or laps.empty:
+                raise ValueError(f"No {session_type} session of {year} has been loaded yet")
+            rounds = sorted(laps["Round"].unique())
+            st.caption(f"Rounds loaded so far: {', '.join(map(str, rounds))}")
+
+            def render_season():
+                import matplotlib.pyplot as plt
+                from utils.plotting import setup_mpl
+
+                setup_mpl(mpl_timedelta_support=False, misc_mpl_mods=False, color_scheme='fastf1')
+
+                per_round, season = team_pace(laps)
+                colors = (laps.drop_duplicates("Team", keep="last").set_index("Team")["TeamColor"]
+                          .astype(object).fillna("grey"))
+
+                timing.mark("draw")
+                fig, (ax_rounds, ax_season) = plt.subplots(1, 2, figsize=(15, 8),
+                                                           gridspec_kw={'width_ratios': [3, 1]})
+                for team in per_round.columns:
+                    ax_rounds.plot(per_round.index, per_round[team], marker='o', color=colors[team], label=team)
+                ax_rounds.set_xticks(rounds)
+                ax_rounds.set_xlabel("Round")
+                ax_rounds.set_ylabel("Gap of the median quick lap to the fastest team in %")
+                ax_rounds.invert_yaxis()
+                ax_rounds.legend()
+
+                ax_season.barh(season.index, season.values, color=[colors[team] for team in season.index])
+                ax_season.invert_yaxis()
+                ax_season.set_xlabel("Season median gap in %")
+
+                plt.suptitle(f"{year} Team Pace Comparison, {len(rounds)} rounds")
+                plt.tight_layout()
+                return fig
+
+            params = {'year': year, 'session_type': session_type}
+            state.image = figure_png(__file__, params, frame_version(laps), render_season)
+            st.success("Graph generated successfully! 🎉")
+        except Exception as e:
+            st.error(f"Failed to generate plot: {e}")
+            state.image = None
+
+    if generate and not season_view:
+        session_loader.start(state, year, grand_prix, session_type, REQUIRED_DATA)
+
+    if not season_view and session_loader.finished(state):
+        try:
+            state.session = session_loader.result(state)
+            st.success("Session loaded successfully!")
+        except Exception as e:
+            st.error(f"Failed to load session data: {e}")
+
+    if state.session and not season_view:
         # if st.button("Generate Plot"):
-            session = st.session_state.session
+            session = state.session
 
             with st.spinner("Generating plot..."):
-                progress_bar = st.progress(10)
+                progress_bar = st.progress(0)
+                timing.progress(progress_bar)
                 try:
-                    laps = session.laps.pick_quicklaps()
-                    transformed_laps = laps.copy()
-                    transformed_laps.loc[:, "LapTime (s)"] = laps["LapTime"].dt.total_seconds()
-
-                    team_order = (
-                        transformed_laps[["Team", "LapTime (s)"]]
-                        .groupby("Team")
-                        .median()["LapTime (s)"]
-                        .sort_values()
-                        .index
-                    )
+                    from utils.figure_cache import figure_png, session_version
+
+                    def render():
+                        import fastf1.plotting
+                        import matplotlib.pyplot as plt
+                        import seaborn as sns
+                        from utils.compact import plain_strings
+                        from utils.plotting import setup_mpl
+
+                        # Enable Matplotlib patches for plotting timedelta values and load FastF1's dark color scheme
+                        setup_mpl(mpl_timedelta_support=False, misc_mpl_mods=False, color_scheme='fastf1')
+
+                        laps = plain_strings(session.laps.pick_quicklaps())
+                        transformed_laps = laps.copy()
+                        transformed_laps.loc[:, "LapTime (s)"] = laps["LapTime"].dt.total_seconds()
+
+                        team_order = (
+                            transformed_laps[["Team", "LapTime (s)"]]
+                            .groupby("Team")
+                            .median()["LapTime (s)"]
+                            .sort_values()
+                            .index
+                        )
                     
-                    team_palette = {team: fastf1.plotting.get_team_color(team, session=session)
-                                    for team in team_order}
-
-                    fig, ax = plt.subplots(figsize=(15, 10))
-                    sns.boxplot(
-                        data=transformed_laps,
-                        x="Team",
-                        y="LapTime (s)",
-                        hue="Team",
-                        order=team_order,
-                        palette=team_palette,
-                        whiskerprops=dict(color="white"),
-                        boxprops=dict(edgecolor="white"),
-                        medianprops=dict(color="grey"),
-                        capprops=dict(color="white"),
-                    )
-
-                    plt.title(f"{session.event['EventName']} {session.event.year} Team Pace Comparison")
-                    plt.grid(visible=False)
-                    ax.set(xlabel=None)
-                    plt.tight_layout()
-
-                    buf = io.BytesIO()
-                    fig.savefig(buf, format='png', bbox_inches="tight")
-                    buf.seek(0)
-
-                    st.session_state.team_pace_img_buf = buf
+                        team_palette = {team: fastf1.plotting.get_team_color(team, session=session)
+                                        for team in team_order}
+
+                        timing.mark("draw")
+                        fig, ax = plt.subplots(figsize=(15, 10))
+                        sns.boxplot(
+                            data=transformed_laps,
+                            x="Team",
+                            y="LapTime (s)",
+                            hue="Team",
+                            order=team_order,
+                            palette=team_palette,
+                            whiskerprops=dict(color="white"),
+                            boxprops=dict(edgecolor="white"),
+                            medianprops=dict(color="grey"),
+                            capprops=dict(color="white"),
+                        )
+
+                        plt.title(f"{session.event['EventName']} {session.event.year} Team Pace Comparison")
+                        plt.grid(visible=False)
+                        ax.set(xlabel=None)
+                        plt.tight_layout()
+                        return fig
+
+                    params = {}
+                    buf = figure_png(__file__, params, session_version(session), render)
+
+                    state.image = buf
                     progress_bar.progress(100)
                     st.success("Graph generated successfully! 🎉")
                 except Exception as e:
                     st.error(f"Failed to generate plot: {e}")
-                    st.session_state.team_pace_img_buf = None
+                    state.image = None
                     progress_bar.progress(0)
 
-if st.session_state.team_pace_img_buf:
+if state.image:
     with col_graph:
-        st.image(st.session_state.team_pace_img_buf, use_container_width=True)
+        st.image(state.image, use_container_width=True)
     
     st.download_button(
         label="📥 Download Graph",
-        data=st.session_state.team_pace_img_buf,
+        data=state.image,
         file_name=f"{grand_prix}_{year}_{session_type}_team_pace.png",
         mime="image/png"
     )
+
+state.close()
+timing.report()
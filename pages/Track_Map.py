@@ -1,8 +1,9 @@
 import streamlit as st
-import matplotlib.pyplot as plt
-import numpy as np
-import fastf1
-import io
+
+from utils import page_state, timing
+
+# Stage timings of this run, reported at the end of the script
+timing.start_page(__file__)
 
 # Set page configuration
 st.set_page_config(layout="wide", page_title="F1 Circuit Map Plot", page_icon="🏎️")
@@ -12,8 +13,8 @@ st.title("F1 Circuit Map Plot")
 # Create two columns: Graph (Left) | User Input (Right)
 col_graph, col_input = st.columns([4, 1])
 
-if "circuit_map_img_buf" not in st.session_state:
-    st.session_state.circuit_map_img_buf = None
+# This page's values in st.session_state, see utils.page_state
+state = page_state.scope(__file__)
 
 with col_input:
     st.write("### Select F1 Session")
@@ -23,53 +24,41 @@ with col_input:
 
     if st.button("Generate Circuit Map"):
         with st.spinner("Loading session data..."):
-            progress_bar = st.progress(10)
+            progress_bar = st.progress(0)
+            timing.progress(progress_bar)
             try:
-                session = fastf1.get_session(year, gp, session_type)
-                session.load()
-                progress_bar.progress(40)
-
-                lap = session.laps.pick_fastest()
-                pos = lap.get_pos_data()
-                circuit_info = session.get_circuit_info()
+                from utils.figure_cache import figure_png
+                from utils.track_geometry import track_geometry
 
-                def rotate(xy, *, angle):
-                    rot_mat = np.array([[np.cos(angle), np.sin(angle)], [-np.sin(angle), np.cos(angle)]])
-                    return np.matmul(xy, rot_mat)
+                # only loads the session the first time this circuit layout is drawn
+                geometry = track_geometry(year, gp, session_type)
 
-                track = pos.loc[:, ('X', 'Y')].to_numpy()
-                track_angle = circuit_info.rotation / 180 * np.pi
-                rotated_track = rotate(track, angle=track_angle)
+                def render():
+                    import matplotlib.pyplot as plt
+                    from utils.plotting import setup_mpl
 
-                fig, ax = plt.subplots(figsize=(8, 8))
-                ax.plot(rotated_track[:, 0], rotated_track[:, 1])
+                    setup_mpl(mpl_timedelta_support=False, misc_mpl_mods=False, color_scheme=None)
+                    timing.mark("draw")
+                    fig, ax = plt.subplots(figsize=(8, 8))
+                    ax.plot(geometry.outline[:, 0], geometry.outline[:, 1])
 
-                offset_vector = [500, 0]
-                for _, corner in circuit_info.corners.iterrows():
-                    txt = f"{corner['Number']}{corner['Letter']}"
-                    offset_angle = corner['Angle'] / 180 * np.pi
-                    offset_x, offset_y = rotate(offset_vector, angle=offset_angle)
-                    text_x = corner['X'] + offset_x
-                    text_y = corner['Y'] + offset_y
-                    text_x, text_y = rotate([text_x, text_y], angle=track_angle)
-                    track_x, track_y = rotate([corner['X'], corner['Y']], angle=track_angle)
+                    corners, labels = geometry.corners, geometry.labels
+                    ax.scatter(labels[:, 0], labels[:, 1], color='grey', s=140)
+                    for (track_x, track_y), (text_x, text_y), txt in zip(corners, labels, geometry.names):
+                        ax.plot([track_x, text_x], [track_y, text_y], color='grey')
+                        ax.text(text_x, text_y, txt, va='center_baseline', ha='center', size='small', color='white')
 
-                    ax.scatter(text_x, text_y, color='grey', s=140)
-                    ax.plot([track_x, text_x], [track_y, text_y], color='grey')
-                    ax.text(text_x, text_y, txt, va='center_baseline', ha='center', size='small', color='white')
+                    ax.set_title(geometry.location)
+                    ax.set_xticks([])
+                    ax.set_yticks([])
+                    ax.axis('equal')
 
-                ax.set_title(session.event['Location'])
-                ax.set_xticks([])
-                ax.set_yticks([])
-                ax.axis('equal')
+                    return fig
 
-                progress_bar.progress(80)
+                params = {}
+                img_buf = figure_png(__file__, params, list(geometry.key), render)
 
-                img_buf = io.BytesIO()
-                fig.savefig(img_buf, format="png", bbox_inches="tight")
-                img_buf.seek(0)
-
-                st.session_state.circuit_map_img_buf = img_buf
+                state.image = img_buf
 
                 progress_bar.progress(100)
                 st.success("Circuit Map generated successfully! 🎉")
@@ -78,12 +67,15 @@ with col_input:
                 st.error(f"Failed to load session data: {e}")
                 progress_bar.progress(0)
 
-if st.session_state.circuit_map_img_buf:
+if state.image:
     with col_graph:
-        st.image(st.session_state.circuit_map_img_buf)
+        st.image(state.image)
     st.download_button(
         label="📥 Download Circuit Map",
-        data=st.session_state.circuit_map_img_buf,
+        data=state.image,
         file_name=f"F1_Circuit_Map_{year}_{gp}.png",
         mime="image/png",
-    )
\ No newline at end of file
+    )
+
+state.close()
+timing.report()
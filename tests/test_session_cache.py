@@ -0,0 +1,60 @@
+import threading
+import time
+
+import pytest
+
+from benchmarks.fixtures import SYNTHETIC_ROUND, SYNTHETIC_YEAR, use_synthetic
+from utils import config, session_cache
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    monkeypatch.setattr(config, "STORE_DIR", "")
+    monkeypatch.setattr(config, "SHARED_DIR", "")
+    use_synthetic(laps=5, hz=1.0, drivers=4)
+    return session_cache.SessionCache(max_bytes=2**30)
+
+
+def test_concurrent_gets_load_a_session_once(cache, monkeypatch):
+    # loads of the same session overlapping each other would parse it twice
+    # and modify one Session object from two threads
+    running, overlaps = [], []
+    started, proceed = threading.Semaphore(0), threading.Semaphore(0)
+    load = session_cache._load
+
+    def held_load(session, options, loaded):
+        running.append(options)
+        overlaps.append(len(running))
+        started.release()
+        try:
+            proceed.acquire(timeout=10)
+            return load(session, options, loaded)
+        finally:
+            running.remove(options)
+
+    monkeypatch.setattr(session_cache, "_load", held_load)
+
+    def get(*requires):
+        thread = threading.Thread(target=cache.get, args=(SYNTHETIC_YEAR, SYNTHETIC_ROUND, "R", requires))
+        thread.start()
+        return thread
+
+    threads = [get("laps")]
+    assert started.acquire(timeout=10)
+    # waits for the laps load, then upgrades the session with telemetry
+    threads.append(get("laps", "car_data"))
+    time.sleep(0.1)
+    proceed.release()
+    assert started.acquire(timeout=10)
+    # arrives during the upgrade and has to wait for it as well
+    threads.append(get("laps", "car_data"))
+    time.sleep(0.1)
+    proceed.release()
+    proceed.release()
+    for thread in threads:
+        thread.join()
+
+    assert overlaps == [1, 1]
+    stats = cache.stats()
+    assert (stats["misses"], stats["upgrades"], stats["hits"]) == (1, 1, 1)
+    assert not cache._loading
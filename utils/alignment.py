@@ -0,0 +1,79 @@
+import threading
+import weakref
+
+import numpy as np
+
+# Spacing of the shared distance grid in metres
+GRID_STEP = 5.0
+
+# Distance offset between laps when several are resampled in one np.interp
+# call, longer than any lap
+_LAP_OFFSET = 1e6
+
+# session -> (laps the traces were built from, {(driver, lap number): (time, speed)})
+_traces = weakref.WeakKeyDictionary()
+_lock = threading.Lock()
+
+
+def _lap_key(lap):
+    return lap["Driver"], int(lap["LapNumber"])
+
+
+def _resample(raw):
+    # Resample all laps onto GRID_STEP spaced distances with a single
+    # np.interp call: lap k is shifted by k * _LAP_OFFSET, so the laps don't
+    # overlap on the distance axis.
+    offsets = np.arange(len(raw)) * _LAP_OFFSET
+    counts = [int(distance[-1] // GRID_STEP) + 1 for distance, _, _ in raw]
+    grid = np.concatenate([np.arange(n) * GRID_STEP for n in counts])
+    # the first sample is a few metres into the lap, keep each lap's grid
+    # inside its own samples
+    grid = np.clip(grid, np.repeat([distance[0] for distance, _, _ in raw], counts),
+                   np.repeat([distance[-1] for distance, _, _ in raw], counts))
+    grid += np.repeat(offsets, counts)
+    xp = np.concatenate([distance + offset for (distance, _, _), offset in zip(raw, offsets)])
+    time = np.interp(grid, xp, np.concatenate([time for _, time, _ in raw]))
+    speed = np.interp(grid, xp, np.concatenate([speed for _, _, speed in raw]))
+    splits = np.cumsum(counts)[:-1]
+    return list(zip(np.split(time, splits), np.split(speed, splits)))
+
+
+def _raw(lap):
+    tel = lap.get_car_data().add_distance()
+    return (tel["Distance"].to_numpy(dtype=float),
+            tel["Time"].dt.total_seconds().to_numpy(),
+            tel["Speed"].to_numpy(dtype=float))
+
+
+def aligned_laps(session, laps):
+    """Time and speed of several laps on a shared distance grid.
+
+    Returns ``(distance, time, speed)`` where ``time`` (seconds since the
+    start of the lap) and ``speed`` are arrays of shape (laps, distance).
+    Each lap is resampled once per session and kept, so adding a lap to a
+    comparison only resamples that lap. The grid ends at the shortest lap.
+    """
+    all_laps = session.laps
+    with _lock:
+        cached = _traces.get(session)
+        if cached is None or cached[0] is not all_laps:
+            cached = _traces[session] = (all_laps, {})
+        traces = cached[1]
+        missing = {_lap_key(lap): lap for lap in laps if _lap_key(lap) not in traces}
+
+    if missing:
+        resampled = _resample([_raw(lap) for lap in missing.values()])
+        with _lock:
+            traces.update(zip(missing, resampled))
+
+    rows = [traces[_lap_key(lap)] for lap in laps]
+    n = min(len(time) for time, _ in rows)
+    time = np.stack([time[:n] for time, _ in rows])
+    speed = np.stack([speed[:n] for _, speed in rows])
+    return np.arange(n) * GRID_STEP, time, speed
+
+
+def delta_time(time, reference=0):
+    """Gap in seconds of every lap to lap ``reference`` along the distance,
+    positive where a lap is behind."""
+    return time - time[reference]
@@ -0,0 +1,191 @@
+"""Narrow the dtypes of loaded laps and telemetry, and report the memory saved.
+
+Usage:
+    python -m utils.compact 2023 "Monaco Grand Prix" R
+    python -m utils.compact 2024 3 Q --offline
+
+With F1VIZ_COMPACT_DTYPES=1 the session cache compacts every session after
+loading it. Repeated strings become categoricals, integer channels the
+narrowest integer type holding their values and lap counters float32;
+columns no page reads are dropped. Values are never rounded: a column is
+only narrowed if every value survives the conversion, so the figures drawn
+from a compacted session are the same. Positions stay float64: fastf1
+interpolates merged telemetry in the column's dtype, so float32 positions
+would move the interpolated points of a lap.
+
+The command loads a session without compaction and prints the memory of
+each frame before and after.
+"""
+import argparse
+import logging
+import sys
+
+import numpy as np
+import pandas as pd
+
+from utils.lazy_telemetry import LazyTelemetry
+
+logger = logging.getLogger(__name__)
+
+# Repeated strings of the laps
+LAP_CATEGORIES = ("Driver", "DriverNumber", "Team", "Compound")
+# Whole numbers fastf1 keeps as float64 because they may be missing
+LAP_FLOATS = ("LapNumber", "Stint", "TyreLife", "Position")
+# Speed traps, no page reads them
+LAP_DROP = ("SpeedI1", "SpeedI2", "SpeedFL", "SpeedST")
+
+# Integer channels (int64 in fastf1) and the type their values fit in
+TELEMETRY_INTS = {"RPM": np.int16, "Speed": np.int16, "nGear": np.int8,
+                  "Throttle": np.int8, "DRS": np.int8}
+# Every value a string channel takes, including the ones merge_channels()
+# fills in, so merged and resampled frames keep the categorical dtype
+TELEMETRY_CATEGORIES = {
+    "Source": pd.CategoricalDtype(["car", "pos", "interpolation"]),
+    "Status": pd.CategoricalDtype(["OnTrack", "OffTrack"]),
+}
+# Height, no page draws it
+TELEMETRY_DROP = ("Z",)
+
+
+def _nbytes(frame):
+    return int(frame.memory_usage(index=True, deep=True).sum())
+
+
+def _fits(values, dtype):
+    info = np.iinfo(dtype)
+    return values.size == 0 or (values.min() >= info.min and values.max() <= info.max)
+
+
+def _exact_float32(values):
+    return np.array_equal(values.astype(np.float32), values, equal_nan=True)
+
+
+def _narrowed(frame, drop, dtypes):
+    # frames that are already compact (e.g. attached from a shared segment)
+    # are returned as they are, without copying
+    drop = [column for column in drop if column in frame.columns]
+    if drop:
+        frame = frame.drop(columns=drop)
+    return frame.astype(dtypes) if dtypes else frame
+
+
+def compact_laps(laps):
+    """``laps`` with categorical strings, float32 counters and no speed traps."""
+    dtypes = {}
+    for column in LAP_CATEGORIES:
+        if column in laps.columns and laps[column].dtype == object:
+            dtypes[column] = "category"
+    for column in LAP_FLOATS:
+        if column in laps.columns and laps[column].dtype == np.float64 \
+                and _exact_float32(laps[column].to_numpy()):
+            dtypes[column] = np.float32
+    return _narrowed(laps, LAP_DROP, dtypes)
+
+
+def compact_telemetry(telemetry):
+    """One driver's car or position data with narrower dtypes and no height."""
+    dtypes = {}
+    for column, dtype in TELEMETRY_INTS.items():
+        if column in telemetry.columns:
+            values = telemetry[column].to_numpy()
+            if values.dtype.kind == "i" and values.dtype != dtype and _fits(values, dtype):
+                dtypes[column] = dtype
+    for column, dtype in TELEMETRY_CATEGORIES.items():
+        if column in telemetry.columns and telemetry[column].dtype == object \
+                and telemetry[column].isin(dtype.categories).all():
+            dtypes[column] = dtype
+    return _narrowed(telemetry, TELEMETRY_DROP, dtypes)
+
+
+def plain_strings(frame):
+    """``frame`` with its categorical columns as strings again.
+
+    For frames handed to seaborn, which takes the levels of a categorical
+    from its categories: the laps of a few drivers would still get a violin,
+    a colour or a legend entry for every driver of the session.
+    """
+    categorical = [column for column, dtype in frame.dtypes.items()
+                   if isinstance(dtype, pd.CategoricalDtype)]
+    return frame.astype(dict.fromkeys(categorical, object)) if categorical else frame
+
+
+def compact_session(session, options):
+    """Compact the laps and telemetry of ``session`` loaded for ``options`` (fastf1
+    load option names), in place. Drivers built later are compacted when built.
+
+    Returns the bytes of the laps and built telemetry before and after.
+    """
+    before = after = 0
+    if "laps" in options and hasattr(session, "_laps"):
+        before += _nbytes(session._laps)
+        session._laps = compact_laps(session._laps)
+        after += _nbytes(session._laps)
+    if "telemetry" in options:
+        for name in ("_car_data", "_pos_data"):
+            telemetry = getattr(session, name, None)
+            if isinstance(telemetry, LazyTelemetry):
+                before += telemetry.nbytes
+                telemetry.transform(compact_telemetry)
+                after += telemetry.nbytes
+            elif telemetry:
+                before += sum(_nbytes(frame) for frame in telemetry.values())
+                telemetry = {drv: compact_telemetry(frame) for drv, frame in telemetry.items()}
+                after += sum(_nbytes(frame) for frame in telemetry.values())
+                setattr(session, name, telemetry)
+    if before:
+        logger.info("Compacted %s: %.1f MB -> %.1f MB", session, before / 2**20, after / 2**20)
+    return before, after
+
+
+def memory_report(session):
+    """Rows and bytes of each loaded frame before and after compaction."""
+    rows = []
+
+    def add(name, frames, compact):
+        frames = list(frames)
+        if frames:
+            rows.append((name, sum(len(frame) for frame in frames),
+                         sum(_nbytes(frame) for frame in frames),
+                         sum(_nbytes(compact(frame)) for frame in frames)))
+
+    add("laps", [session.laps], compact_laps)
+    for name in ("car_data", "pos_data"):
+        telemetry = getattr(session, f"_{name}", {})
+        drivers = telemetry.drivers() if isinstance(telemetry, LazyTelemetry) else list(telemetry)
+        add(name, (telemetry[drv] for drv in drivers), compact_telemetry)
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m utils.compact", description=__doc__.splitlines()[0])
+    parser.add_argument("year", type=int)
+    parser.add_argument("event", help="event name or round number")
+    parser.add_argument("session", help="session type, e.g. Q or R")
+    parser.add_argument("--offline", action="store_true",
+                        help="only use fastf1's local cache of API responses")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    import fastf1
+    from utils import config, session_cache
+
+    if args.offline:
+        fastf1.Cache.offline_mode(True)
+    config.COMPACT_DTYPES = False
+    event = int(args.event) if args.event.isdigit() else args.event
+    session = session_cache.load_session(args.year, event, args.session, ("laps", "car_data", "pos_data"))
+
+    print(f"{session}")
+    print(f"{'frame':<10} {'rows':>10} {'before':>10} {'after':>10}")
+    total_before = total_after = 0
+    for name, rows, before, after in memory_report(session):
+        print(f"{name:<10} {rows:>10} {before / 2**20:>8.1f}MB {after / 2**20:>8.1f}MB")
+        total_before += before
+        total_after += after
+    print(f"{'total':<10} {'':>10} {total_before / 2**20:>8.1f}MB {total_after / 2**20:>8.1f}MB"
+          f"  ({1 - total_after / total_before:.0%} saved)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,67 @@
+import os
+
+# Settings shared by every page. All of them can be overridden through
+# environment variables so deployments don't need code changes.
+
+# RAM budget for loaded sessions kept in the process-wide session cache
+SESSION_CACHE_MB = int(os.environ.get("F1VIZ_SESSION_CACHE_MB", 2048))
+
+# Directory of the persistent Arrow session store; set to an empty string to
+# disable it
+STORE_DIR = os.environ.get(
+    "F1VIZ_STORE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".f1viz_store"),
+)
+
+# Build each driver's car and position data on first access instead of for
+# the whole grid when a session is loaded
+LAZY_TELEMETRY = os.environ.get("F1VIZ_LAZY_TELEMETRY", "1") != "0"
+
+# Narrow the dtypes of loaded laps and telemetry (categoricals, float32,
+# small ints) and drop columns no page reads, see utils.compact
+COMPACT_DTYPES = os.environ.get("F1VIZ_COMPACT_DTYPES", "0") == "1"
+
+# Memory a user's session state may hold (figures, driver lists, ...) across
+# pages; values of the pages they used least recently are dropped beyond it,
+# and values unused for the idle time in any case. Sessions don't count,
+# they are held by the session cache.
+USER_STATE_MB = int(os.environ.get("F1VIZ_USER_STATE_MB", 64))
+STATE_IDLE_MINUTES = int(os.environ.get("F1VIZ_STATE_IDLE_MINUTES", 30))
+
+# Show the session state memory of the user and of the server process in
+# the sidebar
+MEMORY_SIDEBAR = os.environ.get("F1VIZ_MEMORY_SIDEBAR", "0") == "1"
+
+# Concurrent requests to the Ergast API, e.g. when fetching a season's results
+ERGAST_WORKERS = int(os.environ.get("F1VIZ_ERGAST_WORKERS", 4))
+
+# Rendered figures shared by all pages and users, stored on disk; an empty
+# directory disables the cache
+FIGURE_CACHE_DIR = os.environ.get(
+    "F1VIZ_FIGURE_CACHE_DIR", os.path.join(STORE_DIR, "figures") if STORE_DIR else "")
+FIGURE_CACHE_MB = int(os.environ.get("F1VIZ_FIGURE_CACHE_MB", 512))
+
+# Show the time spent in each stage of a page run in the sidebar
+TIMING_SIDEBAR = os.environ.get("F1VIZ_TIMING_SIDEBAR", "0") == "1"
+
+# File the stage timings of page runs are exported to, "{pid}" is replaced by
+# the process id; an empty string disables the export. Format "jsonl"
+# appends one line per run, "prometheus" rewrites the file with p50/p99 per
+# page and stage in the Prometheus text format.
+METRICS_FILE = os.environ.get("F1VIZ_METRICS_FILE", "")
+METRICS_FORMAT = os.environ.get("F1VIZ_METRICS_FORMAT", "jsonl")
+
+# Base URL of a stand-in for fastf1's upstream APIs (python -m utils.replay);
+# an empty string uses the real ones
+UPSTREAM_URL = os.environ.get("F1VIZ_UPSTREAM_URL", "")
+
+# Worker processes loading the seasons of a multi-season comparison
+SEASON_WORKERS = int(os.environ.get("F1VIZ_SEASON_WORKERS", 4))
+
+# Threads loading sessions in the background for the pages
+LOAD_WORKERS = int(os.environ.get("F1VIZ_LOAD_WORKERS", 4))
+
+# Directory where loaded car and position data is shared by the server
+# processes of a host, ideally on a tmpfs such as /dev/shm; an empty string
+# keeps each process's telemetry private
+SHARED_DIR = os.environ.get("F1VIZ_SHARED_DIR", "")
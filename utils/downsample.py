@@ -0,0 +1,100 @@
+import numpy as np
+
+# Points kept per pixel column of the target width. Min-max keeps the lowest
+# and highest sample of each column, so two are needed to draw it exactly.
+POINTS_PER_PIXEL = 2
+
+MODES = ("minmax", "lttb")
+
+# A track map's trace runs around the whole circuit, which is roughly this
+# many times as long as the axes are wide
+TRACK_LENGTH_WIDTHS = 3
+
+
+def _valid(x, y):
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    return np.flatnonzero(~(np.isnan(x) | np.isnan(y))), x, y
+
+
+def minmax(x, y, n_buckets):
+    """Indices of the lowest and highest ``y`` in each of ``n_buckets``
+    equally wide ``x`` ranges, plus the first and last sample.
+
+    Every local minimum and maximum that is the extreme of its bucket is
+    kept, e.g. the apex speed before a corner and the top speed before the
+    braking point. ``x`` has to be increasing; NaN samples are skipped.
+    """
+    valid, x, y = _valid(x, y)
+    if len(valid) <= POINTS_PER_PIXEL * n_buckets:
+        return valid
+    x, y = x[valid], y[valid]
+
+    edges = np.linspace(x[0], x[-1], n_buckets + 1)
+    bucket = np.clip(np.searchsorted(edges, x, side="right") - 1, 0, n_buckets - 1)
+    # sorted by bucket, then by y: the first and last entry of each bucket
+    # are its minimum and maximum
+    order = np.lexsort((y, bucket))
+    new_bucket = bucket[order][1:] != bucket[order][:-1]
+    first = order[np.r_[True, new_bucket]]
+    last = order[np.r_[new_bucket, True]]
+    return valid[np.unique(np.r_[0, first, last, len(x) - 1])]
+
+
+def lttb(x, y, n_out):
+    """Indices of ``n_out`` samples picked by Largest-Triangle-Three-Buckets.
+
+    Vectorized variant: each bucket's triangle is anchored at the average of
+    the previous bucket instead of the point picked there, so all buckets are
+    evaluated at once. ``x`` has to be increasing; NaN samples are skipped.
+    """
+    valid, x, y = _valid(x, y)
+    n = len(valid)
+    if n_out >= n or n_out < 3:
+        return valid
+    x, y = x[valid], y[valid]
+
+    # the first and last sample are always kept, the others are split into
+    # n_out - 2 buckets of (almost) equal size
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    counts = np.diff(edges)
+    inner = np.arange(1, n - 1)
+    bucket = np.repeat(np.arange(n_out - 2), counts)
+    mean_x = np.add.reduceat(x[1:n - 1], edges[:-1] - 1) / counts
+    mean_y = np.add.reduceat(y[1:n - 1], edges[:-1] - 1) / counts
+
+    prev_x = np.r_[x[0], mean_x[:-1]][bucket]
+    prev_y = np.r_[y[0], mean_y[:-1]][bucket]
+    next_x = np.r_[mean_x[1:], x[-1]][bucket]
+    next_y = np.r_[mean_y[1:], y[-1]][bucket]
+    # twice the triangle area, the factor doesn't change the ranking
+    area = np.abs((prev_x - next_x) * (y[inner] - prev_y)
+                  - (prev_x - x[inner]) * (next_y - prev_y))
+
+    order = np.lexsort((area, bucket))
+    picked = inner[order[np.cumsum(counts) - 1]]
+    return valid[np.r_[0, picked, n - 1]]
+
+
+def downsample(x, y, width, mode="minmax"):
+    """Indices of the samples to draw for a ``width`` pixels wide trace."""
+    if mode == "minmax":
+        return minmax(x, y, int(width))
+    if mode == "lttb":
+        return lttb(x, y, POINTS_PER_PIXEL * int(width))
+    raise ValueError(f"Unknown downsampling mode {mode!r}, expected one of {MODES}")
+
+
+def pixel_width(ax):
+    """Width of a matplotlib axes in output pixels."""
+    return max(1, int(ax.get_window_extent().width))
+
+
+def track_width(ax):
+    """Pixel budget of a trace drawn around the circuit in a track map."""
+    return TRACK_LENGTH_WIDTHS * pixel_width(ax)
+
+
+def downsample_frame(frame, x, y, width, mode="minmax"):
+    """Rows of a telemetry frame to draw ``frame[y]`` over ``frame[x]``."""
+    return frame.iloc[downsample(frame[x], frame[y], width, mode)]
@@ -0,0 +1,295 @@
+"""Export every page's figure for a season without opening the app.
+
+Usage:
+    python -m utils.export 2024 out/2024 --workers 4
+    python -m utils.export 2023 out/2023 --rounds 1-6 --pages Track_Map Tyre_Strategies --offline
+
+The page scripts are run headlessly with the same inputs a user would enter,
+so the figures are drawn by the pages' own code. Each worker process loads
+one session (a qualifying or a race) and runs every page using that session
+type against it. Images are written to one directory per round, next to a
+manifest.json with the timings of every load and figure.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import fastf1
+from streamlit.testing.v1 import AppTest
+
+from utils import figure_cache, session_cache, session_loader
+from utils.prewarm import _init_worker, find_sessions, parse_rounds
+from utils.rankings import rank_fastest_laps
+
+PAGES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "pages")
+
+# page -> (session type it is exported for, inputs). Inputs are
+# (widget kind, label prefix, value) where the value names an entry of the
+# export context, see _context(); buttons are clicked in order. Pages with
+# no session type show a whole season.
+CHARTS = {
+    "Qualifying_Results": ("Q", [
+        ("selectbox", "Year", "year"),
+        ("text_input", "Grand Prix", "event"),
+        ("selectbox", "Session Type", "session_type"),
+        ("button", "Generate Plot", None),
+    ]),
+    "Speed_Overlay": ("Q", [
+        ("selectbox", "Year", "year"),
+        ("text_input", "Grand Prix", "event"),
+        ("selectbox", "Session Type", "session_type"),
+        ("button", "Load Session", None),
+        ("multiselect", "Drivers", "drivers"),
+        ("button", "Generate Plot", None),
+    ]),
+    "Speed_+_Corners": ("Q", [
+        ("selectbox", "Year", "year"),
+        ("text_input", "Grand Prix", "event"),
+        ("selectbox", "Session Type", "session_type"),
+        ("button", "Generate Plot", None),
+    ]),
+    "Speed_on_Track": ("Q", [
+        ("selectbox", "Year", "year"),
+        ("number_input", "Weekend Round", "round"),
+        ("selectbox", "Session Type", "session_type"),
+        ("button", "Load Session", None),
+        ("selectbox", "Select Driver", "driver"),
+        ("button", "Generate Plot", None),
+    ]),
+    "Gear_Shift_Analysis": ("Q", [
+        ("selectbox", "Year", "year"),
+        ("text_input", "Grand Prix", "event"),
+        ("selectbox", "Session Type", "session_type"),
+        ("button", "Generate Plot", None),
+    ]),
+    "Track_Map": ("Q", [
+        ("selectbox", "Year", "year"),
+        ("text_input", "Grand Prix", "event"),
+        ("selectbox", "Session Type", "session_type"),
+        ("button", "Generate Circuit Map", None),
+    ]),
+    "Tyre_Strategies": ("R", [
+        ("selectbox", "Year", "year"),
+        ("text_input", "Grand Prix", "event"),
+        ("selectbox", "Session Type", "session_type"),
+        ("button", "Generate Plot", None),
+    ]),
+    "Position_Changes": ("R", [
+        ("selectbox", "Year", "year"),
+        ("text_input", "Grand Prix", "event"),
+        ("selectbox", "Session Type", "session_type"),
+        ("button", "Generate Plot", None),
+    ]),
+    "Laptimes_Distribution": ("R", [
+        ("selectbox", "Year", "year"),
+        ("text_input", "Grand Prix", "event"),
+        ("selectbox", "Session Type", "session_type"),
+        ("button", "Generate Plot", None),
+    ]),
+    "Laptimes_Scatterplot": ("R", [
+        ("selectbox", "Year", "year"),
+        ("text_input", "Grand Prix", "event"),
+        ("selectbox", "Session Type", "session_type"),
+        ("button", "Load Session", None),
+        ("selectbox", "Driver", "driver"),
+        ("button", "Generate Plot", None),
+    ]),
+    "Plot_Styling": ("R", [
+        ("selectbox", "Year", "year"),
+        ("text_input", "Grand Prix", "event"),
+        ("selectbox", "Session Type", "session_type"),
+        ("button", "Load Session", None),
+        ("multiselect", "Select Drivers", "drivers"),
+        ("button", "Generate Plot", None),
+    ]),
+    "Team_pace_comparison": ("R", [
+        ("selectbox", "Year", "year"),
+        ("text_input", "Grand Prix", "event"),
+        ("selectbox", "Session Type", "session_type"),
+        ("button", "Generate Plot", None),
+    ]),
+    "Standings_Heatmap": (None, [
+        ("selectbox", "Year", "year"),
+        ("button", "Generate Visualization", None),
+    ]),
+}
+
+# Drivers shown by the pages comparing several of them
+COMPARED_DRIVERS = 2
+
+# Seconds a single page run may take
+PAGE_TIMEOUT = 600
+
+
+def _context(year, rnd=None, event=None, session_type=None):
+    # values the CHARTS inputs refer to
+    context = {"year": year, "round": rnd, "event": event, "session_type": session_type}
+    if session_type is not None:
+        session = session_cache.load_session(year, rnd, session_type)
+        ranking = rank_fastest_laps(session, segments=False)
+        context["driver"] = ranking["Driver"].iloc[0]
+        context["drivers"] = list(ranking["Driver"].iloc[:COMPARED_DRIVERS])
+    return context
+
+
+def _widget(app, kind, label):
+    for widget in getattr(app, kind):
+        if widget.label.startswith(label):
+            return widget
+    raise LookupError(f"No {kind} {label!r} on the page")
+
+
+def run_page(page, context, timeout=PAGE_TIMEOUT):
+    """Run a page script with the CHARTS inputs filled in from ``context``.
+
+    Returns the figures it served (see FigureCache.recording) and the errors
+    it displayed.
+    """
+    _, inputs = CHARTS[page]
+    app = AppTest.from_file(os.path.join(PAGES_DIR, f"{page}.py"), default_timeout=timeout)
+    with figure_cache.cache.recording() as figures:
+        app.run()
+        for kind, label, value in inputs:
+            widget = _widget(app, kind, label)
+            if kind == "button":
+                widget.click().run()
+                # a page loading a session continues in the run after the
+                # load, see utils.session_loader
+                if session_loader.wait_all(timeout):
+                    app.run()
+            else:
+                widget.set_value(context[value])
+    errors = [element.value for element in app.error]
+    errors += [element.message for element in app.exception]
+    return figures, errors
+
+
+def _write_figures(figures, directory, name):
+    os.makedirs(directory, exist_ok=True)
+    files = []
+    for i, figure in enumerate(figures):
+        suffix = f"_{i}" if len(figures) > 1 else ""
+        path = os.path.join(directory, f"{name}{suffix}.{figure['format']}")
+        with open(path, "wb") as f:
+            f.write(figure["image"])
+        files.append(path)
+    return files
+
+
+def _export(year, rnd, event, session_type, pages, out_dir):
+    # runs in a worker: the session is loaded once and kept in the process'
+    # session cache while every page using it runs
+    start = time.perf_counter()
+    context = _context(year, rnd, event, session_type)
+    load_seconds = time.perf_counter() - start
+    if session_type is None:
+        directory, prefix = out_dir, ""
+    else:
+        directory, prefix = os.path.join(out_dir, f"{rnd:02d}_{_slug(event)}"), f"{session_type}_"
+
+    charts = []
+    for page in pages:
+        page_start = time.perf_counter()
+        try:
+            figures, errors = run_page(page, context)
+        except Exception as e:
+            figures, errors = [], [f"{type(e).__name__}: {e}"]
+        charts.append({
+            "page": page,
+            "seconds": time.perf_counter() - page_start,
+            "render_seconds": sum(figure["render_seconds"] for figure in figures),
+            "files": _write_figures(figures, directory, prefix + page),
+            "errors": errors,
+        })
+    session_cache.cache.clear()
+    return {"round": rnd, "event": event, "session_type": session_type,
+            "load_seconds": load_seconds, "charts": charts}
+
+
+def _slug(name):
+    return "".join(c if c.isalnum() else "_" for c in name)
+
+
+def plan(year, rounds=None, pages=tuple(CHARTS)):
+    """(round, event name, session type, pages) of every worker task."""
+    schedule = fastf1.get_event_schedule(year, include_testing=False)
+    tasks = []
+    session_types = sorted({CHARTS[page][0] for page in pages} - {None})
+    for session_type in session_types:
+        pages_of_type = [page for page in pages if CHARTS[page][0] == session_type]
+        for rnd, _ in find_sessions(year, rounds, (session_type,)):
+            event = schedule.get_event_by_round(rnd)["EventName"]
+            tasks.append((rnd, event, session_type, pages_of_type))
+    season_pages = [page for page in pages if CHARTS[page][0] is None]
+    if season_pages:
+        tasks.append((None, None, None, season_pages))
+    return tasks
+
+
+def export(year, out_dir, rounds=None, pages=tuple(CHARTS), workers=None,
+           offline=False, cache_dir=None, out=sys.stdout):
+    """Export the figures of all matching sessions; returns the manifest."""
+    _init_worker(offline, cache_dir)
+    tasks = plan(year, rounds, pages)
+    print(f"Exporting {len(tasks)} sessions of {year} to {out_dir}", file=out)
+
+    sessions = []
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(offline, cache_dir)) as pool:
+        futures = {pool.submit(_export, year, rnd, event, session_type, task_pages, out_dir):
+                   (rnd, event, session_type) for rnd, event, session_type, task_pages in tasks}
+        for future in as_completed(futures):
+            rnd, event, session_type = futures[future]
+            label = f"round {rnd:>2} {session_type:<2}" if rnd is not None else "season     "
+            try:
+                result = future.result()
+            except Exception as e:
+                result = {"round": rnd, "event": event, "session_type": session_type,
+                          "error": f"{type(e).__name__}: {e}", "charts": []}
+                print(f"  {label}  FAILED: {e}", file=out)
+            else:
+                failed = sum(bool(chart["errors"]) for chart in result["charts"])
+                print(f"  {label} {result['load_seconds']:7.1f}s load, "
+                      f"{len(result['charts']) - failed} figures, {failed} failed", file=out)
+            sessions.append(result)
+
+    sessions.sort(key=lambda s: (s["round"] is None, s["round"] or 0, s["session_type"] or ""))
+    manifest = {"year": year, "seconds": time.perf_counter() - start, "sessions": sessions}
+    os.makedirs(out_dir, exist_ok=True)
+    with open(os.path.join(out_dir, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+    print(f"Done in {manifest['seconds']:.1f}s", file=out)
+    return manifest
+
+
+def _failed(manifest):
+    return any("error" in session or any(chart["errors"] for chart in session["charts"])
+               for session in manifest["sessions"])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m utils.export", description=__doc__.splitlines()[0])
+    parser.add_argument("year", type=int)
+    parser.add_argument("out_dir", help="directory for the images and manifest.json")
+    parser.add_argument("--rounds", type=parse_rounds, help="round or range of rounds, e.g. 3 or 1-6")
+    parser.add_argument("--pages", nargs="+", default=tuple(CHARTS), choices=tuple(CHARTS),
+                        metavar="PAGE", help="pages to export (default: all)")
+    parser.add_argument("--workers", type=int, help="worker processes (default: CPU count)")
+    parser.add_argument("--offline", action="store_true",
+                        help="only use fastf1's local cache of recorded API responses")
+    parser.add_argument("--cache-dir", help="fastf1 cache directory")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    manifest = export(args.year, args.out_dir, args.rounds, args.pages, args.workers,
+                      args.offline, args.cache_dir)
+    return 1 if _failed(manifest) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
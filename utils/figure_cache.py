@@ -0,0 +1,269 @@
+import contextlib
+import hashlib
+import io
+import json
+import logging
+import os
+import struct
+import threading
+import time
+
+import fastf1
+import pandas as pd
+
+from utils import config, timing
+
+logger = logging.getLogger(__name__)
+
+# each file is the render time in seconds (little-endian float64) followed by
+# the encoded image
+_HEADER = struct.Struct("<d")
+
+# path -> (mtime, sha256) of page scripts and utils modules
+_source_hashes = {}
+
+
+def _source_hash(path):
+    # the page's code is part of the key, so editing a page invalidates its
+    # figures; hashed once per file version
+    mtime = os.stat(path).st_mtime_ns
+    cached = _source_hashes.get(path)
+    if cached is None or cached[0] != mtime:
+        with open(path, "rb") as f:
+            cached = _source_hashes[path] = (mtime, hashlib.sha256(f.read()).hexdigest())
+    return cached[1]
+
+
+def _code_version():
+    # the utils modules drawing a figure are imported by its render function,
+    # i.e. only on a miss, so all of them count
+    directory = os.path.dirname(os.path.abspath(__file__))
+    hashes = [_source_hash(os.path.join(directory, name))
+              for name in sorted(os.listdir(directory)) if name.endswith(".py")]
+    return hashlib.sha256("".join(hashes).encode()).hexdigest()
+
+
+def figure_key(page, params, version, fmt="png"):
+    """Content address of a figure: the page (a name, or the path of the
+    page script whose code is then included), the code of the utils
+    package, its parameters, the version of the data it shows and the output
+    format."""
+    page_id = os.path.basename(page)
+    if os.path.isfile(page):
+        page_id += ":" + _source_hash(page)
+    payload = json.dumps([page_id, _code_version(), params, version, fmt], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def session_version(session):
+    """Version of a loaded session's data, changes while a session is live."""
+    version = [fastf1.__version__, session.event.year, int(session.event["RoundNumber"]), session.name]
+    laps = getattr(session, "_laps", None)
+    if laps is not None:
+        version += [len(laps), str(laps["Time"].max())]
+    return version
+
+
+def frame_version(frame):
+    """Version of a plain DataFrame, a hash of its content."""
+    return [list(map(str, frame.columns)),
+            int(pd.util.hash_pandas_object(frame, index=True).sum())]
+
+
+class FigureCache:
+    """Rendered figures on disk, shared by all pages, users and processes.
+
+    Files are named by the figure's key. Hits refresh a file's mtime and the
+    least recently used files are deleted once the directory exceeds
+    ``max_bytes``. With an empty ``directory`` nothing is stored.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.saved_seconds = 0.0  # render time of the figures served from disk
+        self.render_seconds = 0.0
+        self._nbytes = None  # scanned on first use
+        self._lock = threading.Lock()
+        self._recordings = []  # lists collecting served figures, see recording()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key + ".bin")
+
+    def get(self, key):
+        """Encoded image stored under ``key``, or None."""
+        if not self.directory:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return None
+        (seconds,) = _HEADER.unpack_from(data)
+        with self._lock:
+            self.hits += 1
+            self.saved_seconds += seconds
+        return data[_HEADER.size:]
+
+    def put(self, key, image, render_seconds):
+        with self._lock:
+            self.render_seconds += render_seconds
+        if not self.directory:
+            return
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.tmp.{os.getpid()}.{threading.get_ident()}"
+            with open(tmp, "wb") as f:
+                f.write(_HEADER.pack(render_seconds))
+                f.write(image)
+            os.replace(tmp, path)
+        except OSError as e:
+            logger.warning("Could not store figure %s: %s", path, e)
+            return
+        with self._lock:
+            if self._nbytes is None:
+                self._nbytes = self._scan_nbytes()
+            else:
+                self._nbytes += _HEADER.size + len(image)
+            if self._nbytes > self.max_bytes:
+                self._evict()
+
+    def _files(self):
+        for sub in os.scandir(self.directory):
+            if sub.is_dir():
+                yield from (entry for entry in os.scandir(sub.path) if entry.name.endswith(".bin"))
+
+    def _scan_nbytes(self):
+        if not self.directory or not os.path.isdir(self.directory):
+            return 0
+        return sum(entry.stat().st_size for entry in self._files())
+
+    def _evict(self):
+        # caller holds self._lock; other processes write to the same
+        # directory, so the sizes are re-read from disk
+        files = sorted(((entry.stat().st_mtime, entry.stat().st_size, entry.path)
+                        for entry in self._files()))
+        self._nbytes = sum(size for _, size, _ in files)
+        # evict down to 90% of the budget so a full cache doesn't rescan on every write
+        target = self.max_bytes * 0.9
+        for _, size, path in files:
+            if self._nbytes <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            self._nbytes -= size
+            self.evictions += 1
+
+    def png(self, page, params, version, render):
+        """PNG of the figure drawn by ``render()``, stored or rendered.
+
+        ``render`` returns a matplotlib figure (which is closed after
+        encoding) or already encoded bytes. Returns a BytesIO like the pages
+        used to keep in ``st.session_state``.
+        """
+        image = self._get_or_render(page, "png", figure_key(page, params, version), render, _encode_png)
+        return io.BytesIO(image)
+
+    def json(self, page, params, version, render):
+        """Plotly JSON of the figure built by ``render()``, stored or built.
+
+        For interactive figures that are drawn by the browser; only the
+        (decimated) data and layout are stored.
+        """
+        spec = self._get_or_render(page, "json", figure_key(page, params, version, fmt="json"),
+                                   render, lambda fig: fig.to_json().encode())
+        return spec.decode()
+
+    def _get_or_render(self, page, fmt, key, render, encode):
+        image = self.get(key)
+        seconds = 0.0
+        if image is None:
+            start = time.perf_counter()
+            # render functions mark "draw" once their data is prepared
+            with timing.span("transform"):
+                image = render()
+            if not isinstance(image, bytes):
+                with timing.span("encode"):
+                    image = encode(image)
+            seconds = time.perf_counter() - start
+            self.put(key, image, seconds)
+        with self._lock:
+            for figures in self._recordings:
+                figures.append({"page": os.path.basename(page), "format": fmt, "key": key,
+                                "image": image, "render_seconds": seconds})
+        logger.debug("Figure cache stats: %s", self.stats())
+        return image
+
+    @contextlib.contextmanager
+    def recording(self):
+        """Collect the figures served while the block runs.
+
+        Yields a list that is filled with one dict per figure: the page
+        script's file name, the format, the key, the encoded image and the
+        render time (0 for figures served from disk). Used to export figures
+        without the UI.
+        """
+        figures = []
+        with self._lock:
+            self._recordings.append(figures)
+        try:
+            yield figures
+        finally:
+            with self._lock:
+                self._recordings.remove(figures)
+
+    def clear(self):
+        with self._lock:
+            if self.directory and os.path.isdir(self.directory):
+                for entry in list(self._files()):
+                    os.remove(entry.path)
+            self._nbytes = 0
+
+    def stats(self):
+        with self._lock:
+            if self._nbytes is None:
+                self._nbytes = self._scan_nbytes()
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "saved_seconds": self.saved_seconds,
+                "render_seconds": self.render_seconds,
+                "bytes": self._nbytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+def _encode_png(fig):
+    # only needed on a miss, served figures don't import pyplot
+    import matplotlib.pyplot as plt
+
+    buf = io.BytesIO()
+    fig.savefig(buf, format="png", bbox_inches="tight")
+    plt.close(fig)
+    return buf.getvalue()
+
+
+cache = FigureCache(config.FIGURE_CACHE_DIR, max_bytes=config.FIGURE_CACHE_MB * 2**20)
+
+
+def figure_png(page, params, version, render):
+    """Module-level shortcut for ``cache.png(...)``, see FigureCache.png."""
+    return cache.png(page, params, version, render)
+
+
+def figure_json(page, params, version, render):
+    """Module-level shortcut for ``cache.json(...)``, see FigureCache.json."""
+    return cache.json(page, params, version, render)
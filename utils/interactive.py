@@ -0,0 +1,58 @@
+import numpy as np
+import plotly.graph_objects as go
+from matplotlib import colormaps
+from matplotlib.colors import to_hex
+
+from utils.downsample import POINTS_PER_PIXEL, downsample
+
+# Samples sent to the browser per trace. WebGL draws far more than this
+# smoothly, the limit keeps the payload small. Samples are picked by min-max
+# downsampling over the lap distance, so braking points and top speeds stay.
+MAX_POINTS = 2000
+
+
+def _track_layout(fig, title):
+    # equal axis scaling without axes, like ax.axis('equal') + 'off'
+    fig.update_layout(title=title, plot_bgcolor="rgba(0,0,0,0)", showlegend=True,
+                      margin=dict(l=0, r=0, b=0, t=60), height=700)
+    fig.update_xaxes(visible=False)
+    fig.update_yaxes(visible=False, scaleanchor="x", scaleratio=1)
+    return fig
+
+
+def speed_on_track(tel, title, colorscale="Plasma", max_points=MAX_POINTS):
+    """WebGL track map coloured by speed from a lap's merged telemetry."""
+    idx = downsample(tel["Distance"], tel["Speed"], max_points // POINTS_PER_PIXEL)
+    x = tel["X"].to_numpy()[idx]
+    y = tel["Y"].to_numpy()[idx]
+    speed = tel["Speed"].to_numpy()[idx]
+
+    fig = go.Figure()
+    fig.add_trace(go.Scattergl(x=x, y=y, mode="lines", line=dict(color="black", width=16),
+                               hoverinfo="skip", showlegend=False))
+    fig.add_trace(go.Scattergl(
+        x=x, y=y, mode="markers", showlegend=False,
+        marker=dict(color=speed, colorscale=colorscale, size=5,
+                    colorbar=dict(title="km/h", orientation="h")),
+        hovertemplate="%{marker.color:.0f} km/h<extra></extra>",
+    ))
+    return _track_layout(fig, title)
+
+
+def gear_shifts(tel, title, cmap="Paired", max_points=MAX_POINTS):
+    """WebGL track map with one trace per gear from a lap's merged telemetry."""
+    idx = downsample(tel["Distance"], tel["nGear"], max_points // POINTS_PER_PIXEL)
+    x = tel["X"].to_numpy()[idx]
+    y = tel["Y"].to_numpy()[idx]
+    gear = tel["nGear"].to_numpy()[idx]
+    # same colours as the image mode, which maps gear g to the g-th colour
+    colors = colormaps[cmap].colors
+
+    fig = go.Figure()
+    for g in np.unique(gear):
+        if not 1 <= g <= len(colors):
+            continue
+        on_gear = gear == g
+        fig.add_trace(go.Scattergl(x=x[on_gear], y=y[on_gear], mode="markers", name=f"Gear {g}",
+                                   marker=dict(color=to_hex(colors[int(g) - 1]), size=6)))
+    return _track_layout(fig, title)
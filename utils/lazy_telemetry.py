@@ -0,0 +1,135 @@
+import logging
+import threading
+
+from fastf1 import _api
+from fastf1.core import Telemetry
+
+from utils import session_loader, timing
+
+logger = logging.getLogger(__name__)
+
+
+class LazyTelemetry(dict):
+    """Per-driver telemetry dict that builds a driver's data on first access.
+
+    Drop-in for ``Session.car_data`` / ``Session.pos_data``: indexing and
+    ``in`` work for every driver with data, while iterating only sees the
+    drivers built so far. ``nbytes`` tracks the memory of the built frames.
+    """
+
+    def __init__(self, drivers, build, release=None):
+        super().__init__()
+        self.nbytes = 0
+        self._pending = dict.fromkeys(drivers)
+        self._build = build
+        self._release = release
+        self._lock = threading.Lock()
+
+    def __missing__(self, drv):
+        with self._lock:
+            if dict.__contains__(self, drv):
+                return dict.__getitem__(self, drv)
+            if drv not in self._pending:
+                raise KeyError(drv)
+            with timing.span("load"):
+                telemetry = self._build(drv)
+            self.nbytes += int(telemetry.memory_usage(index=True, deep=True).sum())
+            self[drv] = telemetry
+            del self._pending[drv]
+            if self._release is not None:
+                self._release(drv)
+            return telemetry
+
+    def __contains__(self, drv):
+        return dict.__contains__(self, drv) or drv in self._pending
+
+    def drivers(self):
+        return list(self.keys()) + list(self._pending)
+
+    def peek(self, drv):
+        # a pending driver is built without being kept, e.g. for writing all
+        # drivers to the session store
+        with self._lock:
+            if dict.__contains__(self, drv):
+                return dict.__getitem__(self, drv)
+            return self._build(drv)
+
+    def transform(self, func):
+        """Replace every driver's frame by ``func(frame)``: the built ones now,
+        the pending ones when they are built."""
+        with self._lock:
+            build = self._build
+            self._build = lambda drv: func(build(drv))
+            self.nbytes = 0
+            for drv, telemetry in list(self.items()):
+                telemetry = func(telemetry)
+                self.nbytes += int(telemetry.memory_usage(index=True, deep=True).sum())
+                dict.__setitem__(self, drv, telemetry)
+
+    def materialize(self):
+        for drv in list(self._pending):
+            self[drv]
+        return self
+
+
+def _from_api(session, raw, drv):
+    # same processing as fastf1.core.Session._load_telemetry, for one driver;
+    # timestamps are recalculated from 'Date' because it has a higher resolution
+    telemetry = Telemetry(raw[drv].drop(labels="Time", axis=1),
+                          session=session, driver=drv, drop_unknown_channels=True)
+    telemetry["Date"] = telemetry["Date"].dt.round("ms")
+    telemetry["Time"] = telemetry["Date"] - session.t0_date
+    telemetry["SessionTime"] = telemetry["Time"]
+    return telemetry
+
+
+def _fetch(loader, session, name):
+    try:
+        return loader(session.api_path)
+    except _api.SessionNotAvailableError:
+        logger.warning("%s is unavailable!", name)
+        return {}
+
+
+def load(session, lazy=True):
+    """Replacement for ``Session._load_telemetry`` building drivers on demand.
+
+    The upstream car and position streams interleave all cars, so they are
+    still fetched as a whole, but the per-driver frames are only processed
+    when a driver is first accessed.
+    """
+    try:
+        session_loader.stage("car_data")
+        car_data = _fetch(_api.car_data, session, "Car telemetry data")
+        session_loader.stage("pos_data")
+        pos_data = _fetch(_api.position_data, session, "Car position data")
+        session._calculate_t0_date(car_data, pos_data)
+    except session_loader.Cancelled:
+        raise
+    except Exception:
+        # soft failure like fastf1's own loaders: the session stays usable
+        logger.warning("Failed to load telemetry data!")
+        logger.debug("Telemetry loading failed", exc_info=True)
+        return
+
+    for name, raw in (("_car_data", car_data), ("_pos_data", pos_data)):
+        telemetry = LazyTelemetry(
+            [drv for drv in session.drivers if drv in raw],
+            build=lambda drv, raw=raw: _from_api(session, raw, drv),
+            release=raw.pop,
+        )
+        setattr(session, name, telemetry if lazy else telemetry.materialize())
+
+    if hasattr(session, "_laps") and session.t0_date is not None:
+        session._laps["LapStartDate"] = session._laps["LapStartTime"] + session.t0_date
+
+
+def lap_telemetry(lap):
+    """Merged car and position data of a single lap.
+
+    Like ``Lap.get_telemetry()`` but without the driver-ahead channels, which
+    need every other car's data and so would defeat per-driver loading.
+    """
+    pos_data = lap.get_pos_data(pad=1, pad_side="both")
+    car_data = lap.get_car_data(pad=1, pad_side="both").add_distance()
+    return pos_data.merge_channels(car_data).slice_by_lap(lap, interpolate_edges=True)
@@ -0,0 +1,190 @@
+import logging
+import os
+import sys
+import threading
+import time
+import weakref
+
+import streamlit as st
+
+from utils import config
+
+logger = logging.getLogger(__name__)
+
+# session_state entry of the bookkeeping: namespaced key -> time of last use
+_USES_KEY = "_page_state_uses"
+
+_users = {}  # Streamlit session id -> usage of that user's last page run
+_lock = threading.Lock()
+
+
+def nbytes(value):
+    """Approximate memory held by a session_state value."""
+    if isinstance(value, _SessionRef):
+        # the session itself belongs to the session cache
+        return 0
+    if hasattr(value, "getbuffer"):  # io.BytesIO, e.g. a PNG
+        return value.getbuffer().nbytes
+    if isinstance(value, (bytes, bytearray, str)):
+        return len(value)
+    import pandas as pd  # pages import this module at the top, see README "Benchmarks"
+
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return int(value.memory_usage(index=True, deep=True).sum()) if value.ndim > 1 \
+            else int(value.memory_usage(index=True, deep=True))
+    if hasattr(value, "memory_usage"):  # Index, Categorical and other pandas arrays
+        return int(value.memory_usage(deep=True))
+    if hasattr(value, "nbytes"):  # numpy
+        return int(value.nbytes)
+    if isinstance(value, (list, tuple, set, dict)):
+        return sys.getsizeof(value) + sum(sys.getsizeof(item) for item in value)
+    return sys.getsizeof(value)
+
+
+class _SessionRef:
+    # a page's session: a weak reference, so the session cache alone decides
+    # how long a session stays in memory, plus what is needed to load it
+    # again once the cache has evicted it
+    def __init__(self, session, requires):
+        self.key = (session.event.year, int(session.event["RoundNumber"]), session.name)
+        self.requires = requires
+        self._ref = weakref.ref(session)
+
+    def get(self):
+        session = self._ref()
+        if session is not None:
+            return session
+        from utils.session_cache import load_session
+
+        logger.info("Reloading evicted session %s", self.key)
+        try:
+            session = load_session(*self.key, self.requires)
+        except Exception as e:
+            logger.warning("Could not reload session %s: %s", self.key, e)
+            return None
+        self._ref = weakref.ref(session)
+        return session
+
+
+class PageState:
+    """A page's values in ``st.session_state``, under keys of its own.
+
+    ``state.image`` reads and writes ``st.session_state["Page.image"]``, or
+    returns the default given for it; a page never sees another page's
+    values. ``state.session`` only keeps a weak reference: the session is
+    shared through the session cache and reloaded with ``requires`` if the
+    cache evicted it. Pages call ``close()`` at the end of a run, which
+    drops the user's least recently used values of other pages beyond
+    F1VIZ_USER_STATE_MB, and any of them idle for F1VIZ_STATE_IDLE_MINUTES.
+    """
+
+    def __init__(self, page, requires=(), **defaults):
+        object.__setattr__(self, "_page", page)
+        object.__setattr__(self, "_requires", requires)
+        object.__setattr__(self, "_defaults", defaults)
+
+    def key(self, name):
+        """Namespaced session_state key, e.g. for a widget's ``key=``."""
+        return f"{self._page}.{name}"
+
+    def _touch(self, key):
+        st.session_state.setdefault(_USES_KEY, {})[key] = time.monotonic()
+
+    def __getattr__(self, name):
+        key = self.key(name)
+        if key not in st.session_state:
+            return self._defaults.get(name)
+        self._touch(key)
+        value = st.session_state[key]
+        if isinstance(value, _SessionRef):
+            value = value.get()
+            if value is None:
+                del st.session_state[key]
+        return value
+
+    def __setattr__(self, name, value):
+        if name == "session" and value is not None:
+            value = _SessionRef(value, self._requires)
+        key = self.key(name)
+        st.session_state[key] = value
+        self._touch(key)
+
+    def close(self):
+        """Enforce the user's budget and record their usage; see usage()."""
+        sizes = _collect(self._page)
+        total = sum(sizes.values())
+        with _lock:
+            _users[_user_id()] = {"page": self._page, "keys": len(sizes), "bytes": total,
+                                  "seen": time.monotonic()}
+        if config.MEMORY_SIDEBAR:
+            _sidebar(sizes)
+
+
+def scope(path, requires=(), **defaults):
+    """PageState of the page script at ``path`` (its ``__file__``)."""
+    return PageState(os.path.splitext(os.path.basename(path))[0], requires, **defaults)
+
+
+def _user_id():
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx is not None else "local"
+
+
+def _collect(page):
+    # least recently used values of other pages go first; the current page
+    # keeps its values even if they alone exceed the budget
+    uses = st.session_state.setdefault(_USES_KEY, {})
+    for key in [key for key in uses if key not in st.session_state]:
+        del uses[key]
+    sizes = {key: nbytes(st.session_state[key]) for key in uses}
+    total = sum(sizes.values())
+    budget = config.USER_STATE_MB * 2**20
+    idle = config.STATE_IDLE_MINUTES * 60
+    now = time.monotonic()
+    for key in sorted(uses, key=uses.get):
+        if key.startswith(f"{page}."):
+            continue
+        if now - uses[key] <= idle and total <= budget:
+            break
+        total -= sizes.pop(key)
+        del st.session_state[key]
+        del uses[key]
+        logger.debug("Dropped %s from the session state", key)
+    return sizes
+
+
+def usage():
+    """Process-wide view of the memory held for the connected users.
+
+    Session state of every user who ran a page within the idle time, next to
+    the session cache and the shared telemetry segments they draw from.
+    """
+    from utils import shared_telemetry
+    from utils.session_cache import cache
+
+    idle = config.STATE_IDLE_MINUTES * 60
+    now = time.monotonic()
+    with _lock:
+        for user in [user for user, use in _users.items() if now - use["seen"] > idle]:
+            del _users[user]
+        users = [dict(use) for use in _users.values()]
+    return {
+        "users": len(users),
+        "state_bytes": sum(use["bytes"] for use in users),
+        "max_user_bytes": max((use["bytes"] for use in users), default=0),
+        "session_cache_bytes": cache.stats()["bytes"],
+        "shared_telemetry_bytes": sum(segment["bytes"] for segment in shared_telemetry.stats().values()),
+    }
+
+
+def _sidebar(sizes):
+    with st.sidebar.expander("🧠 Memory"):
+        st.caption("This session")
+        st.table([{"key": key, "KB": f"{size / 2**10:.0f}"}
+                  for key, size in sorted(sizes.items(), key=lambda item: -item[1])])
+        st.caption("All users of this server process")
+        st.table([{"": name.replace("_", " "),
+                   "value": f"{value / 2**20:.1f} MB" if name.endswith("bytes") else str(value)}
+                  for name, value in usage().items()])
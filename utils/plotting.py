@@ -0,0 +1,30 @@
+import threading
+
+# Arguments of the last fastf1.plotting.setup_mpl() call in this process
+_applied = None
+_lock = threading.Lock()
+
+
+def setup_mpl(**kwargs):
+    """``fastf1.plotting.setup_mpl(**kwargs)``, once per process.
+
+    Matplotlib's settings are process-wide, so they only need applying again
+    when a page asks for different ones than the last page did. Every render
+    function calls this, also with ``color_scheme=None``: a figure must not
+    depend on which page ran before it, the figure cache keeps it. A figure
+    served from the figure cache doesn't import fastf1's plotting module at
+    all.
+    """
+    global _applied
+    settings = sorted(kwargs.items())
+    with _lock:
+        if settings == _applied:
+            return
+        import fastf1.plotting
+        import matplotlib
+
+        # fastf1 only changes the settings it is asked for, the rest would
+        # still be those of the last page
+        matplotlib.rcdefaults()
+        fastf1.plotting.setup_mpl(**kwargs)
+        _applied = settings
@@ -0,0 +1,73 @@
+import threading
+import weakref
+
+import numpy as np
+import fastf1.plotting
+from matplotlib.collections import LineCollection
+from matplotlib.lines import Line2D
+
+# session -> (laps the matrix was built from, matrix)
+_matrices = weakref.WeakKeyDictionary()
+_lock = threading.Lock()
+
+
+def _build(session, laps):
+    positions = (laps.loc[laps["Position"].notna(), ["Driver", "LapNumber", "Position"]]
+                 .drop_duplicates(["Driver", "LapNumber"])
+                 .pivot(index="Driver", columns="LapNumber", values="Position"))
+    positions.columns = positions.columns.astype(int)
+    # rows in the order of session.drivers, like the results
+    order = [session.get_driver(drv)["Abbreviation"] for drv in session.drivers]
+    return positions.reindex([drv for drv in order if drv in positions.index])
+
+
+def position_matrix(session):
+    """Position of every driver (rows) at the end of every lap (columns).
+
+    Built from ``session.laps`` once per session and shared by all callers;
+    laps without a position are NaN. Treat the result as read-only.
+    """
+    laps = session.laps
+    with _lock:
+        cached = _matrices.get(session)
+        if cached is not None and cached[0] is laps:
+            return cached[1]
+    positions = _build(session, laps)
+    with _lock:
+        _matrices[session] = (laps, positions)
+    return positions
+
+
+def positions_gained(positions):
+    """Positions gained (negative: lost) between each driver's first and last
+    classified lap."""
+    first = positions.bfill(axis=1).iloc[:, 0]
+    last = positions.ffill(axis=1).iloc[:, -1]
+    return (first - last).rename("PositionsGained")
+
+
+def overtakes_per_lap(positions):
+    """Number of drivers who improved their position on each lap.
+
+    Counted from the lap-end positions, so position changes from pit stops
+    and retirements are included.
+    """
+    return (positions.diff(axis=1) < 0).sum().rename("Overtakes")
+
+
+def draw_positions(ax, positions, session):
+    """Draw the position matrix as one LineCollection, styled per driver.
+
+    Returns legend handles, one per driver.
+    """
+    styles = [fastf1.plotting.get_driver_style(identifier=drv, style=["color", "linestyle"],
+                                               session=session)
+              for drv in positions.index]
+    laps = np.broadcast_to(positions.columns.to_numpy(dtype=float), positions.shape)
+    segments = np.stack([laps, positions.to_numpy(dtype=float)], axis=-1)
+
+    lines = LineCollection(segments, colors=[style["color"] for style in styles],
+                           linestyles=[style["linestyle"] for style in styles])
+    ax.add_collection(lines)
+    ax.autoscale_view()
+    return [Line2D([], [], label=drv, **style) for drv, style in zip(positions.index, styles)]
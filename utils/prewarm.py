@@ -0,0 +1,117 @@
+"""Load a season's sessions ahead of time so the pages start from a warm store.
+
+Usage:
+    python -m utils.prewarm 2024 --rounds 1-6 --sessions Q R --workers 4
+    python -m utils.prewarm 2023 --offline --cache-dir ~/.cache/fastf1
+
+Every matching session is loaded in a pool of worker processes and written
+to the Arrow session store (F1VIZ_STORE_DIR); sessions the store doesn't
+take (e.g. less than a day old) are reported as failed. With --offline, fastf1 only
+serves data from its local cache of recorded API responses and never touches
+the network.
+"""
+import argparse
+import logging
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import fastf1
+
+from utils import session_cache, session_store
+from utils.session_cache import ALL_DATA, load_options
+
+DEFAULT_SESSIONS = ("FP1", "FP2", "FP3", "SQ", "S", "Q", "R")
+
+
+def parse_rounds(value):
+    first, _, last = value.partition("-")
+    return range(int(first), int(last or first) + 1)
+
+
+def find_sessions(year, rounds=None, session_types=DEFAULT_SESSIONS):
+    """(round, session name) of every matching session in the schedule."""
+    schedule = fastf1.get_event_schedule(year, include_testing=False)
+    found = []
+    for rnd in schedule["RoundNumber"]:
+        if rounds is not None and rnd not in rounds:
+            continue
+        event = schedule.get_event_by_round(rnd)
+        for session_type in session_types:
+            try:
+                name = event.get_session_name(session_type)
+            except ValueError:
+                # e.g. sprint sessions on a conventional weekend
+                continue
+            found.append((int(rnd), name))
+    return found
+
+
+def _init_worker(offline, cache_dir):
+    if cache_dir:
+        fastf1.Cache.enable_cache(cache_dir)
+    if offline:
+        fastf1.Cache.offline_mode(True)
+    fastf1.set_log_level("WARNING")
+
+
+def _prewarm(year, rnd, session_name, requires):
+    start = time.perf_counter()
+    session = session_cache.load_session(year, rnd, session_name, requires)
+    # the worker only fills the store, it doesn't need to keep sessions in RAM
+    session_cache.cache.clear()
+    options = {option: True for option in load_options(requires)}
+    if not session_store.holds(session, options):
+        reason = session_store.unstorable(session) or "writing it failed, see the log"
+        raise RuntimeError(f"loaded but not stored: {reason}")
+    return time.perf_counter() - start
+
+
+def prewarm(year, rounds=None, session_types=DEFAULT_SESSIONS, requires=ALL_DATA,
+            workers=None, offline=False, cache_dir=None, out=sys.stdout):
+    """Load all matching sessions in parallel; returns the list of failures."""
+    _init_worker(offline, cache_dir)
+    sessions = find_sessions(year, rounds, session_types)
+    print(f"Pre-warming {len(sessions)} sessions of {year}", file=out)
+
+    failures = []
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(offline, cache_dir)) as pool:
+        futures = {pool.submit(_prewarm, year, rnd, name, requires): (rnd, name)
+                   for rnd, name in sessions}
+        for future in as_completed(futures):
+            rnd, name = futures[future]
+            try:
+                print(f"  round {rnd:>2} {name:<18} {future.result():7.1f}s", file=out)
+            except Exception as e:
+                failures.append((rnd, name, e))
+                print(f"  round {rnd:>2} {name:<18}  FAILED: {e}", file=out)
+
+    print(f"Done in {time.perf_counter() - start:.1f}s, "
+          f"{len(sessions) - len(failures)} stored, {len(failures)} failed", file=out)
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m utils.prewarm", description=__doc__.splitlines()[0])
+    parser.add_argument("year", type=int)
+    parser.add_argument("--rounds", type=parse_rounds, help="round or range of rounds, e.g. 3 or 1-6")
+    parser.add_argument("--sessions", nargs="+", default=DEFAULT_SESSIONS, metavar="TYPE",
+                        help="session types, e.g. FP1 Q R (default: all)")
+    parser.add_argument("--data", nargs="+", default=ALL_DATA, choices=ALL_DATA,
+                        help="session data to load (default: all)")
+    parser.add_argument("--workers", type=int, help="worker processes (default: CPU count)")
+    parser.add_argument("--offline", action="store_true",
+                        help="only use fastf1's local cache of recorded API responses")
+    parser.add_argument("--cache-dir", help="fastf1 cache directory")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    failures = prewarm(args.year, args.rounds, args.sessions, tuple(args.data),
+                       args.workers, args.offline, args.cache_dir)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,53 @@
+import pandas as pd
+import fastf1.plotting
+
+SEGMENTS = ("Q1", "Q2", "Q3")
+
+
+def team_colors(session, teams):
+    """Lookup table of team name -> colour, one lookup per distinct team."""
+    return {team: fastf1.plotting.get_team_color(team, session=session)
+            for team in pd.unique(pd.Series(teams).dropna())}
+
+
+def _segment_bests(laps):
+    # best valid lap time of every driver in each part of a quali-like session
+    bests = pd.DataFrame(index=pd.Index(pd.unique(laps["Driver"]), name="Driver"))
+    try:
+        parts = laps.split_qualifying_sessions()
+    except ValueError:
+        # not a quali-like session or no session status data
+        parts = [None] * len(SEGMENTS)
+    for segment, part in zip(SEGMENTS, parts):
+        if part is None:
+            bests[segment] = pd.NaT
+            continue
+        valid = part.loc[part["Deleted"] != True, ["Driver", "LapTime"]]  # noqa: E712
+        bests[segment] = valid.groupby("Driver", observed=True)["LapTime"].min()
+    return bests
+
+
+def rank_fastest_laps(session, laps=None, segments=True):
+    """Fastest lap of every driver, quickest first, in one pass over the laps.
+
+    Same selection as ``pick_driver(drv).pick_fastest()`` for each driver
+    (personal best laps only), with ``LapTimeDelta`` as the gap to pole,
+    ``TeamColor`` and, if ``segments`` is set, the best lap time of each
+    driver in Q1, Q2 and Q3 (NaT outside quali-like sessions). Drivers
+    without a timed lap are left out.
+    """
+    if laps is None:
+        laps = session.laps
+    valid = laps.loc[(laps["IsPersonalBest"] == True) & laps["LapTime"].notna()]  # noqa: E712
+    ranking = (laps.loc[valid.groupby("Driver", sort=False, observed=True)["LapTime"].idxmin()]
+               .sort_values(by="LapTime", kind="stable")
+               .reset_index(drop=True))
+    if ranking.empty:
+        raise ValueError("No timed laps in this session")
+
+    ranking["LapTimeDelta"] = ranking["LapTime"] - ranking["LapTime"].iloc[0]
+    ranking["TeamColor"] = ranking["Team"].map(team_colors(session, ranking["Team"]))
+    if segments:
+        bests = _segment_bests(laps)
+        ranking = ranking.join(bests, on="Driver")
+    return ranking
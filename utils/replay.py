@@ -0,0 +1,179 @@
+"""Local stand-in for the F1 live timing and Ergast APIs, replaying recordings.
+
+Usage:
+    python -m utils.replay ~/.cache/fastf1 --port 8765 --latency 80 --bandwidth 2000
+    F1VIZ_UPSTREAM_URL=http://localhost:8765 streamlit run Welcome.py
+
+Serves the HTTP responses recorded in a fastf1 cache directory: the
+requests-cache database fastf1 keeps there (fastf1_http_cache.sqlite) holds
+every live timing, Ergast, schedule and circuit response fetched with that
+cache enabled, e.g. by ``python -m utils.prewarm 2023 --cache-dir DIR``.
+With F1VIZ_UPSTREAM_URL set, the app sends all of fastf1's requests to the
+server instead of the internet, as ``{server}/{original host}{path}``.
+Unknown requests get a 404, which fastf1 treats like data that upstream
+doesn't have.
+
+The server adds ``--latency`` milliseconds before each response and sends
+bodies at no more than ``--bandwidth`` kB/s, shared by all connections like
+a single uplink would be.
+"""
+import argparse
+import http.server
+import logging
+import os
+import sys
+import threading
+import time
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+logger = logging.getLogger(__name__)
+
+HTTP_CACHE_FILE = "fastf1_http_cache.sqlite"
+
+# Bytes written between bandwidth checks
+CHUNK_SIZE = 16 * 1024
+
+_redirected_to = None
+_lock = threading.Lock()
+
+
+def upstream_path(url):
+    """Path on the stand-in server of an upstream URL.
+
+    The host becomes the first path segment and query parameters are
+    sorted, so recorded and replayed requests match however their
+    parameters were ordered.
+    """
+    parts = urlsplit(url)
+    path = f"/{parts.netloc}{parts.path}"
+    if parts.query:
+        path += "?" + urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return path
+
+
+def load_recordings(cache_dir):
+    """Stand-in path -> (status, content type, body) of the recorded GETs."""
+    from requests_cache import SQLiteCache
+
+    path = os.path.join(cache_dir, HTTP_CACHE_FILE)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"No fastf1 HTTP cache at {path}")
+    recordings = {}
+    for response in SQLiteCache(path).responses.values():
+        if response.request.method != "GET":
+            continue
+        recordings[upstream_path(response.url)] = (
+            response.status_code, response.headers.get("Content-Type", "application/octet-stream"),
+            response.content)
+    return recordings
+
+
+class Throttle:
+    """Token bucket limiting the bytes per second sent by all connections."""
+
+    def __init__(self, bytes_per_second):
+        self.bytes_per_second = bytes_per_second
+        self._next = time.monotonic()  # when the link is free again
+        self._lock = threading.Lock()
+
+    def wait(self, nbytes):
+        # reserve the link for the time nbytes take, then wait for our turn
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + nbytes / self.bytes_per_second
+            delay = self._next - now
+        if delay > 0:
+            time.sleep(delay)
+
+
+def make_handler(recordings, latency=0.0, throttle=None):
+    """Request handler class serving ``recordings``."""
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            if latency:
+                time.sleep(latency)
+            recorded = recordings.get(upstream_path(f"//{self.path.lstrip('/')}"))
+            if recorded is None:
+                logger.info("Not recorded: %s", self.path)
+                recorded = (404, "text/plain", b"Not recorded")
+            status, content_type, body = recorded
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            for start in range(0, len(body), CHUNK_SIZE):
+                chunk = body[start:start + CHUNK_SIZE]
+                if throttle is not None:
+                    throttle.wait(len(chunk))
+                self.wfile.write(chunk)
+
+        def log_message(self, format, *args):
+            logger.debug("%s - %s", self.address_string(), format % args)
+
+    return Handler
+
+
+def make_server(recordings, host="127.0.0.1", port=8765, latency=0.0, bandwidth=None):
+    """Threaded HTTP server replaying ``recordings``; ``latency`` in seconds,
+    ``bandwidth`` in bytes per second (None for unlimited)."""
+    throttle = Throttle(bandwidth) if bandwidth else None
+    return http.server.ThreadingHTTPServer((host, port), make_handler(recordings, latency, throttle))
+
+
+def redirect(base_url):
+    """Send all of fastf1's HTTP requests in this process to ``base_url``.
+
+    fastf1's client-side rate limits are dropped as well: they are meant for
+    the public APIs, and the stand-in applies its own latency and bandwidth.
+    """
+    global _redirected_to
+    from fastf1 import req
+
+    with _lock:
+        patched = _redirected_to is not None
+        _redirected_to = base_url.rstrip("/")
+        if patched:
+            return
+        get, post = req.Cache.requests_get.__func__, req.Cache.requests_post.__func__
+
+        def requests_get(cls, url, **kwargs):
+            return get(cls, _redirected_to + upstream_path(url), **kwargs)
+
+        def requests_post(cls, url, **kwargs):
+            return post(cls, _redirected_to + upstream_path(url), **kwargs)
+
+        req.Cache.requests_get = classmethod(requests_get)
+        req.Cache.requests_post = classmethod(requests_post)
+        req._SessionWithRateLimiting._RATE_LIMITS = {}
+        logger.info("Sending fastf1 requests to %s", _redirected_to)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m utils.replay", description=__doc__.splitlines()[0])
+    parser.add_argument("cache_dir", help="fastf1 cache directory with the recorded responses")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="milliseconds added to every response")
+    parser.add_argument("--bandwidth", type=float, help="kB/s shared by all responses (default: unlimited)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    recordings = load_recordings(args.cache_dir)
+    server = make_server(recordings, args.host, args.port, args.latency / 1000,
+                         args.bandwidth * 1000 if args.bandwidth else None)
+    print(f"Replaying {len(recordings)} recorded responses on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,159 @@
+import logging
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from utils import config, session_store
+
+logger = logging.getLogger(__name__)
+
+# Session type abbreviations the pages offer, mapped to fastf1's session names
+SESSION_NAMES = {
+    "FP1": "Practice 1", "FP2": "Practice 2", "FP3": "Practice 3", "Q": "Qualifying",
+    "S": "Sprint", "SS": "Sprint Shootout", "SQ": "Sprint Qualifying", "R": "Race",
+}
+
+# Same rule as fastf1's Laps.pick_quicklaps(), applied per round
+QUICKLAP_THRESHOLD = 1.07
+
+# Columns stored as pandas categoricals
+CATEGORIES = ("Session", "Driver", "Team", "TeamColor", "Compound")
+
+_tables = {}  # year -> (names of the rounds read, table)
+_lock = threading.Lock()
+
+
+def _directory(year):
+    return os.path.join(config.STORE_DIR, str(year), "season_laps")
+
+
+def _name(rnd, session_name):
+    return f"{rnd:02d}_{session_name.replace(' ', '_')}"
+
+
+def round_laps(session):
+    """Compact table of the timed laps of ``session``.
+
+    One row per lap with a lap time: round, session name, driver, team, team
+    colour, lap number, lap time in seconds, compound and tyre life.
+    Strings are categoricals and numbers are 8 to 32 bit wide, so a season
+    of races takes a few MB.
+    """
+    laps = session.laps
+    laps = laps.loc[laps["LapTime"].notna()]
+    results = session.results
+    colors = {team: f"#{color}" for team, color in zip(results["TeamName"], results["TeamColor"])
+              if isinstance(color, str) and color}
+    frame = pd.DataFrame({
+        "Round": np.full(len(laps), session.event["RoundNumber"], dtype=np.int8),
+        "Session": session.name,
+        "Driver": laps["Driver"].to_numpy(),
+        "Team": laps["Team"].to_numpy(),
+        "TeamColor": laps["Team"].map(colors).to_numpy(),
+        "LapNumber": laps["LapNumber"].to_numpy(dtype=np.int16),
+        "LapTime": laps["LapTime"].dt.total_seconds().to_numpy(dtype=np.float32),
+        "Compound": laps["Compound"].to_numpy(),
+        "TyreLife": laps["TyreLife"].to_numpy(dtype=np.float32),
+    })
+    return _compact(frame)
+
+
+def _compact(frame):
+    # concatenating categoricals with different categories gives objects,
+    # so the categories are rebuilt after every concat
+    for column in CATEGORIES:
+        frame[column] = frame[column].astype("category")
+    return frame
+
+
+def record(session):
+    """Add the laps of a freshly loaded session to its season's table.
+
+    Called by the session cache whenever a session's laps are loaded, so
+    the table grows round by round as users, pre-warming or exports load
+    sessions. The round is persisted next to the session store, where other
+    processes pick it up. Like the session store, it skips sessions whose
+    data may still change: a round is recorded once and never replaced.
+    """
+    if session_store.provisional(session):
+        return
+    year = session.event.year
+    name = _name(int(session.event["RoundNumber"]), session.name)
+    frame = round_laps(session)
+    with _lock:
+        names, table = _tables.get(year, (frozenset(), None))
+        if name not in names:
+            table = frame if table is None else _compact(pd.concat([table, frame], ignore_index=True))
+            _tables[year] = (names | {name}, table)
+    _write(year, name, frame)
+
+
+def _write(year, name, frame):
+    if not config.STORE_DIR:
+        return
+    path = os.path.join(_directory(year), f"{name}.parquet")
+    if os.path.exists(path):
+        return
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.tmp.{os.getpid()}"
+        frame.to_parquet(tmp)
+        os.replace(tmp, path)
+    except OSError as e:
+        logger.warning("Could not persist %s: %s", path, e)
+
+
+def _stored_names(year):
+    if not config.STORE_DIR:
+        return set()
+    try:
+        files = os.listdir(_directory(year))
+    except OSError:
+        return set()
+    return {name[:-len(".parquet")] for name in files if name.endswith(".parquet")}
+
+
+def season_laps(year, session_type=None):
+    """Laps of every round of ``year`` loaded so far, see round_laps.
+
+    Rounds persisted by other processes since the last call are read and
+    appended; nothing is loaded from fastf1. With ``session_type`` (e.g.
+    "R"), only the laps of that kind of session. Returns None if no round
+    has been recorded.
+    """
+    with _lock:
+        names, table = _tables.get(year, (frozenset(), None))
+        new = sorted(_stored_names(year) - names)
+        frames = []
+        for name in new:
+            try:
+                frames.append(pd.read_parquet(os.path.join(_directory(year), f"{name}.parquet")))
+            except (OSError, ValueError) as e:
+                logger.warning("Could not read season laps %s: %s", name, e)
+        if frames:
+            table = _compact(pd.concat([table, *frames] if table is not None else frames, ignore_index=True))
+            _tables[year] = (names | set(new), table)
+    if table is None:
+        return None
+    if session_type is not None:
+        table = table.loc[table["Session"] == SESSION_NAMES.get(session_type, session_type)]
+    return table
+
+
+def team_pace(laps):
+    """Median quick lap time per team and round, and the season aggregate.
+
+    Quick laps are those within 107% of the round's fastest lap. Returns
+    ``(per_round, season)``: per_round has the rounds as rows, the teams as
+    columns and each team's median as a percentage gap to the fastest
+    team's median of that round; season is the median gap of every team over
+    the rounds, quickest first.
+    """
+    fastest = laps.groupby("Round", observed=True)["LapTime"].transform("min")
+    quick = laps.loc[laps["LapTime"] < fastest * QUICKLAP_THRESHOLD]
+    medians = quick.groupby(["Round", "Team"], observed=True)["LapTime"].median().unstack("Team")
+    per_round = (medians.div(medians.min(axis=1), axis=0) - 1) * 100
+    season = per_round.median().sort_values()
+    return per_round[season.index], season
@@ -0,0 +1,127 @@
+import logging
+import multiprocessing
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from utils import config, session_cache, timing
+from utils.alignment import GRID_STEP, aligned_laps
+from utils.rankings import rank_fastest_laps
+
+logger = logging.getLogger(__name__)
+
+# Columns of the per-season rankings kept in a comparison
+LAP_COLUMNS = ("Driver", "Team", "TeamColor", "LapTime", "LapTimeDelta")
+
+# Comparisons kept in memory, the least recently used are dropped; only
+# those in which every season loaded
+MAX_COMPARISONS = 8
+
+_pool = None
+_comparisons = OrderedDict()  # (years, event, session type, traces) -> SeasonComparison
+_lock = threading.Lock()
+
+
+class SeasonComparison:
+    """Fastest laps of the same Grand Prix in several seasons.
+
+    ``laps`` has the fastest lap of every driver in every season that could
+    be loaded, quickest first within a ``Year``. ``traces`` maps each season
+    to the time and speed of its fastest lap on the shared ``distance``
+    grid (see utils.alignment), if traces were requested. ``errors`` maps
+    the seasons that failed to load to the reason.
+    """
+
+    def __init__(self, event, session_type, laps, distance, traces, errors):
+        self.event = event
+        self.session_type = session_type
+        self.laps = laps
+        self.distance = distance
+        self.traces = traces
+        self.errors = errors
+
+    @property
+    def years(self):
+        return [int(year) for year in sorted(pd.unique(self.laps["Year"]))]
+
+
+def _season(year, event, session_type, traces):
+    # runs in a worker: only the compact result is sent back, and the
+    # session isn't kept, the session store makes a later load cheap
+    requires = ("laps", "car_data") if traces else ("laps",)
+    try:
+        session = session_cache.load_session(year, event, session_type, requires)
+        ranking = rank_fastest_laps(session, segments=False)
+        # a plain frame: fastf1's Laps would pickle the whole session along
+        laps = pd.DataFrame(ranking[list(LAP_COLUMNS)])
+        laps.insert(0, "Year", year)
+        trace = None
+        if traces:
+            _, time, speed = aligned_laps(session, [ranking.iloc[0]])
+            trace = (time[0].astype(np.float32), speed[0].astype(np.float32))
+        return laps, trace
+    finally:
+        session_cache.cache.clear()
+
+
+def _worker_pool():
+    # spawned rather than forked: the app's server process runs threads
+    global _pool
+    with _lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=config.SEASON_WORKERS,
+                                        mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+@timing.span("load")
+def compare_seasons(years, event, session_type, traces=False):
+    """Load ``event`` of every season in ``years`` concurrently and compare.
+
+    Each season is loaded in its own worker process, so the comparison takes
+    about as long as the slowest load when there are enough workers
+    (F1VIZ_SEASON_WORKERS). Seasons in which the event wasn't held or that
+    fail to load are reported in ``errors``; raises ValueError if none
+    could be loaded.
+    """
+    key = (tuple(years), event, session_type, traces)
+    with _lock:
+        cached = _comparisons.get(key)
+        if cached is not None:
+            _comparisons.move_to_end(key)
+            return cached
+
+    pool = _worker_pool()
+    futures = {pool.submit(_season, year, event, session_type, traces): year for year in years}
+    results, errors = {}, {}
+    for future in as_completed(futures):
+        year = futures[future]
+        try:
+            results[year] = future.result()
+        except Exception as e:
+            logger.warning("Could not load %s %s %s: %s", year, event, session_type, e)
+            errors[year] = str(e)
+    if not results:
+        raise ValueError(f"No season of {event} could be loaded: {errors}")
+
+    laps = pd.concat([results[year][0] for year in sorted(results)], ignore_index=True)
+    distance, season_traces = None, None
+    if traces:
+        # the grid ends at the shortest lap, like aligned_laps
+        n = min(len(time) for _, (time, _) in results.values())
+        distance = np.arange(n) * GRID_STEP
+        season_traces = {year: (time[:n], speed[:n]) for year, (_, (time, speed)) in sorted(results.items())}
+    comparison = SeasonComparison(event, session_type, laps, distance, season_traces, errors)
+    if errors:
+        # a failure may be transient (network, timeout), the next request
+        # tries those seasons again
+        return comparison
+
+    with _lock:
+        _comparisons[key] = comparison
+        while len(_comparisons) > MAX_COMPARISONS:
+            _comparisons.popitem(last=False)
+    return comparison
@@ -0,0 +1,382 @@
+import functools
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextlib import contextmanager
+
+import fastf1
+
+from utils import (compact, config, lazy_telemetry, replay, season_laps, session_loader, session_store,
+                   shared_telemetry, timing)
+from utils.lazy_telemetry import LazyTelemetry
+
+logger = logging.getLogger(__name__)
+
+if config.UPSTREAM_URL:
+    replay.redirect(config.UPSTREAM_URL)
+
+# Data a page can declare that it needs, mapped to the fastf1 load option
+# providing it. fastf1 loads car and position data together as "telemetry".
+DATA_PARTS = {
+    "laps": "laps",
+    "car_data": "telemetry",
+    "pos_data": "telemetry",
+    "weather": "weather",
+    "messages": "messages",
+}
+ALL_DATA = tuple(DATA_PARTS)
+
+# Same options as fastf1.core.Session.load()
+LOAD_OPTIONS = ("laps", "telemetry", "weather", "messages")
+
+# Session attributes holding plain frames and per-driver telemetry dicts
+_FRAME_ATTRS = ("_laps", "_results", "_weather_data", "_race_control_messages",
+                "_session_status", "_track_status")
+_TELEMETRY_ATTRS = ("_car_data", "_pos_data")
+
+# fastf1's loaders and the stage of a background load they belong to, see
+# session_loader.stage
+_LOADER_STAGES = {
+    "_load_session_info": "session",
+    "_load_drivers_results": "session",
+    "_load_session_status_data": "timing",
+    "_load_total_lap_count": "timing",
+    "_load_track_status_data": "timing",
+    "_load_laps_data": "laps",
+    "_load_weather_data": "weather",
+    "_load_race_control_messages": "messages",
+}
+
+
+def _frames_nbytes(session):
+    frames = (getattr(session, name, None) for name in _FRAME_ATTRS)
+    return int(sum(frame.memory_usage(index=True, deep=True).sum()
+                   for frame in frames if frame is not None))
+
+
+def _telemetry_nbytes(session):
+    total = 0
+    for name in _TELEMETRY_ATTRS:
+        telemetry = getattr(session, name, {})
+        if isinstance(telemetry, LazyTelemetry):
+            # grows as drivers are built, so this is kept cheap to re-read
+            total += telemetry.nbytes
+        else:
+            total += sum(int(frame.memory_usage(index=True, deep=True).sum())
+                         for frame in telemetry.values())
+    return total
+
+
+def session_nbytes(session):
+    """Approximate RAM held by the loaded data of a session."""
+    return _frames_nbytes(session) + _telemetry_nbytes(session)
+
+
+def load_options(requires):
+    """fastf1 load options (as a set of names) needed for the data parts."""
+    unknown = set(requires) - set(DATA_PARTS)
+    if unknown:
+        raise ValueError(f"Unknown session data {sorted(unknown)}, expected some of {ALL_DATA}")
+    return {DATA_PARTS[part] for part in requires}
+
+
+def _as_kwargs(options):
+    return {option: option in options for option in LOAD_OPTIONS}
+
+
+def _staged(stage, loader, *args, **kwargs):
+    session_loader.stage(stage)
+    return loader(*args, **kwargs)
+
+
+@contextmanager
+def _reporting_stages(session):
+    # the loaders of this session object report their stage while it loads;
+    # they are shadowed by instance attributes, fastf1 calls them on self
+    for name, stage in _LOADER_STAGES.items():
+        setattr(session, name, functools.partial(_staged, stage, getattr(session, name)))
+    try:
+        yield
+    finally:
+        for name in _LOADER_STAGES:
+            vars(session).pop(name, None)
+
+
+def _load(session, options, loaded):
+    # the first load goes through fastf1's regular path including its post
+    # processing, later upgrades only call the loaders of the missing parts.
+    # Telemetry is loaded by lazy_telemetry instead of fastf1 in both cases.
+    with _reporting_stages(session):
+        if not loaded:
+            session.load(**_as_kwargs(options - {"telemetry"}))
+        elif session.f1_api_support:
+            _load_missing(session, options)
+    if "telemetry" in options and session.f1_api_support:
+        lazy_telemetry.load(session, lazy=config.LAZY_TELEMETRY)
+
+
+def _load_missing(session, options):
+    if "laps" in options:
+        session._load_session_status_data()
+        session._load_total_lap_count()
+        session._load_track_status_data()
+        session._load_laps_data()
+        session._add_first_lap_time_from_ergast()
+        session._fix_missing_laps_retired_on_track()
+        session._calculate_quali_like_session_results()
+    if "weather" in options:
+        session._load_weather_data()
+    if "messages" in options:
+        session._load_race_control_messages()
+
+
+def _link_parts(session, added):
+    # derived laps columns depend on other parts and have to be refreshed
+    # when one of those is added to an already loaded session
+    has_laps = hasattr(session, "_laps")
+    if has_laps and {"laps", "telemetry"} & added and hasattr(session, "_t0_date"):
+        session._laps["LapStartDate"] = session._laps["LapStartTime"] + session._t0_date
+    if has_laps and {"laps", "messages"} & added and hasattr(session, "_race_control_messages"):
+        session._set_laps_deleted_from_rcm()
+
+
+def _record_season_laps(session):
+    # the season table is a by-product, a session without usable laps
+    # doesn't stop the load
+    try:
+        season_laps.record(session)
+    except Exception as e:
+        logger.warning("Could not add %s to the season laps: %s", session, e)
+
+
+class _Entry:
+    def __init__(self, session):
+        self.session = session
+        self.options = set()  # fastf1 load options already loaded
+        self.frames_nbytes = 0
+
+    @property
+    def nbytes(self):
+        return self.frames_nbytes + _telemetry_nbytes(self.session)
+
+
+class SessionCache:
+    """Loaded fastf1 sessions shared by all pages and user connections.
+
+    Entries are keyed by (year, round, session name). Each entry remembers
+    which parts of the session are loaded, and a request needing more data
+    upgrades the cached session in place. The least recently used entries
+    are evicted once the loaded data exceeds ``max_bytes``.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.upgrades = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # key -> _Entry
+        self._lock = threading.Lock()
+        # key being loaded -> [its lock, threads holding or waiting for it],
+        # see _locked
+        self._loading = {}
+        # loaded sessions are written to the session store in this thread
+        # after the request that loaded them got the session, see _store
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="session-store")
+        self._finishing = {}  # key -> future of its deferred _finish_load
+
+    def get(self, year, event, session_type, requires=ALL_DATA):
+        with timing.span("get_session"):
+            session = fastf1.get_session(year, event, session_type)
+        options = load_options(requires)
+        key = (year, int(session.event["RoundNumber"]), session.name)
+
+        with self._lock:
+            cached = self._lookup(key, options)
+            if cached is not None:
+                return cached
+
+        with self._locked(key):
+            with self._lock:
+                cached = self._lookup(key, options)
+                if cached is not None:
+                    return cached
+                entry = self._entries.get(key)
+                if entry is None:
+                    entry = _Entry(session)
+                    self.misses += 1
+                else:
+                    self.upgrades += 1
+            # an upgrade waits until the previous load of the key is stored
+            finishing = self._finishing.get(key)
+            if finishing is not None:
+                wait([finishing])
+            shared = False
+            try:
+                missing = options - entry.options
+                with timing.span("load"):
+                    # telemetry published by another server process is
+                    # attached rather than loaded
+                    shared = "telemetry" in missing and shared_telemetry.attach(entry.session, key)
+                    parts = missing - {"telemetry"} if shared else missing
+                    restored = deferred = False
+                    if not entry.options:
+                        session_loader.stage("store")
+                    if entry.options and not parts:
+                        _link_parts(entry.session, missing)
+                    elif session_store.restore(entry.session, _as_kwargs(parts)):
+                        restored = True
+                        # parts may have been stored by separate loads
+                        _link_parts(entry.session, missing | entry.options)
+                    else:
+                        _load(entry.session, parts, entry.options)
+                        if entry.options or shared:
+                            _link_parts(entry.session, missing)
+                        # writing every driver's telemetry would process the
+                        # whole grid, the request doesn't wait for it
+                        deferred = session_store.unstorable(entry.session) is None
+                    publish = "telemetry" in parts and not restored
+                    if not deferred:
+                        self._finish_load(key, missing, entry.session, publish)
+                entry.options |= missing
+                entry.frames_nbytes = _frames_nbytes(entry.session)
+                if "laps" in missing:
+                    _record_season_laps(entry.session)
+                with self._lock:
+                    self._entries[key] = entry
+                    self._entries.move_to_end(key)
+                    self._evict()
+                    if deferred:
+                        self._finishing[key] = self._writer.submit(
+                            self._store, key, entry, missing, parts, publish)
+            except Exception:
+                # a failed or cancelled load of a new entry keeps nothing,
+                # including the shared telemetry attached for it
+                with self._lock:
+                    kept = self._entries.get(key) is entry
+                if shared and not kept:
+                    shared_telemetry.release(key)
+                raise
+
+        logger.info("Loaded %s %s (%.1f MB), cache stats: %s",
+                    entry.session, sorted(missing), entry.nbytes / 2**20, self.stats())
+        return entry.session
+
+    @contextmanager
+    def _locked(self, key):
+        # one lock per key, so concurrent requests for the same session wait
+        # for a single load instead of parsing it twice; it is dropped only
+        # once no thread holds or waits for it, a new one would let a
+        # waiting and a newly arriving thread load at the same time
+        with self._lock:
+            loading = self._loading.setdefault(key, [threading.Lock(), 0])
+            loading[1] += 1
+        key_lock = loading[0]
+        try:
+            if not key_lock.acquire(blocking=False):
+                session_loader.stage("waiting")
+                key_lock.acquire()
+            try:
+                yield
+            finally:
+                key_lock.release()
+        finally:
+            with self._lock:
+                loading[1] -= 1
+                if not loading[1]:
+                    del self._loading[key]
+
+    def _finish_load(self, key, missing, session, publish):
+        # after the store write, so the store keeps fastf1's dtypes, and
+        # before publishing, so shared segments are compact
+        if config.COMPACT_DTYPES:
+            compact.compact_session(session, missing)
+        if publish:
+            shared_telemetry.publish(session, key)
+
+    def _store(self, key, entry, missing, parts, publish):
+        # runs in the writer thread, the session is already in use by pages
+        try:
+            session_store.save(entry.session, _as_kwargs(parts))
+            self._finish_load(key, missing, entry.session, publish)
+        except Exception as e:
+            logger.warning("Could not finish loading %s: %s", entry.session, e)
+        with self._lock:
+            entry.frames_nbytes = _frames_nbytes(entry.session)
+            self._finishing.pop(key, None)
+            evicted = self._entries.get(key) is not entry
+        if publish and evicted:
+            # evicted while it was written, nothing holds the published segments
+            shared_telemetry.release(key)
+
+    def flush(self):
+        """Wait until the sessions loaded so far are written to the store."""
+        with self._lock:
+            futures = list(self._finishing.values())
+        wait(futures)
+
+    def _lookup(self, key, options):
+        # caller holds self._lock
+        entry = self._entries.get(key)
+        if entry is None or not options <= entry.options:
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        # lazily loaded telemetry may have grown since the last check
+        self._evict()
+        return entry.session
+
+    def _evict(self):
+        # caller holds self._lock; the newest entry is always kept, even if
+        # it alone exceeds the budget
+        while self._total_nbytes() > self.max_bytes and len(self._entries) > 1:
+            key, entry = self._entries.popitem(last=False)
+            self.evictions += 1
+            shared_telemetry.release(key)
+            logger.info("Evicted %s (%.1f MB)", entry.session, entry.nbytes / 2**20)
+
+    def _total_nbytes(self):
+        return sum(entry.nbytes for entry in self._entries.values())
+
+    def clear(self):
+        self.flush()
+        with self._lock:
+            for key in self._entries:
+                shared_telemetry.release(key)
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses + self.upgrades
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "upgrades": self.upgrades,
+                "evictions": self.evictions,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "bytes": self._total_nbytes(),
+                "max_bytes": self.max_bytes,
+            }
+
+
+cache = SessionCache(max_bytes=config.SESSION_CACHE_MB * 2**20)
+
+
+def load_session(year, event, session_type, requires=ALL_DATA):
+    """Load a session with (at least) the data parts listed in ``requires``.
+
+    Replaces ``fastf1.get_session(...)`` + ``session.load()`` in the pages.
+    """
+    return cache.get(year, event, session_type, requires)
+
+
+def ensure_data(session, requires):
+    """Return ``session`` (or its cached copy) with ``requires`` loaded.
+
+    For pages that keep a session in ``st.session_state`` which may have been
+    loaded by another page with less data.
+    """
+    return cache.get(session.event.year, int(session.event["RoundNumber"]),
+                     session.name, requires)
@@ -0,0 +1,256 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from utils import config, timing
+
+logger = logging.getLogger(__name__)
+
+# Stages of a load in the order they run in, with their label and the
+# seconds they are assumed to take until loads in this process have been
+# timed. Which of them run depends on the data parts requested.
+STAGES = {
+    "session": ("Session info", 1.0),
+    "timing": ("Timing data", 1.0),
+    "laps": ("Laps", 4.0),
+    "weather": ("Weather", 0.5),
+    "messages": ("Race control messages", 0.5),
+    "car_data": ("Car data", 6.0),
+    "pos_data": ("Position data", 6.0),
+}
+# Stages outside the plan, they only change the label
+WAITING = {
+    "queued": "Waiting for a free loader",
+    "waiting": "Waiting for another load of this session",
+    "store": "Reading the session store",
+}
+
+# Seconds between two progress updates in the browser
+POLL_SECONDS = 0.5
+
+# Seconds a page run waits for a load it started: cache hits and loads from
+# the session store finish within it and show no progress bar
+QUICK_SECONDS = 0.2
+
+_pool = None
+_running = set()  # jobs not finished yet
+_seconds = {stage: seconds for stage, (_, seconds) in STAGES.items()}  # stage -> mean seconds
+_local = threading.local()  # job of the loader thread
+_lock = threading.Lock()
+
+
+class Cancelled(Exception):
+    """The load was cancelled."""
+
+
+class LoadJob:
+    """A session loaded in the background.
+
+    ``progress()`` tells how far the load got, by the stages it has passed
+    and the time the remaining ones took in earlier loads. ``cancel()``
+    stops the load at the next stage; a stage already running (e.g. a
+    download) is finished first.
+    """
+
+    def __init__(self, year, event, session_type, requires):
+        from utils.session_cache import DATA_PARTS
+
+        self.args = (year, event, session_type, requires)
+        options = {DATA_PARTS[part] for part in requires}
+        self.plan = ["session"]
+        if "laps" in options:
+            self.plan += ["timing", "laps"]
+        self.plan += [stage for stage in ("weather", "messages") if stage in options]
+        if "telemetry" in options:
+            self.plan += ["car_data", "pos_data"]
+        self.stage = "queued"
+        self.started = time.perf_counter()
+        self.times = {}  # planned stage -> seconds it took
+        self.trace = timing.Trace(str(self))  # timing spans of the load
+        self._cancelled = threading.Event()
+        self._future = None
+
+    def progress(self):
+        """(fraction done, label of the current stage)"""
+        if self._future.done():
+            return 1.0, "Done"
+        stage, started = self.stage, self.started
+        expected = {name: _seconds[name] for name in self.plan}
+        if stage in self.plan:
+            # stages before the current one have passed, also the ones with
+            # nothing to load (e.g. restored from the session store)
+            step = self.plan.index(stage)
+            done = sum(expected[name] for name in self.plan[:step])
+            # the current stage counts as done until almost all of its time
+            done += min(time.perf_counter() - started, 0.9 * expected[stage])
+            label = STAGES[stage][0]
+        else:
+            step = len(self.times)
+            done = sum(expected[name] for name in self.times)
+            label = WAITING[stage]
+        step = min(step + 1, len(self.plan))
+        return done / sum(expected.values()), f"{label} ({step}/{len(self.plan)})"
+
+    def cancel(self):
+        self._cancelled.set()
+        self._future.cancel()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def done(self):
+        return self._future.done()
+
+    def wait(self, timeout=None):
+        """Whether the load finished within ``timeout`` seconds."""
+        wait([self._future], timeout)
+        return self.done()
+
+    def result(self):
+        """The loaded session; raises the load's error, or Cancelled."""
+        if self.cancelled:
+            raise Cancelled(f"Loading {self} was cancelled")
+        return self._future.result()
+
+    def __str__(self):
+        year, event, session_type, _ = self.args
+        return f"{year} {event} {session_type}"
+
+
+def stage(name):
+    """Report that the load of this thread entered stage ``name``.
+
+    Called by the loading code at stage boundaries; raises Cancelled if the
+    job was cancelled. A no-op outside a background load.
+    """
+    job = getattr(_local, "job", None)
+    if job is None:
+        return
+    if name != job.stage:
+        now = time.perf_counter()
+        if job.stage in job.plan and job.stage not in job.times:
+            job.times[job.stage] = now - job.started
+        job.stage, job.started = name, now
+    if job.cancelled:
+        raise Cancelled(f"Loading {job} was cancelled")
+
+
+def _run(job):
+    from utils.session_cache import load_session
+
+    _local.job = job
+    try:
+        with timing.tracing(job.trace):
+            stage("session")
+            session = load_session(*job.args)
+    finally:
+        _local.job = None
+    stage_seconds = dict(job.times)
+    if job.stage in job.plan and job.stage not in stage_seconds:
+        stage_seconds[job.stage] = time.perf_counter() - job.started
+    with _lock:
+        for name, seconds in stage_seconds.items():
+            _seconds[name] = 0.8 * _seconds[name] + 0.2 * seconds
+    return session
+
+
+def _loader_pool():
+    global _pool
+    with _lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=config.LOAD_WORKERS, thread_name_prefix="session-loader")
+        return _pool
+
+
+def _finished(future, job):
+    with _lock:
+        _running.discard(job)
+    error = None if future.cancelled() else future.exception()
+    if error is not None and not isinstance(error, Cancelled):
+        logger.warning("Could not load %s: %s", job, error)
+
+
+def submit(year, event, session_type, requires):
+    """Start loading a session with ``requires`` (see load_session) in a
+    loader thread (F1VIZ_LOAD_WORKERS) and return its LoadJob."""
+    job = LoadJob(year, event, session_type, requires)
+    pool = _loader_pool()
+    with _lock:
+        job._future = pool.submit(_run, job)
+        _running.add(job)
+    job._future.add_done_callback(lambda future: _finished(future, job))
+    return job
+
+
+def wait_all(timeout=None):
+    """Wait for the loads started so far; returns whether there were any.
+
+    For running pages headlessly, see utils.export.
+    """
+    with _lock:
+        futures = [job._future for job in _running]
+    wait(futures, timeout)
+    return bool(futures)
+
+
+def start(state, year, event, session_type, requires):
+    """Load a session in the background for the page of ``state`` (a
+    utils.page_state scope), replacing a load it started before.
+
+    The page then calls finished() on every run, and result() once that is
+    True.
+    """
+    if state.loading is not None:
+        state.loading.cancel()
+    state.loading = submit(year, event, session_type, requires)
+    state.loading.wait(QUICK_SECONDS)
+
+
+def finished(state):
+    """Whether the page's background load is done, successfully or not.
+
+    While it runs, its progress and a cancel button are shown and False is
+    returned: the rest of the page stays usable, and the whole page reruns
+    once the load is done.
+    """
+    job = state.loading
+    if job is None:
+        return False
+    if job.cancelled:
+        state.loading = None
+        return False
+    if job.done():
+        return True
+    _show_progress(state, job)
+    return False
+
+
+def result(state):
+    """The session of the page's finished load; raises the load's error."""
+    job = state.loading
+    state.loading = None
+    # the load's get_session and load spans count for the page run taking it
+    timing.add(job.trace)
+    return job.result()
+
+
+def _show_progress(state, job):
+    import streamlit as st
+
+    # only this part reruns while polling, not the page
+    @st.fragment(run_every=POLL_SECONDS)
+    def progress():
+        if state.loading is not job:
+            return
+        if job.done():
+            st.rerun()
+        fraction, label = job.progress()
+        st.progress(fraction, text=f"Loading {job}: {label}")
+        if st.button("Cancel", key=state.key("cancel")):
+            job.cancel()
+            state.loading = None
+            st.rerun()
+
+    progress()
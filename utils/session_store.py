@@ -0,0 +1,249 @@
+import json
+import logging
+import os
+
+import fastf1
+import pandas as pd
+import pyarrow as pa
+from fastf1.core import Laps, SessionResults, Telemetry
+
+from utils import config
+from utils.lazy_telemetry import LazyTelemetry
+
+logger = logging.getLogger(__name__)
+
+# Sessions younger than this may still receive data updates upstream, so they
+# are not persisted
+MIN_SESSION_AGE = pd.Timedelta(days=1)
+
+# Frames written per load option; results are always written
+_PART_FRAMES = {
+    "laps": ("laps", "session_status", "track_status"),
+    "weather": ("weather_data",),
+    "messages": ("race_control_messages",),
+}
+_TELEMETRY_FRAMES = ("car_data", "pos_data")
+
+
+def _session_dir(session):
+    name = session.name.replace(" ", "_")
+    return os.path.join(config.STORE_DIR, str(session.event.year),
+                        f"{int(session.event['RoundNumber']):02d}_{name}")
+
+
+def _write_atomic(path, write):
+    tmp = f"{path}.tmp.{os.getpid()}"
+    write(tmp)
+    os.replace(tmp, path)
+
+
+def _write_frame(path, frame):
+    table = pa.Table.from_pandas(pd.DataFrame(frame))
+
+    def write(tmp):
+        with pa.OSFile(tmp, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+    _write_atomic(path, write)
+
+
+def write_telemetry(path, telemetry):
+    """Write a per-driver telemetry dict to an Arrow file at ``path``.
+
+    One record batch per driver, so a driver can be read back on its own.
+    Nothing is written if there are no drivers.
+    """
+    if isinstance(telemetry, LazyTelemetry):
+        drivers, get = telemetry.drivers(), telemetry.peek
+    else:
+        drivers, get = list(telemetry), telemetry.__getitem__
+    if not drivers:
+        return
+
+    def write(tmp):
+        schema = writer = None
+        with pa.OSFile(tmp, "wb") as sink:
+            for drv in drivers:
+                table = pa.Table.from_pandas(pd.DataFrame(get(drv)), preserve_index=False)
+                if writer is None:
+                    schema = table.schema.with_metadata({"drivers": json.dumps(drivers)})
+                    writer = pa.ipc.new_file(sink, schema)
+                writer.write_table(table.cast(schema))
+            writer.close()
+
+    _write_atomic(path, write)
+
+
+def _open(path):
+    # memory-mapped: numeric columns are handed to pandas without copying
+    return pa.ipc.open_file(pa.memory_map(path, "r"))
+
+
+def _read_frame(path):
+    return _open(path).read_all().to_pandas(split_blocks=True)
+
+
+def read_telemetry(path, session):
+    """Per-driver telemetry of ``session`` from a file written by write_telemetry.
+
+    The file is memory-mapped and drivers are built on first access (see
+    F1VIZ_LAZY_TELEMETRY); numeric channels reference the mapping.
+    """
+    reader = _open(path)
+    drivers = json.loads(reader.schema.metadata[b"drivers"])
+    batches = {drv: i for i, drv in enumerate(drivers)}
+
+    def build(drv):
+        return Telemetry(reader.get_batch(batches[drv]).to_pandas(split_blocks=True),
+                         session=session, driver=drv)
+
+    telemetry = LazyTelemetry(drivers, build)
+    return telemetry if config.LAZY_TELEMETRY else telemetry.materialize()
+
+
+def _read_meta(directory):
+    try:
+        with open(os.path.join(directory, "meta.json")) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    # data written by another fastf1 version may be processed differently
+    if meta.get("fastf1") != fastf1.__version__:
+        return None
+    return meta
+
+
+def _str_or_none(value):
+    return None if value is None else str(value)
+
+
+def _int_or_none(value):
+    return None if value is None else int(value)
+
+
+def _write_meta(path, meta):
+    def write(tmp):
+        with open(tmp, "w") as f:
+            json.dump(meta, f, default=str)
+
+    _write_atomic(path, write)
+
+
+def provisional(session):
+    """Whether ``session`` is younger than MIN_SESSION_AGE."""
+    return pd.Timestamp.now(tz="UTC").tz_localize(None) - session.date < MIN_SESSION_AGE
+
+
+def unstorable(session):
+    """Why save() skips ``session``, or None if it is written."""
+    if not config.STORE_DIR:
+        return "F1VIZ_STORE_DIR is empty"
+    if provisional(session):
+        return f"the session is less than {MIN_SESSION_AGE} old, its data may still change"
+    return None
+
+
+def save(session, options):
+    """Persist the parts of a loaded session selected by ``options``.
+
+    Returns whether they were written; see unstorable() for the sessions
+    that are skipped.
+    """
+    if unstorable(session) is not None:
+        return False
+
+    directory = _session_dir(session)
+    try:
+        os.makedirs(directory, exist_ok=True)
+        _write_frame(os.path.join(directory, "results.arrow"), session.results)
+        for part, names in _PART_FRAMES.items():
+            if options.get(part):
+                for name in names:
+                    _write_frame(os.path.join(directory, f"{name}.arrow"),
+                                 getattr(session, name))
+        if options.get("telemetry"):
+            for name in _TELEMETRY_FRAMES:
+                write_telemetry(os.path.join(directory, f"{name}.arrow"),
+                                 getattr(session, name))
+
+        meta = _read_meta(directory) or {"parts": []}
+        info = dict(session.session_info)
+        split_times = getattr(session, "_session_split_times", None)
+        meta.update({
+            "fastf1": fastf1.__version__,
+            "parts": sorted(set(meta["parts"]) | {p for p, on in options.items() if on}),
+            "session_info": json.loads(json.dumps(info, default=str)),
+            "t0_date": str(session.t0_date) if options.get("telemetry") else meta.get("t0_date"),
+            "session_start_time": _str_or_none(getattr(session, "_session_start_time", None)),
+            "total_laps": _int_or_none(getattr(session, "_total_laps", None)),
+            "session_split_times": None if split_times is None else [str(t) for t in split_times],
+        })
+        _write_meta(os.path.join(directory, "meta.json"), meta)
+    except Exception as e:
+        # the store is only an accelerator, a failed write must not fail the page
+        logger.warning("Could not persist %s: %s", session, e)
+        return False
+    return True
+
+
+def holds(session, options):
+    """Whether the store has every part of ``session`` selected by ``options``."""
+    if not config.STORE_DIR:
+        return False
+    meta = _read_meta(_session_dir(session))
+    return meta is not None and {p for p, on in options.items() if on} <= set(meta["parts"])
+
+
+def restore(session, options):
+    """Fill ``session`` from the store instead of calling ``session.load()``.
+
+    Returns False if the store doesn't hold every part requested in
+    ``options``; the session is left untouched in that case.
+    """
+    if not holds(session, options):
+        return False
+    directory = _session_dir(session)
+    meta = _read_meta(directory)
+
+    def path(name):
+        return os.path.join(directory, f"{name}.arrow")
+
+    try:
+        info = meta["session_info"]
+        for key in ("StartDate", "EndDate"):
+            if key in info:
+                info[key] = pd.Timestamp(info[key])
+        if "GmtOffset" in info:
+            info["GmtOffset"] = pd.Timedelta(info["GmtOffset"])
+
+        results = SessionResults(_read_frame(path("results")))
+        frames = {}
+        for part, names in _PART_FRAMES.items():
+            if options.get(part):
+                for name in names:
+                    frames[name] = _read_frame(path(name))
+        telemetry = {}
+        if options.get("telemetry"):
+            for name in _TELEMETRY_FRAMES:
+                telemetry[name] = (read_telemetry(path(name), session)
+                                   if os.path.exists(path(name)) else {})
+    except (OSError, pa.ArrowException) as e:
+        logger.warning("Ignoring unreadable store entry %s: %s", directory, e)
+        return False
+
+    session._session_info = info
+    session._results = results
+    session._total_laps = meta["total_laps"]
+    start_time = meta["session_start_time"]
+    session._session_start_time = None if start_time is None else pd.Timedelta(start_time)
+    if meta["session_split_times"] is not None:
+        session._session_split_times = [pd.Timedelta(t) for t in meta["session_split_times"]]
+    if "laps" in frames:
+        session._laps = Laps(frames.pop("laps"), session=session)
+    for name, frame in frames.items():
+        setattr(session, f"_{name}", frame)
+    if telemetry:
+        session._t0_date = pd.Timestamp(meta["t0_date"])
+        session._car_data = telemetry["car_data"]
+        session._pos_data = telemetry["pos_data"]
+    return True
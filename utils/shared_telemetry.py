@@ -0,0 +1,212 @@
+import atexit
+import json
+import logging
+import os
+import shutil
+import threading
+from contextlib import contextmanager
+
+import pandas as pd
+import pyarrow as pa
+
+from utils import config, session_store
+
+try:
+    import fcntl
+except ImportError:  # no cross-process file locks (Windows): nothing is shared
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Telemetry dicts of a session, as named in a segment and on the session
+FRAMES = ("car_data", "pos_data")
+
+# A segment is a directory under F1VIZ_SHARED_DIR holding a session's car and
+# position data as Arrow files (see session_store.write_telemetry), its
+# t0_date and one "{pid}.hold" file per server process using it. Processes
+# memory-map the files, so on a tmpfs such as /dev/shm every process maps the
+# same pages. The last process to release a segment deletes it; holds of
+# processes that died are ignored and swept.
+
+_held = set()  # keys of the segments this process holds
+_lock = threading.Lock()
+
+
+def enabled():
+    return bool(config.SHARED_DIR) and fcntl is not None
+
+
+def _segment(key):
+    year, rnd, name = key
+    return os.path.join(config.SHARED_DIR, f"{year}_{rnd:02d}_{name.replace(' ', '_')}")
+
+
+@contextmanager
+def _locked():
+    # one lock for all segments and processes; it is only held to rename,
+    # list and delete files, never while telemetry is written
+    os.makedirs(config.SHARED_DIR, exist_ok=True)
+    with _lock, open(os.path.join(config.SHARED_DIR, ".lock"), "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _holders(segment):
+    # caller holds the lock; holds of dead processes are removed
+    holders = []
+    for name in os.listdir(segment):
+        if not name.endswith(".hold"):
+            continue
+        pid = int(name[:-len(".hold")])
+        if _alive(pid):
+            holders.append(pid)
+        else:
+            os.remove(os.path.join(segment, name))
+    return holders
+
+
+def _hold(segment, key):
+    # caller holds the lock
+    open(os.path.join(segment, f"{os.getpid()}.hold"), "w").close()
+    _held.add(key)
+
+
+def _sweep():
+    # caller holds the lock: segments and unfinished writes of processes that
+    # died without releasing them
+    for name in os.listdir(config.SHARED_DIR):
+        path = os.path.join(config.SHARED_DIR, name)
+        if ".tmp." in name:
+            if not _alive(int(name.split(".tmp.")[1].split(".")[0])):
+                shutil.rmtree(path, ignore_errors=True)
+        elif os.path.isdir(path) and not _holders(path):
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def _read(segment, session):
+    with open(os.path.join(segment, "meta.json")) as f:
+        meta = json.load(f)
+    telemetry = {}
+    for name in FRAMES:
+        path = os.path.join(segment, f"{name}.arrow")
+        telemetry[name] = session_store.read_telemetry(path, session) if os.path.exists(path) else {}
+    session._t0_date = pd.Timestamp(meta["t0_date"])
+    session._car_data = telemetry["car_data"]
+    session._pos_data = telemetry["pos_data"]
+
+
+def attach(session, key):
+    """Fill the car and position data of ``session`` from a shared segment.
+
+    ``key`` is the session cache key (year, round, session name). Returns
+    False if no server process has published the session's telemetry.
+    Nothing is copied or parsed: the frames reference the memory-mapped
+    segment, which this process holds until release().
+    """
+    if not enabled():
+        return False
+    segment = _segment(key)
+    try:
+        with _locked():
+            if not os.path.isdir(segment):
+                return False
+            _hold(segment, key)
+        _read(segment, session)
+    except (OSError, ValueError, pa.ArrowException) as e:
+        logger.warning("Could not attach shared telemetry %s: %s", segment, e)
+        release(key)
+        return False
+    return True
+
+
+def publish(session, key):
+    """Share the loaded car and position data of ``session`` with the other
+    server processes.
+
+    Every driver is written to a new segment once, then the session's own
+    frames are swapped for the mapped ones, so this process keeps no private
+    copy either. If another process published the session first, its
+    segment is attached instead.
+    """
+    if not enabled() or getattr(session, "_t0_date", None) is None:
+        return
+    segment = _segment(key)
+    tmp = f"{segment}.tmp.{os.getpid()}.{threading.get_ident()}"
+    try:
+        os.makedirs(tmp)
+        for name in FRAMES:
+            session_store.write_telemetry(os.path.join(tmp, f"{name}.arrow"),
+                                          getattr(session, f"_{name}", {}))
+        with open(os.path.join(tmp, "meta.json"), "w") as f:
+            json.dump({"t0_date": str(session._t0_date)}, f)
+        with _locked():
+            _sweep()
+            if os.path.isdir(segment):
+                shutil.rmtree(tmp)
+            else:
+                os.rename(tmp, segment)
+            _hold(segment, key)
+        _read(segment, session)
+    except (OSError, pa.ArrowException) as e:
+        # e.g. a full /dev/shm: the session keeps its private copy
+        logger.warning("Could not share the telemetry of %s: %s", session, e)
+        shutil.rmtree(tmp, ignore_errors=True)
+        release(key)
+
+
+def release(key):
+    """Drop this process's hold on the segment of ``key``; the last holder
+    deletes it. Frames already attached stay readable until they are freed.
+    """
+    with _lock:
+        if key not in _held:
+            return
+        _held.discard(key)
+    segment = _segment(key)
+    try:
+        with _locked():
+            try:
+                os.remove(os.path.join(segment, f"{os.getpid()}.hold"))
+            except FileNotFoundError:
+                pass
+            if os.path.isdir(segment) and not _holders(segment):
+                shutil.rmtree(segment)
+    except OSError as e:
+        logger.warning("Could not release shared telemetry %s: %s", segment, e)
+
+
+@atexit.register
+def _release_all():
+    for key in list(_held):
+        release(key)
+
+
+def stats():
+    """Segments on this host: name -> bytes and pids of the holding processes."""
+    if not enabled() or not os.path.isdir(config.SHARED_DIR):
+        return {}
+    segments = {}
+    with _locked():
+        for name in sorted(os.listdir(config.SHARED_DIR)):
+            path = os.path.join(config.SHARED_DIR, name)
+            if ".tmp." in name or not os.path.isdir(path):
+                continue
+            files = [os.path.join(path, f) for f in os.listdir(path)]
+            segments[name] = {
+                "bytes": sum(os.path.getsize(f) for f in files),
+                "holders": _holders(path),
+            }
+    return segments
@@ -0,0 +1,112 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+from fastf1.ergast import Ergast
+
+from utils import config, replay, session_store, timing
+
+logger = logging.getLogger(__name__)
+
+if config.UPSTREAM_URL:
+    replay.redirect(config.UPSTREAM_URL)
+
+
+def _path(year, name):
+    return os.path.join(config.STORE_DIR, str(year), "standings", f"{name}.parquet")
+
+
+def _read(year, name):
+    if not config.STORE_DIR:
+        return None
+    try:
+        return pd.read_parquet(_path(year, name))
+    except (OSError, ValueError):
+        return None
+
+
+def _write(year, name, frame):
+    if not config.STORE_DIR:
+        return
+    path = _path(year, name)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.tmp.{os.getpid()}"
+        frame.to_parquet(tmp)
+        os.replace(tmp, path)
+    except OSError as e:
+        logger.warning("Could not persist %s: %s", path, e)
+
+
+def _settled(race_date):
+    # results may still change for a while (e.g. penalties), rounds are only
+    # persisted once as old as a session the store persists, counted from
+    # the end of the race day
+    age = pd.Timestamp.now(tz="UTC").tz_localize(None) - (pd.Timestamp(race_date) + pd.Timedelta(days=1))
+    return age >= session_store.MIN_SESSION_AGE
+
+
+def _fetch_round(ergast, year, rnd, race_name):
+    # race points plus sprint points of one round, None if it wasn't run yet
+    results = ergast.get_race_results(season=year, round=rnd)
+    if not results.content:
+        return None
+    temp = results.content[0]
+    sprint = ergast.get_sprint_results(season=year, round=rnd)
+
+    if sprint.content and sprint.description['round'][0] == rnd:
+        temp = pd.merge(temp, sprint.content[0], on='driverCode', how='left')
+        temp['points'] = temp['points_x'] + temp['points_y']
+        temp.drop(columns=['points_x', 'points_y'], inplace=True)
+
+    temp['round'] = rnd
+    temp['race'] = race_name.removesuffix(' Grand Prix')
+    return temp[['round', 'race', 'driverCode', 'points']]
+
+
+@timing.span("load")
+def season_points(year):
+    """Points per driver (rows) and race (columns), best driver first.
+
+    Per-round results are persisted once they are settled (see
+    session_store.MIN_SESSION_AGE), so only rounds that weren't available
+    or settled on a previous call are fetched, concurrently. Once every
+    round of the season is settled, the whole table is persisted and served
+    as is.
+    """
+    results = _read(year, "season")
+    if results is not None:
+        return results
+
+    ergast = Ergast()
+    races = ergast.get_race_schedule(year)
+    rounds = {}
+    missing = []
+    settled = {rnd: _settled(race_date) for rnd, race_date in zip(races['round'], races['raceDate'])}
+    for rnd, race_name in zip(races['round'], races['raceName']):
+        stored = _read(year, f"round_{rnd:02d}")
+        if stored is None:
+            missing.append((rnd, race_name))
+        else:
+            rounds[rnd] = stored
+
+    with ThreadPoolExecutor(max_workers=config.ERGAST_WORKERS) as pool:
+        fetched = pool.map(lambda race: _fetch_round(ergast, year, *race), missing)
+        for (rnd, _), result in zip(missing, fetched):
+            if result is not None:
+                rounds[rnd] = result
+                if settled[rnd]:
+                    _write(year, f"round_{rnd:02d}", result)
+
+    results = pd.concat([rounds[rnd] for rnd in sorted(rounds)])
+    race_names = results['race'].drop_duplicates()
+    results = results.pivot(index='driverCode', columns='round', values='points')
+    results['total_points'] = results.sum(axis=1)
+    results = results.sort_values(by='total_points', ascending=False)
+    results.drop(columns='total_points', inplace=True)
+    results.columns = race_names
+
+    if len(rounds) == len(races) and all(settled.values()):
+        _write(year, "season", results)
+    return results
@@ -0,0 +1,47 @@
+import numpy as np
+import fastf1.plotting
+from matplotlib.collections import PolyCollection
+
+# Height of a stint bar, as matplotlib's barh default
+BAR_HEIGHT = 0.8
+
+
+def stint_table(session, laps=None):
+    """One row per stint: Driver, Stint, Compound, StintLength, StintStart
+    (laps completed before the stint) and Color of the compound."""
+    if laps is None:
+        laps = session.laps
+    stints = laps[["Driver", "Stint", "Compound", "LapNumber"]]
+    stints = stints.groupby(["Driver", "Stint", "Compound"], observed=True).count().reset_index()
+    stints = stints.rename(columns={"LapNumber": "StintLength"})
+    stints["StintStart"] = stints.groupby("Driver", observed=True)["StintLength"].cumsum() - stints["StintLength"]
+
+    colors = {compound: fastf1.plotting.get_compound_color(compound, session=session)
+              for compound in stints["Compound"].unique()}
+    stints["Color"] = stints["Compound"].map(colors)
+    return stints
+
+
+def draw_stints(ax, stints, drivers):
+    """Draw a stint table as horizontal bars, one row per driver in the order
+    of ``drivers``, with a single collection per compound."""
+    drivers = [drv for drv in drivers if drv in set(stints["Driver"])]
+    stints = stints.loc[stints["Driver"].isin(drivers)]
+
+    y = stints["Driver"].map({drv: i for i, drv in enumerate(drivers)}).to_numpy(dtype=float)
+    left = stints["StintStart"].to_numpy(dtype=float)
+    right = left + stints["StintLength"].to_numpy(dtype=float)
+    bottom, top = y - BAR_HEIGHT / 2, y + BAR_HEIGHT / 2
+    # (n, 4, 2) rectangle corners
+    verts = np.stack([np.column_stack(corner) for corner in
+                      ((left, bottom), (left, top), (right, top), (right, bottom))], axis=1)
+
+    for compound, rows in stints.groupby("Compound", observed=True).indices.items():
+        bars = PolyCollection(verts[rows], facecolors=stints["Color"].iloc[rows[0]],
+                              edgecolors="black", label=compound)
+        # bars start at lap 0 without a margin, like barh
+        bars.sticky_edges.x.append(0)
+        ax.add_collection(bars)
+
+    ax.set_yticks(range(len(drivers)), drivers)
+    ax.autoscale_view()
@@ -0,0 +1,291 @@
+"""Timing spans of the stages of a page run, and their export.
+
+Usage:
+    python -m utils.timing metrics.jsonl
+    python -m utils.timing metrics.jsonl --pages Speed_Overlay Track_Map
+
+Pages call ``start_page(__file__)`` first and ``report()`` last; in between,
+the code doing the work wraps it in ``span(stage)``, and ``progress(bar)``
+moves a progress bar along as the stages begin. Spans nest and each
+stage is charged its own time only, e.g. a driver's telemetry loaded while
+a figure is being prepared counts as "load", not "transform". report()
+shows the stages in the sidebar (F1VIZ_TIMING_SIDEBAR) and writes them to
+F1VIZ_METRICS_FILE. Run as a module, p50/p99 per page and stage are
+summarized from a JSON-lines metrics file.
+"""
+import argparse
+import collections
+import contextlib
+import json
+import logging
+import math
+import os
+import sys
+import threading
+import time
+
+from utils import config
+
+logger = logging.getLogger(__name__)
+
+# Stages in the order they usually happen in, for display
+STAGES = ("get_session", "load", "transform", "draw", "encode")
+
+QUANTILES = (0.5, 0.99)
+
+# Runs per page and stage the Prometheus quantiles are computed over
+WINDOW = 1000
+
+_local = threading.local()  # trace and open spans of the page run of this thread
+_samples = collections.defaultdict(lambda: collections.deque(maxlen=WINDOW))  # (page, stage) -> seconds
+_totals = collections.defaultdict(lambda: [0.0, 0])  # (page, stage) -> [sum, count]
+_lock = threading.Lock()
+
+
+class Trace:
+    """Seconds per stage of one run of a page script."""
+
+    def __init__(self, page):
+        self.page = page
+        self.start = time.perf_counter()
+        self.stages = {}
+
+    def add(self, stage, seconds):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def total(self):
+        return time.perf_counter() - self.start
+
+
+def start_page(page):
+    """Start timing a run of the page script ``page`` in this thread."""
+    _local.trace = Trace(os.path.splitext(os.path.basename(page))[0])
+    _local.stack = []
+    _local.progress = None
+
+
+def current():
+    """Trace of the page run in this thread, or None."""
+    return getattr(_local, "trace", None)
+
+
+@contextlib.contextmanager
+def tracing(trace):
+    """Charge the spans of this thread to ``trace`` while in the block.
+
+    For work a thread does on behalf of a page run, e.g. a background load;
+    the page run adds the trace to its own with add().
+    """
+    saved = getattr(_local, "trace", None), getattr(_local, "stack", None)
+    _local.trace, _local.stack = trace, []
+    try:
+        yield trace
+    finally:
+        _local.trace, _local.stack = saved
+
+
+def add(trace):
+    """Add the stages of ``trace`` to the page run in this thread."""
+    current_trace = current()
+    if current_trace is not None:
+        for stage, seconds in trace.stages.items():
+            current_trace.add(stage, seconds)
+
+
+@contextlib.contextmanager
+def span(stage):
+    """Charge the time spent in the block to ``stage`` of the current page run.
+
+    Time spent in nested spans is charged to their own stages. Outside a
+    page run (e.g. in the command line tools) this only costs two clock
+    reads.
+    """
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    # [stage, start of the current phase, seconds of nested spans in the
+    # phase, start of the span]; mark() starts a new phase
+    _advance(stage)
+    start = time.perf_counter()
+    frame = [stage, start, 0.0, start]
+    stack.append(frame)
+    try:
+        yield
+    finally:
+        stack.pop()
+        end = time.perf_counter()
+        _charge(frame, end)
+        if stack:
+            stack[-1][2] += end - frame[3]
+
+
+def mark(stage):
+    """Charge the rest of the innermost open span to ``stage``.
+
+    For splitting a span without indenting the code: a render function
+    marks "draw" when it is done preparing data and starts drawing.
+    """
+    stack = getattr(_local, "stack", None)
+    if not stack:
+        return
+    frame = stack[-1]
+    now = time.perf_counter()
+    _charge(frame, now)
+    frame[0], frame[1], frame[2] = stage, now, 0.0
+    _advance(stage)
+
+
+def _charge(frame, end):
+    stage, start, nested, _ = frame
+    trace = current()
+    if trace is not None:
+        trace.add(stage, end - start - nested)
+
+
+def progress(bar):
+    """Move the streamlit progress ``bar`` along as the stages of this page
+    run begin.
+
+    A stage counts for its mean time in the page's earlier runs (all stages
+    the same before the first run), so the bar follows what the stages
+    usually take. Stages that already ran count as done, e.g. a background
+    load added with add(). The page sets the bar to 100 when it is done.
+    """
+    trace = current()
+    if trace is None:
+        return
+    with _lock:
+        timed = (trace.page, "total") in _totals
+        means = {stage: _mean(trace.page, stage) if timed else 1.0 for stage in STAGES}
+    _local.progress = {"bar": bar, "means": means, "entered": set(), "fraction": 0.0}
+
+
+def _mean(page, stage):
+    # caller holds _lock
+    seconds, count = _totals.get((page, stage), (0.0, 0))
+    return seconds / count if count else 0.0
+
+
+def _advance(stage):
+    progress = getattr(_local, "progress", None)
+    if progress is None:
+        return
+    means = progress["means"]
+    # stages are entered again, e.g. a load nested in a transform, so the
+    # bar only moves forward
+    done = (progress["entered"] | set(current().stages)) - {stage}
+    progress["entered"].add(stage)
+    fraction = sum(means.get(name, 0.0) for name in done) / (sum(means.values()) or 1.0)
+    if fraction > progress["fraction"]:
+        progress["fraction"] = min(fraction, 1.0)
+        progress["bar"].progress(progress["fraction"])
+
+
+def report():
+    """End timing the page run: show it and export it.
+
+    Runs that didn't do any timed work (most reruns after a widget change)
+    are not exported; the sidebar keeps showing the page's last timed run.
+    """
+    trace = current()
+    _local.trace = _local.progress = None
+    if trace is None:
+        return
+    if trace.stages:
+        trace.stages["total"] = trace.total()
+        _export(trace)
+    if config.TIMING_SIDEBAR:
+        _sidebar(trace)
+
+
+def _sidebar(trace):
+    import streamlit as st
+
+    key = f"{trace.page}.timing"
+    if trace.stages:
+        st.session_state[key] = dict(trace.stages)
+    stages = st.session_state.get(key)
+    with st.sidebar.expander("⏱️ Timings", expanded=True):
+        if not stages:
+            st.caption("Nothing timed on this page yet.")
+            return
+        order = [stage for stage in STAGES + ("total",) if stage in stages]
+        order += [stage for stage in stages if stage not in order]
+        st.table([{"stage": stage, "seconds": f"{stages[stage]:.3f}"} for stage in order])
+
+
+def _export(trace):
+    with _lock:
+        for stage, seconds in trace.stages.items():
+            _samples[trace.page, stage].append(seconds)
+            _totals[trace.page, stage][0] += seconds
+            _totals[trace.page, stage][1] += 1
+        if not config.METRICS_FILE:
+            return
+        path = config.METRICS_FILE.replace("{pid}", str(os.getpid()))
+        try:
+            if config.METRICS_FORMAT == "prometheus":
+                _write_prometheus(path)
+            else:
+                with open(path, "a") as f:
+                    f.write(json.dumps({"time": time.time(), "page": trace.page,
+                                        "stages": trace.stages}) + "\n")
+        except OSError as e:
+            logger.warning("Could not write metrics to %s: %s", path, e)
+
+
+def quantile(values, q):
+    """Nearest-rank quantile of ``values``."""
+    values = sorted(values)
+    return values[max(0, min(len(values) - 1, math.ceil(q * len(values)) - 1))]
+
+
+def _write_prometheus(path):
+    # caller holds _lock; the whole file is replaced, as node_exporter's
+    # textfile collector expects
+    lines = ["# HELP f1viz_stage_seconds Time spent in a stage of a page run.",
+             "# TYPE f1viz_stage_seconds summary"]
+    for (page, stage), samples in sorted(_samples.items()):
+        labels = f'page="{page}",stage="{stage}"'
+        for q in QUANTILES:
+            lines.append(f'f1viz_stage_seconds{{{labels},quantile="{q}"}} {quantile(samples, q):.6f}')
+        total, count = _totals[page, stage]
+        lines.append(f"f1viz_stage_seconds_sum{{{labels}}} {total:.6f}")
+        lines.append(f"f1viz_stage_seconds_count{{{labels}}} {count}")
+    tmp = f"{path}.tmp.{os.getpid()}"
+    with open(tmp, "w") as f:
+        f.write("\n".join(lines) + "\n")
+    os.replace(tmp, path)
+
+
+def summarize(lines, pages=None):
+    """(page, stage) -> (runs, p50, p99) of JSON-lines metrics."""
+    samples = collections.defaultdict(list)
+    for line in lines:
+        if not line.strip():
+            continue
+        run = json.loads(line)
+        if pages and run["page"] not in pages:
+            continue
+        for stage, seconds in run["stages"].items():
+            samples[run["page"], stage].append(seconds)
+    return {key: (len(values), *(quantile(values, q) for q in QUANTILES))
+            for key, values in sorted(samples.items())}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m utils.timing", description=__doc__.splitlines()[0])
+    parser.add_argument("metrics", help="JSON-lines metrics file (F1VIZ_METRICS_FILE)")
+    parser.add_argument("--pages", nargs="+", metavar="PAGE", help="only these pages")
+    args = parser.parse_args(argv)
+
+    with open(args.metrics) as f:
+        summary = summarize(f, args.pages)
+    print(f"{'page':<24}{'stage':<13}{'runs':>6}{'p50':>10}{'p99':>10}")
+    for (page, stage), (runs, p50, p99) in summary.items():
+        print(f"{page:<24}{stage:<13}{runs:>6}{p50:9.3f}s{p99:9.3f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,194 @@
+import logging
+import os
+import threading
+
+import fastf1
+import numpy as np
+from fastf1 import mvapi
+
+from utils import config, timing
+from utils.lazy_telemetry import lap_telemetry
+from utils.session_cache import load_session
+
+logger = logging.getLogger(__name__)
+
+# Session data needed to compute a circuit's geometry the first time
+REQUIRED_DATA = ("laps", "pos_data")
+
+# Distance of the corner labels from the track, in track coordinates
+LABEL_OFFSET = 500
+
+# (location, year) -> TrackGeometry
+_geometries = {}
+_lock = threading.Lock()
+
+
+def rotation_matrix(degrees):
+    """Matrix turning row vectors of xy coordinates by ``degrees``."""
+    angle = np.radians(degrees)
+    return np.array([[np.cos(angle), np.sin(angle)], [-np.sin(angle), np.cos(angle)]])
+
+
+class TrackGeometry:
+    """Circuit outline and corner labels, rotated like the official map.
+
+    One per circuit layout: the circuit data is revised per season, so a
+    layout is identified by the event location and the year.
+    """
+
+    def __init__(self, location, year, rotation, outline, corners, labels, names):
+        self.location = location
+        self.year = year
+        self.rotation = rotation
+        self.outline = outline  # (n, 2) track points
+        self.corners = corners  # (corners, 2) corner positions on the track
+        self.labels = labels  # (corners, 2) label positions next to the track
+        self.names = names  # corner names, e.g. "8A"
+        points = np.concatenate([outline, labels])
+        self.bbox = np.concatenate([points.min(axis=0), points.max(axis=0)])  # xmin, ymin, xmax, ymax
+
+    @property
+    def key(self):
+        return self.location, self.year
+
+    def rotate(self, xy):
+        """Rotate raw position data (n, 2) like the outline."""
+        return np.asarray(xy, dtype=float) @ rotation_matrix(self.rotation)
+
+    def rotate_frame(self, frame):
+        """Copy of a telemetry frame with its X and Y columns rotated."""
+        frame = frame.copy()
+        frame[["X", "Y"]] = self.rotate(frame[["X", "Y"]])
+        return frame
+
+    @classmethod
+    def from_session(cls, session):
+        lap = session.laps.pick_fastest()
+        track = lap.get_pos_data().loc[:, ("X", "Y")].to_numpy(dtype=float)
+        circuit_info = get_circuit_info(session)
+        if circuit_info is None:
+            # no circuit data: unrotated outline without corners
+            rotation, corners = 0.0, np.empty((0, 2))
+            angles, names = np.empty(0), np.empty(0, dtype=str)
+        else:
+            rotation = float(circuit_info.rotation)
+            info = circuit_info.corners
+            corners = info[["X", "Y"]].to_numpy(dtype=float)
+            angles = np.radians(info["Angle"].to_numpy(dtype=float))
+            names = (info["Number"].astype(str) + info["Letter"].astype(str)).to_numpy(dtype=str)
+
+        # labels sit LABEL_OFFSET away from their corner in the corner's direction
+        offsets = LABEL_OFFSET * np.column_stack([np.cos(angles), np.sin(angles)])
+        rot = rotation_matrix(rotation)
+        return cls(session.event["Location"], session.event.year, rotation,
+                   track @ rot, corners @ rot, (corners + offsets) @ rot, names)
+
+    def _path(self):
+        return _path(self.location, self.year)
+
+    def save(self):
+        if not config.STORE_DIR:
+            return
+        path = self._path()
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.tmp.{os.getpid()}"
+            with open(tmp, "wb") as f:
+                np.savez(f, rotation=self.rotation, outline=self.outline, corners=self.corners,
+                         labels=self.labels, names=self.names)
+            os.replace(tmp, path)
+        except OSError as e:
+            logger.warning("Could not persist %s: %s", path, e)
+
+    @classmethod
+    def load(cls, location, year):
+        if not config.STORE_DIR:
+            return None
+        try:
+            with np.load(_path(location, year)) as data:
+                return cls(location, year, float(data["rotation"]), data["outline"],
+                           data["corners"], data["labels"], data["names"])
+        except (OSError, KeyError, ValueError):
+            return None
+
+
+def get_circuit_info(session, reference_lap=None):
+    """Like ``Session.get_circuit_info()``, without building other drivers' data.
+
+    fastf1 computes the markers' 'Distance' from the fastest lap's
+    ``get_telemetry()``, whose driver-ahead channels need every driver's car
+    data. Here they are only computed when a ``reference_lap`` is given, from
+    that lap's own telemetry.
+    """
+    circuit = session.session_info["Meeting"]["Circuit"]
+    circuit_key = circuit["Key"]
+    if circuit_key == 149 and circuit["ShortName"] == "Mugello":  # as in fastf1
+        circuit_key = 146
+    circuit_info = mvapi.get_circuit_info(year=session.event.year, circuit_key=circuit_key)
+    if circuit_info is not None and reference_lap is not None:
+        _add_marker_distance(circuit_info, reference_lap)
+    return circuit_info
+
+
+def _add_marker_distance(circuit_info, lap):
+    # same best fit as CircuitInfo.add_marker_distance: the distance of the
+    # lap's position sample closest to each marker
+    telemetry = lap_telemetry(lap)
+    telemetry = telemetry[telemetry["Source"] == "pos"]
+    if telemetry.empty:
+        logger.warning("Failed to generate marker distance information: telemetry data is empty")
+        return
+    track = telemetry[["X", "Y"]].to_numpy(dtype=float)
+    distance = telemetry["Distance"].to_numpy()
+    for markers in (circuit_info.corners, circuit_info.marshal_sectors, circuit_info.marshal_lights):
+        xy = markers[["X", "Y"]].to_numpy(dtype=float)
+        squared = ((track[np.newaxis] - xy[:, np.newaxis]) ** 2).sum(axis=2)
+        markers["Distance"] = distance[np.nanargmin(squared, axis=1)] if len(xy) else []
+
+
+def _path(location, year):
+    name = "".join(c if c.isalnum() else "_" for c in location)
+    return os.path.join(config.STORE_DIR, "tracks", f"{year}_{name}.npz")
+
+
+def _lookup(location, year):
+    with _lock:
+        geometry = _geometries.get((location, year))
+    if geometry is None:
+        geometry = TrackGeometry.load(location, year)
+        if geometry is not None:
+            with _lock:
+                _geometries[geometry.key] = geometry
+    return geometry
+
+
+@timing.span("transform")
+def _compute(session):
+    geometry = TrackGeometry.from_session(session)
+    geometry.save()
+    with _lock:
+        _geometries[geometry.key] = geometry
+    return geometry
+
+
+def track_geometry(year, event, session_type="Q"):
+    """Geometry of the circuit hosting ``event``.
+
+    Only the event schedule is needed when the circuit's layout of that year
+    is already known (in memory or in the session store); otherwise the laps
+    and position data of the given session are loaded to compute it.
+    """
+    event = fastf1.get_event(year, event)
+    geometry = _lookup(event["Location"], event.year)
+    if geometry is None:
+        geometry = _compute(load_session(year, event["RoundNumber"], session_type, REQUIRED_DATA))
+    return geometry
+
+
+def session_geometry(session):
+    """Like track_geometry, for an already loaded session with laps and
+    position data."""
+    geometry = _lookup(session.event["Location"], session.event.year)
+    if geometry is None:
+        geometry = _compute(session)
+    return geometry